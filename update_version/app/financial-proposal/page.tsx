@@ -123,6 +123,7 @@ const MutawaziProposalSystem = () => {
     { description: 'Final Delivery', percentage: 30 }
   ]);
   const [proposalData, setProposalData] = useState<ProposalData | null>(null);
+  const [quotationCode, setQuotationCode] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [readinessResult, setReadinessResult] = useState<ReadinessResult | null>(null);
   const [financialSummary, setFinancialSummary] = useState<FinancialSummary>({ 
@@ -311,6 +312,7 @@ useEffect(() => {
       const result = await response.json();
       
       if (result.success) {
+        setQuotationCode(result.quotation_code);
         showAlert(`Project created! Quotation Code: ${result.quotation_code}`, 'success');
         nextStep();
       } else {
@@ -511,7 +513,8 @@ const deliverableData = deliverables.map(d => ({
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           proposal_items: proposalItems,
-          payment_terms: paymentTerms
+          payment_terms: paymentTerms,
+          quotation_code: quotationCode ?? undefined
         })
       });
       
@@ -128,8 +128,8 @@ export default function GeneratorPage() {
         progress: 10
       })
       
-      // Start polling for status
-      pollJobStatus(data.job_id)
+      // Follow progress over the status stream
+      streamJobStatus(data.job_id)
       
     } catch (error) {
       console.error('Generation error:', error)
@@ -142,52 +142,69 @@ export default function GeneratorPage() {
     }
   }
 
-  const pollJobStatus = (jobId: string) => {
-    const interval = setInterval(async () => {
-      try {
-        console.log('Polling status for job:', jobId)
-        
-        const response = await fetch(`${API_BASE_URL}/status/${jobId}`)
-        
-        if (!response.ok) {
-          throw new Error(`HTTP ${response.status}: ${response.statusText}`)
-        }
+  const streamJobStatus = (jobId: string) => {
+    // Server-Sent Events: the browser reconnects on its own and resumes from Last-Event-ID
+    const source = new EventSource(`${API_BASE_URL}/status/${jobId}/stream`)
 
-        const data = await response.json()
-        console.log('Status data:', data)
-        
-        setJobStatus({
-          status: data.status,
-          message: data.message || 'Processing...',
-          progress: data.progress || 0
-        })
-        
-        if (data.status === 'completed') {
-          clearInterval(interval)
-          setIsLoading(false)
-          if (data.files && data.files.length > 0) {
-            setDownloadFiles(data.files)
-            
-            // Save to user's activity
-            if (user && formData) {
-              saveToUserActivity(data.files, formData)
-            }
-          }
-        } else if (data.status === 'error') {
-          clearInterval(interval)
-          setIsLoading(false)
+    const finish = (data: { status: string; message?: string; files?: string[] }) => {
+      source.close()
+      setIsLoading(false)
+      setJobStatus({
+        status: data.status,
+        message: data.message || '',
+        progress: data.status === 'completed' ? 100 : 0
+      })
+      if (data.status === 'completed' && data.files && data.files.length > 0) {
+        setDownloadFiles(data.files)
+
+        // Save to user's activity
+        if (user && formData) {
+          saveToUserActivity(data.files, formData)
         }
-      } catch (error) {
-        console.error('Polling error:', error)
-        clearInterval(interval)
+      }
+    }
+
+    const onProgress = (event: Event) => {
+      const data = JSON.parse((event as MessageEvent).data)
+      setJobStatus({
+        status: 'processing',
+        message: data.message || 'Processing...',
+        progress: data.progress || 0
+      })
+    }
+
+    source.addEventListener('status', (event) => {
+      const data = JSON.parse((event as MessageEvent).data)
+      if (data.status === 'processing') {
+        onProgress(event)
+      } else {
+        finish(data)
+      }
+    })
+    source.addEventListener('stage', onProgress)
+    source.addEventListener('section', onProgress)
+    source.addEventListener('file', onProgress)
+    source.addEventListener('done', (event) => {
+      finish({ ...JSON.parse((event as MessageEvent).data), status: 'completed' })
+    })
+    source.addEventListener('failed', (event) => {
+      finish({ ...JSON.parse((event as MessageEvent).data), status: 'error' })
+    })
+    source.addEventListener('cancelled', (event) => {
+      finish({ ...JSON.parse((event as MessageEvent).data), status: 'cancelled' })
+    })
+    source.onerror = () => {
+      // CLOSED means the browser gave up reconnecting (e.g. the job no longer exists)
+      if (source.readyState === EventSource.CLOSED) {
+        console.error('Status stream closed for job:', jobId)
         setJobStatus({
           status: 'error',
-          message: `Error checking status: ${error}`,
+          message: 'Lost connection to the status stream',
           progress: 0
         })
         setIsLoading(false)
       }
-    }, 2000)
+    }
   }
 
   if (!user) {
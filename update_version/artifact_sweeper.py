@@ -0,0 +1,178 @@
+"""
+Artifact Lifecycle Sweeper for the RFP Proposal Generator
+A single background task replaces the per-job cleanup timers. On each pass,
+holding a lock in the job store so only one process sweeps at a time, it:
+
+1. deletes jobs whose expires_at has passed (files and records),
+2. evicts least recently used completed jobs while outputs/ is over quota,
+   skipping jobs downloaded within the pin window,
+3. removes uploads and outputs left behind by crashed or deleted jobs,
+4. prunes rendered diagrams that no job has used for a while,
+5. fails jobs whose admission hold was never turned into a queued job.
+"""
+
+import asyncio
+import os
+import re
+import socket
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from artifacts import artifact_files
+from job_queue import JobQueue, OPEN_STATES
+from job_store import JobStore
+
+SWEEP_INTERVAL_SECONDS = float(os.getenv("SWEEP_INTERVAL_SECONDS", "60"))
+ARTIFACT_DISK_QUOTA_MB = float(os.getenv("ARTIFACT_DISK_QUOTA_MB", "2048"))
+# Jobs downloaded this recently are never evicted for space
+ARTIFACT_PIN_SECONDS = float(os.getenv("ARTIFACT_PIN_SECONDS", "3600"))
+# Files without a live job must be at least this old before they are treated as orphans
+ORPHAN_GRACE_SECONDS = float(os.getenv("ORPHAN_GRACE_SECONDS", "3600"))
+
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+SWEEPER_LOCK = "artifact-sweeper"
+
+
+def job_id_from_filename(filename: str) -> Optional[str]:
+    """Uploads and outputs both carry the job's UUID in their names"""
+    match = JOB_ID_PATTERN.search(filename)
+    return match.group(0) if match else None
+
+
+class ArtifactSweeper:
+    def __init__(self, store: JobStore, queue: JobQueue, output_dir: str, upload_dir: str,
+                 remove_job: Callable[[str], None], interval: float = SWEEP_INTERVAL_SECONDS,
+                 diagram_cache: Optional[Any] = None):
+        self.store = store
+        self.queue = queue
+        self.output_dir = output_dir
+        self.upload_dir = upload_dir
+        self.remove_job = remove_job
+        self.interval = interval
+        self.diagram_cache = diagram_cache  # mermaid_renderer.DiagramCache; its files are shared, not per job
+        self.quota_bytes = int(ARTIFACT_DISK_QUOTA_MB * 1024 * 1024)
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self.last_sweep: Dict[str, Any] = {}
+
+    async def run(self):
+        """Sweep forever; meant to be started once per API process"""
+        while True:
+            try:
+                if self.store.try_lock(SWEEPER_LOCK, self.owner, self.interval * 3):
+                    await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Artifact sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def sweep(self) -> Dict[str, Any]:
+        now = time.time()
+        expired = self._remove_expired(now)
+        evicted, output_bytes = self._enforce_quota(now)
+        orphans = self._remove_orphans(self.output_dir, now) + self._remove_orphans(self.upload_dir, now)
+        diagrams = self.diagram_cache.prune() if self.diagram_cache else 0
+        abandoned = self._expire_holds(now)
+
+        self.last_sweep = {
+            "at": now,
+            "expired_jobs": expired,
+            "evicted_jobs": evicted,
+            "orphaned_files": orphans,
+            "pruned_diagrams": diagrams,
+            "abandoned_holds": abandoned,
+            "output_bytes": output_bytes,
+            "quota_bytes": self.quota_bytes,
+        }
+        if expired or evicted or orphans or diagrams or abandoned:
+            print(f"Artifact sweep: {expired} expired, {evicted} evicted, {orphans} orphaned files, {diagrams} diagrams removed, "
+                  f"{abandoned} abandoned holds "
+                  f"({output_bytes / 1024 / 1024:.1f} MB of {self.quota_bytes / 1024 / 1024:.0f} MB used)")
+        return self.last_sweep
+
+    def _remove_expired(self, now: float) -> int:
+        # Bounded per pass; anything left over goes on the next one
+        job_ids = self.store.expired_jobs(now, limit=500)
+        for job_id in job_ids:
+            self.remove_job(job_id)
+        self.store.delete_orphan_batches()
+        return len(job_ids)
+
+    def _expire_holds(self, now: float) -> int:
+        """Capacity reserved by a request that died before enqueueing would otherwise be held forever"""
+        job_ids = self.queue.expire_holds(now)
+        for job_id in job_ids:
+            self.store.fail_job(job_id, "Proposal generation did not start. Please submit the RFP again.")
+        return len(job_ids)
+
+    def _enforce_quota(self, now: float):
+        output_bytes = _directory_size(self.output_dir)
+        if output_bytes <= self.quota_bytes:
+            return 0, output_bytes
+
+        evicted = 0
+        for job in self.store.eviction_candidates(pinned_since=now - ARTIFACT_PIN_SECONDS):
+            for filename in job["files"]:
+                for path in artifact_files(os.path.join(self.output_dir, filename)):
+                    try:
+                        size = os.path.getsize(path)
+                        os.remove(path)
+                        output_bytes -= size
+                    except OSError:
+                        pass
+            self.store.mark_evicted(
+                job["job_id"], "The generated files were removed to free disk space. Please generate the proposal again."
+            )
+            evicted += 1
+            if output_bytes <= self.quota_bytes:
+                break
+        return evicted, output_bytes
+
+    def _remove_orphans(self, directory: str, now: float) -> int:
+        """Delete old files whose job is gone, or whose job no longer needs them (uploads only)"""
+        by_job: Dict[str, List[os.DirEntry]] = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                job_id = job_id_from_filename(entry.name)
+                if job_id and entry.is_file() and now - entry.stat().st_mtime > ORPHAN_GRACE_SECONDS:
+                    by_job.setdefault(job_id, []).append(entry)
+        if not by_job:
+            return 0
+
+        live_jobs = self.store.existing_job_ids(list(by_job))
+        removed = 0
+        for job_id, entries in by_job.items():
+            keep = set()
+            if job_id in live_jobs:
+                if directory != self.upload_dir:
+                    continue
+                keep = self._uploads_in_use(job_id)
+            for entry in entries:
+                if os.path.abspath(entry.path) in keep:
+                    continue
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def _uploads_in_use(self, job_id: str) -> set:
+        """Uploads a live job still needs: everything while it is queued, its logos afterwards"""
+        queued = self.queue.get(job_id)
+        if queued and queued["status"] in OPEN_STATES:
+            return {os.path.abspath(entry.path) for entry in os.scandir(self.upload_dir) if job_id in entry.name}
+        inputs = self.store.get_inputs(job_id) or {}
+        request = inputs.get("request") or {}
+        return {
+            os.path.abspath(path)
+            for path in (request.get("logo_top_left_path"), request.get("logo_bottom_right_path"))
+            if path
+        }
+
+
+def _directory_size(directory: str) -> int:
+    total = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file():
+                total += entry.stat().st_size
+    return total
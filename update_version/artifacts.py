@@ -0,0 +1,237 @@
+"""
+Artifact Delivery Helpers for the RFP Proposal Generator
+Content hashing, MIME types, precompressed variants and byte-range parsing
+for the files in outputs/, used by the /download endpoint.
+"""
+
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import time
+import zipfile
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Formats worth compressing; Office files and PDFs are already compressed containers
+COMPRESSIBLE_EXTENSIONS = {".html", ".htm", ".svg", ".json", ".txt", ".csv"}
+# Precomputed variants, most preferred first: (Content-Encoding, file suffix)
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+MEDIA_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".pdf": "application/pdf",
+    ".html": "text/html; charset=utf-8",
+    ".htm": "text/html; charset=utf-8",
+    ".svg": "image/svg+xml",
+    ".png": "image/png",
+    ".json": "application/json",
+    ".csv": "text/csv; charset=utf-8",
+    ".txt": "text/plain; charset=utf-8",
+    ".zip": "application/zip",
+}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# (path, mtime_ns, size) -> sha256 hex; a rewritten file gets a new key, so entries never go stale
+_digest_cache: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+DIGEST_CACHE_SIZE = 2048
+
+
+def media_type_for(filename: str) -> str:
+    extension = os.path.splitext(filename)[1].lower()
+    return MEDIA_TYPES.get(extension) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def file_digest(path: str, stat: Optional[os.stat_result] = None) -> str:
+    """SHA-256 of the file contents, memoized by path, mtime and size"""
+    stat = stat or os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _digest_lock:
+        digest = _digest_cache.get(key)
+    if digest is not None:
+        return digest
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    with _digest_lock:
+        if len(_digest_cache) >= DIGEST_CACHE_SIZE:
+            _digest_cache.clear()
+        _digest_cache[key] = digest
+    return digest
+
+
+def precompress_artifact(path: str) -> List[str]:
+    """Write .gz (and .br when brotli is installed) next to a text artifact; returns the variant paths"""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    with open(path, "rb") as file:
+        data = file.read()
+
+    variants = []
+    for encoding, suffix in ENCODINGS:
+        if encoding == "br":
+            if not BROTLI_AVAILABLE:
+                continue
+            compressed = brotli.compress(data, quality=11)
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        # Write then rename, so a concurrent download never sees a partial variant
+        temp_path = f"{path}{suffix}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(compressed)
+        os.replace(temp_path, path + suffix)
+        variants.append(path + suffix)
+    return variants
+
+
+def compressed_variant(path: str, accept_encoding: str) -> Optional[Tuple[str, str]]:
+    """Best precomputed variant the client accepts, as (encoding, path); None for identity.
+
+    A variant older than its source (e.g. after the source was rewritten) is ignored.
+    """
+    accepted = _parse_accept_encoding(accept_encoding)
+    if not accepted:
+        return None
+    source_mtime = os.stat(path).st_mtime_ns
+    for encoding, suffix in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0)) <= 0:
+            continue
+        variant_path = path + suffix
+        try:
+            if os.stat(variant_path).st_mtime_ns >= source_mtime:
+                return encoding, variant_path
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def artifact_files(path: str) -> List[str]:
+    """The artifact and any precompressed variants that exist for it"""
+    return [path] + [path + suffix for _, suffix in ENCODINGS if os.path.exists(path + suffix)]
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak comparison, as RFC 9110 requires for this header)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range into inclusive (start, end).
+
+    Returns None when the header is absent, malformed or asks for several
+    ranges (the full file is served then); raises ValueError when the range
+    cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    start_text, end_text = (part.strip() for part in spec.split("-", 1))
+    if not start_text.isdigit() and not (start_text == "" and end_text.isdigit()):
+        return None
+    if end_text and not end_text.isdigit():
+        return None
+
+    if start_text == "":
+        # Suffix range: the last N bytes
+        length = int(end_text)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(start_text)
+    end = min(int(end_text), size - 1) if end_text else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def iter_file(path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = 64 * 1024):
+    """Yield bytes start..end (inclusive) of a file"""
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = (end - start + 1) if end is not None else None
+        while remaining is None or remaining > 0:
+            chunk = file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def iter_zip(entries: Iterable[Tuple[str, str]], chunk_size: int = 64 * 1024):
+    """Stream a zip of (path, archive name) entries without building it in memory or on disk.
+
+    Text artifacts are deflated; Office files and PDFs are stored as they are.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", allowZip64=True) as archive:
+        for path, arcname in entries:
+            stat = os.stat(path)
+            info = zipfile.ZipInfo(arcname, time.localtime(stat.st_mtime)[:6])
+            info.file_size = stat.st_size
+            if os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, "w") as destination:
+                for chunk in iter_file(path, chunk_size=chunk_size):
+                    destination.write(chunk)
+                    yield stream.drain()
+            yield stream.drain()
+    yield stream.drain()
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink for ZipFile; drain() hands back what was written so far"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted = {}
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
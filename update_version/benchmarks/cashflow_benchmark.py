@@ -0,0 +1,149 @@
+"""
+Benchmark: per-deliverable Python loop vs. columnar cash-flow engine
+
+Builds N synthetic deliverables (a mix of catalog services and custom amounts)
+and times the original loop from /api/cashflow/deliverables against
+cashflow_engine.deliverable_cashflow, checking that both produce the same
+response. "compute" is the cash-flow calculation alone; "endpoint" adds the
+response encoding each version of the endpoint does (FastAPI's
+jsonable_encoder pass for the returned dict before, a direct JSONResponse now).
+
+Usage:
+    python benchmarks/cashflow_benchmark.py [deliverables ...]
+"""
+
+import gc
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from cashflow_engine import deliverable_cashflow
+from financial_proposal import DEFAULT_OVERHEAD_COSTS, SERVICES_CATALOG, DeliverableData, calculate_overhead
+
+DEFAULT_SIZES = [10, 1_000, 100_000]
+
+
+def build_deliverables(count: int):
+    rng = random.Random(count)
+    service_ids = list(SERVICES_CATALOG)
+    deliverables = []
+    for i in range(count):
+        uses_catalog = i % 3 != 0
+        deliverables.append(DeliverableData(
+            name=f"Deliverable {i}",
+            due_date=f"2025-{i % 12 + 1:02d}-15",
+            service_id=rng.choice(service_ids) if uses_catalog else None,
+            amount=None if uses_catalog and i % 2 else rng.uniform(10_000, 900_000),
+            salaries=rng.uniform(5_000, 400_000),
+            tools=rng.uniform(0, 50_000),
+            others=rng.uniform(0, 20_000),
+        ))
+    return deliverables
+
+
+def loop_cashflow(deliverables):
+    """The original per-deliverable implementation, kept as the baseline"""
+    rows = []
+    cumulative_net_flow = 0
+    for deliv_data in deliverables:
+        service_info = SERVICES_CATALOG.get(deliv_data.service_id) if deliv_data.service_id else None
+        amount = deliv_data.amount if deliv_data.amount is not None else service_info['price']
+        base_costs = deliv_data.salaries + deliv_data.tools + deliv_data.others
+        duration = service_info['duration'] if service_info else 1
+        overhead = calculate_overhead(base_costs, DEFAULT_OVERHEAD_COSTS, duration)
+        cash_out = base_costs + overhead
+        net_flow = amount - cash_out
+        cumulative_net_flow += net_flow
+        row = {
+            'deliverable_name': deliv_data.name,
+            'due_date': deliv_data.due_date,
+            'service_id': deliv_data.service_id,
+            'cash_in': amount,
+            'salaries': deliv_data.salaries,
+            'tools': deliv_data.tools,
+            'others': deliv_data.others,
+            'overhead': overhead,
+            'cash_out': cash_out,
+            'net_flow': net_flow,
+            'cumulative_net_flow': cumulative_net_flow,
+            'is_profitable': net_flow > 0
+        }
+        if service_info:
+            row['service_info'] = {
+                'name': service_info['name'],
+                'catalog_price': service_info['price'],
+                'duration': service_info['duration'],
+                'unit': service_info['unit']
+            }
+        rows.append(row)
+
+    total_revenue = sum(d['cash_in'] for d in rows)
+    total_costs = sum(d['cash_out'] for d in rows)
+    total_profit = total_revenue - total_costs
+    profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
+    return {
+        "deliverables": rows,
+        "summary": {
+            "total_revenue": total_revenue,
+            "total_costs": total_costs,
+            "total_profit": total_profit,
+            "profit_margin": round(profit_margin, 2),
+            "is_profitable": total_profit > 0
+        }
+    }
+
+
+def same_value(a, b) -> bool:
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same_value(a[key], b[key]) for key in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same_value(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def best_of(fn, repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        gc.collect()
+        gc.disable()  # Like timeit: keep collector pauses triggered by earlier allocations out of the timings
+        try:
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'deliverables':>12} {'compute: loop':>14} {'columnar':>10} {'speedup':>8} "
+          f"{'endpoint: loop':>15} {'columnar':>10} {'speedup':>8}  match")
+    for size in sizes:
+        deliverables = build_deliverables(size)
+        repeats = 5 if size <= 10_000 else 2
+
+        def columnar():
+            return deliverable_cashflow(deliverables, SERVICES_CATALOG, DEFAULT_OVERHEAD_COSTS)
+
+        match = same_value(loop_cashflow(deliverables), columnar())
+        loop_time = best_of(lambda: loop_cashflow(deliverables), repeats)
+        columnar_time = best_of(columnar, repeats)
+        loop_endpoint = best_of(lambda: JSONResponse(content=jsonable_encoder(loop_cashflow(deliverables))), repeats)
+        columnar_endpoint = best_of(lambda: JSONResponse(content=columnar()), repeats)
+        print(f"{size:>12} {loop_time * 1000:>12.2f}ms {columnar_time * 1000:>8.2f}ms {loop_time / columnar_time:>7.1f}x "
+              f"{loop_endpoint * 1000:>13.2f}ms {columnar_endpoint * 1000:>8.2f}ms {loop_endpoint / columnar_endpoint:>7.1f}x"
+              f"  {'yes' if match else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: python-docx per-paragraph body writer vs. bulk OOXML writer
+
+Builds a synthetic proposal of roughly N pages (one level-2 section per page,
+grouped under level-1 chapters) and times both body writers plus the final
+save, in English and Arabic.
+
+Usage:
+    python benchmarks/word_writer_benchmark.py [pages ...]
+"""
+
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from docx import Document
+
+from ex import EnhancedDocumentGenerator, ProposalRequest, Section, EnhancedAIContentGenerator
+
+SECTIONS_PER_CHAPTER = 10
+PARAGRAPHS_PER_PAGE = 6
+BULLETS_PER_PAGE = 4
+
+
+def build_proposal(pages: int, lang: str):
+    """Create a numbered structure and content dict that fills about `pages` pages"""
+    word = 'مقترح' if lang == 'ar' else 'proposal'
+    paragraph = ' '.join([word] * 60)
+
+    structure = []
+    content = {}
+    for chapter_index in range(0, pages, SECTIONS_PER_CHAPTER):
+        chapter = Section(f"chapter_{chapter_index}", f"Chapter {chapter_index}", 1)
+        for page in range(chapter_index, min(chapter_index + SECTIONS_PER_CHAPTER, pages)):
+            key = f"section_{page}"
+            chapter.add_subsection(Section(key, f"Section {page}", 2))
+            lines = [paragraph] * PARAGRAPHS_PER_PAGE + [f"- {word} bullet {i}" for i in range(BULLETS_PER_PAGE)]
+            content[key] = '\n'.join(lines)
+        structure.append(chapter)
+
+    EnhancedAIContentGenerator().number_sections(structure)
+    return structure, content
+
+
+def time_writer(generator: EnhancedDocumentGenerator, bulk: bool, structure, content, request, lang: str):
+    doc = Document()
+    generator._create_custom_styles(doc)
+
+    start = time.perf_counter()
+    if bulk:
+        generator._add_dynamic_content_bulk(doc, structure, content, request, lang)
+    else:
+        generator._add_dynamic_content(doc, structure, content, request, lang)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    doc.save(BytesIO())
+    save_time = time.perf_counter() - start
+
+    return build_time, save_time
+
+
+def main(page_counts):
+    generator = EnhancedDocumentGenerator()
+    print(f"{'pages':>6} {'lang':>4} {'python-docx':>12} {'bulk':>8} {'speedup':>8} {'save':>8}")
+    for pages in page_counts:
+        for lang in ('en', 'ar'):
+            request = ProposalRequest(proposal_type="technical", sector="general", company_name="Benchmark", language=lang)
+            structure, content = build_proposal(pages, lang)
+
+            legacy_build, _ = time_writer(generator, False, structure, content, request, lang)
+            bulk_build, bulk_save = time_writer(generator, True, structure, content, request, lang)
+
+            print(f"{pages:>6} {lang:>4} {legacy_build:>11.3f}s {bulk_build:>7.3f}s {legacy_build / bulk_build:>7.1f}x {bulk_save:>7.3f}s")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [50, 200, 500])
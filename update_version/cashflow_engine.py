@@ -0,0 +1,480 @@
+"""
+Columnar Cash-Flow Engine for the Mutawazi Financial Proposal System
+Computes cash out, overhead, net flow, cumulative net flow and profitability
+for all deliverables of a request as whole-column numpy operations, so
+framework agreements with thousands of BoQ lines cost a handful of array
+passes instead of a Python loop with per-line arithmetic. The same columns
+are available as a pandas DataFrame for time-series and aggregate views.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Share of direct costs (salaries + tools + others) charged as variable overhead
+OVERHEAD_RATE = 0.15
+
+# How the fixed monthly overhead is charged to deliverables:
+# per_deliverable - every deliverable pays the full monthly overhead for each month of its catalog duration
+# shared - each month's overhead is split evenly across the deliverables in progress that month
+# shared_by_cost - as shared, in proportion to each deliverable's direct cost per month
+OVERHEAD_ALLOCATIONS = ("per_deliverable", "shared", "shared_by_cost")
+
+RESPONSE_COLUMNS = [
+    "deliverable_name", "due_date", "service_id", "cash_in", "salaries", "tools", "others",
+    "overhead", "cash_out", "net_flow", "cumulative_net_flow", "is_profitable",
+]
+
+
+def allocate_overhead(first: np.ndarray, last: np.ndarray, weights: np.ndarray, monthly_overhead: float) -> np.ndarray:
+    """Each month's overhead split across the [first, last] month intervals covering it, in proportion to weights.
+
+    One sweep over the sorted interval boundaries: the active weight of every
+    stretch between consecutive boundaries comes from a difference array, and
+    a deliverable's share is its weight times the running sum of overhead per
+    unit of active weight across its interval. O(n log n) for the sort,
+    whatever the number of months. Months no deliverable covers are not charged.
+    """
+    if not first.size:
+        return np.zeros(0)
+    boundaries = np.unique(np.concatenate([first, last + 1]))
+    opens = np.searchsorted(boundaries, first)
+    closes = np.searchsorted(boundaries, last + 1)
+    active = np.cumsum(
+        np.bincount(opens, weights=weights, minlength=boundaries.size)
+        - np.bincount(closes, weights=weights, minlength=boundaries.size)
+    )[:-1]
+    # Opening and closing the same weights leaves float dust on stretches nothing covers
+    covered = active > weights.max() * 1e-9
+    per_weight = np.zeros(active.size)
+    per_weight[covered] = monthly_overhead * np.diff(boundaries)[covered] / active[covered]
+    running = np.concatenate([[0.0], np.cumsum(per_weight)])
+    return weights * (running[closes] - running[opens])
+
+
+def _overhead_weights(overhead_allocation: str, base_costs: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """Each deliverable's claim on the shared monthly overhead"""
+    return np.ones(months.size) if overhead_allocation == "shared" else base_costs / months
+
+
+def cost_columns(deliverables: Sequence[Any], catalog: Dict[str, dict], overhead_costs: Dict[str, float],
+                 overhead_allocation: str = "per_deliverable") -> Dict[str, Any]:
+    """Cost side of the cash flow, which does not depend on what the deliverables are priced at.
+
+    A deliverable is in progress for the catalog duration (one month for
+    custom deliverables) up to and including its due month. Raises ValueError
+    for an unknown service ID, naming the first one in request order, an
+    unknown overhead_allocation, or a malformed due date when allocating.
+    """
+    if overhead_allocation not in OVERHEAD_ALLOCATIONS:
+        raise ValueError(f"Unknown overhead allocation '{overhead_allocation}', expected one of {', '.join(OVERHEAD_ALLOCATIONS)}")
+    # One pass over the models, then transpose into columns
+    names, due_dates, service_ids, amounts, salaries, tools, others = (
+        list(column) for column in zip(*[
+            (d.name, d.due_date, d.service_id, d.amount, d.salaries, d.tools, d.others) for d in deliverables
+        ])
+    ) if deliverables else ([], [], [], [], [], [], [])
+    salaries = np.array(salaries, dtype=float)
+    tools = np.array(tools, dtype=float)
+    others = np.array(others, dtype=float)
+
+    # Catalog lookups: one dict probe per row, then everything else is whole-array arithmetic
+    prices = {service_id: service["price"] for service_id, service in catalog.items()}
+    durations = {service_id: service["duration"] for service_id, service in catalog.items()}
+    has_service = np.array([service_id is not None for service_id in service_ids], dtype=bool)
+    catalog_price = np.array([prices.get(service_id, np.nan) for service_id in service_ids], dtype=float)
+    duration = np.array([durations.get(service_id, 1) for service_id in service_ids], dtype=float)
+
+    unknown_service = np.flatnonzero(has_service & np.isnan(catalog_price))
+    if unknown_service.size:
+        raise ValueError(f"Service ID {service_ids[unknown_service[0]]} not found in catalog")
+
+    base_costs = salaries + tools + others
+    monthly_overhead = sum(overhead_costs.values())
+    if overhead_allocation == "per_deliverable":
+        # Catalog duration scales the fixed monthly overhead
+        fixed_overhead = monthly_overhead * duration
+    else:
+        months = np.maximum(np.rint(duration).astype("int64"), 1)
+        last = _to_months(due_dates).astype("int64")
+        weights = _overhead_weights(overhead_allocation, base_costs, months)
+        fixed_overhead = allocate_overhead(last - months + 1, last, weights, monthly_overhead)
+    overhead = base_costs * OVERHEAD_RATE + fixed_overhead
+
+    return {
+        "deliverable_name": names,
+        "due_date": due_dates,
+        "service_id": service_ids,
+        "amount": np.array([np.nan if value is None else value for value in amounts], dtype=float),
+        "catalog_price": catalog_price,
+        "has_service": has_service,
+        "salaries": salaries,
+        "tools": tools,
+        "others": others,
+        "overhead": overhead,
+        "fixed_overhead": fixed_overhead,
+        "cash_out": base_costs + overhead,
+        "duration": duration,
+    }
+
+
+def cashflow_columns(deliverables: Sequence[Any], catalog: Dict[str, dict], overhead_costs: Dict[str, float],
+                     overhead_allocation: str = "per_deliverable") -> Dict[str, np.ndarray]:
+    """Every cash-flow column for the deliverables, as aligned numpy arrays.
+
+    deliverables are DeliverableData models (or anything with the same attributes).
+    Raises ValueError for an unknown service ID, then for a missing amount.
+    """
+    costs = cost_columns(deliverables, catalog, overhead_costs, overhead_allocation)
+    amount = costs["amount"]
+    missing_amount = np.flatnonzero(~costs["has_service"] & np.isnan(amount))
+    if missing_amount.size:
+        raise ValueError("Amount is required when service ID is not provided")
+
+    # Catalog price fills in when no amount was given
+    cash_in = np.where(np.isnan(amount), costs["catalog_price"], amount)
+    net_flow = cash_in - costs["cash_out"]
+
+    return {
+        "deliverable_name": costs["deliverable_name"],
+        "due_date": costs["due_date"],
+        "service_id": costs["service_id"],
+        "cash_in": cash_in,
+        "salaries": costs["salaries"],
+        "tools": costs["tools"],
+        "others": costs["others"],
+        "overhead": costs["overhead"],
+        "fixed_overhead": costs["fixed_overhead"],
+        "cash_out": costs["cash_out"],
+        "net_flow": net_flow,
+        "cumulative_net_flow": np.cumsum(net_flow),
+        "is_profitable": net_flow > 0,
+        "duration": costs["duration"],
+    }
+
+
+def build_cashflow_frame(deliverables: Sequence[Any], catalog: Dict[str, dict], overhead_costs: Dict[str, float],
+                         overhead_allocation: str = "per_deliverable") -> pd.DataFrame:
+    """cashflow_columns as a DataFrame, one row per deliverable, for time-series and aggregate views"""
+    return pd.DataFrame(cashflow_columns(deliverables, catalog, overhead_costs, overhead_allocation))
+
+
+def summarize_cashflow(columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    total_revenue = float(np.sum(columns["cash_in"]))
+    total_costs = float(np.sum(columns["cash_out"]))
+    total_profit = total_revenue - total_costs
+    profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
+    return {
+        "total_revenue": total_revenue,
+        "total_costs": total_costs,
+        "total_profit": total_profit,
+        "profit_margin": round(profit_margin, 2),
+        "is_profitable": total_profit > 0,
+    }
+
+
+def cashflow_records(columns: Dict[str, np.ndarray], catalog: Dict[str, dict]) -> List[Dict[str, Any]]:
+    """Per-deliverable dicts in the /api/cashflow/deliverables response shape"""
+    values = [
+        column.tolist() if isinstance(column, np.ndarray) else column
+        for column in (columns[name] for name in RESPONSE_COLUMNS)
+    ]
+    records = [dict(zip(RESPONSE_COLUMNS, row)) for row in zip(*values)]
+
+    # One service_info dict per catalog entry, shared by every row that uses it
+    service_info = {
+        service_id: {
+            "name": service["name"],
+            "catalog_price": service["price"],
+            "duration": service["duration"],
+            "unit": service["unit"],
+        }
+        for service_id, service in catalog.items()
+    }
+    for record in records:
+        if record["service_id"] is not None:
+            record["service_info"] = service_info[record["service_id"]]
+    return records
+
+
+def deliverable_cashflow(deliverables: Sequence[Any], catalog: Dict[str, dict], overhead_costs: Dict[str, float],
+                         overhead_allocation: str = "per_deliverable") -> Dict[str, Any]:
+    columns = cashflow_columns(deliverables, catalog, overhead_costs, overhead_allocation)
+    summary = summarize_cashflow(columns)
+    if overhead_allocation != "per_deliverable":
+        summary["overhead_allocation"] = overhead_allocation
+        summary["fixed_overhead_charged"] = round(float(np.sum(columns["fixed_overhead"])), 2)
+    return {
+        "deliverables": cashflow_records(columns, catalog),
+        "summary": summary,
+    }
+
+
+def _to_months(dates: Sequence[str]) -> np.ndarray:
+    """YYYY-MM-DD strings to numpy month values; raises ValueError on a malformed date"""
+    try:
+        return np.array(dates, dtype="datetime64[D]").astype("datetime64[M]")
+    except ValueError as e:
+        raise ValueError(f"Invalid date format: {e}")
+
+
+def _spread(first: np.ndarray, last: np.ndarray, per_month: np.ndarray, size: int) -> np.ndarray:
+    """Sum of per_month over each inclusive [first, last] month range, via a difference array"""
+    diff = np.bincount(first, weights=per_month, minlength=size + 1)
+    diff -= np.bincount(last + 1, weights=per_month, minlength=size + 1)
+    return np.cumsum(diff)[:size]
+
+
+def _shared_overhead(first: np.ndarray, last: np.ndarray, weights: np.ndarray, monthly_overhead: float,
+                     size: int) -> np.ndarray:
+    """Shared fixed overhead per month: the whole monthly overhead in every month some weighted interval covers.
+
+    This is what allocate_overhead hands out, laid out by month instead of by
+    deliverable. Months before index 0 are charged in month 0, the way work
+    before the project start is.
+    """
+    if not first.size:
+        return np.zeros(size)
+    shift = max(0, -int(first.min()))
+    active = _spread(first + shift, last + shift, weights, size + shift)
+    charged = np.where(active > weights.max() * 1e-9, float(monthly_overhead), 0.0)
+    return np.concatenate([[charged[:shift + 1].sum()], charged[shift + 1:]])
+
+
+def monthly_timeline(deliverables: Sequence[Any], resources: Sequence[Any], start_date: str, end_date: str,
+                     catalog: Dict[str, dict], overhead_costs: Dict[str, float], payment_delay_months: int = 0,
+                     overhead_allocation: str = "per_deliverable") -> Dict[str, Any]:
+    """Cash in and cash out per calendar month over the project window.
+
+    Deliverables are paid in their due month; their direct costs are spread
+    evenly over the catalog duration leading up to the due month, never before
+    the project start. Fixed overhead follows overhead_allocation (see
+    cost_columns): per deliverable it is spread like the direct costs, shared
+    it is the monthly overhead in every month some deliverable is in progress. Resources (ResourceRate models) cost
+    monthly_cost and bill monthly_rate per head for every month they are active.
+    Client payments arrive payment_delay_months after they are earned, which is
+    what drives the negative balance the project has to finance.
+    """
+    start_month, end_month = _to_months([start_date, end_date])
+    if end_month < start_month:
+        raise ValueError("End date must be after start date")
+
+    columns = cashflow_columns(deliverables, catalog, overhead_costs, overhead_allocation)
+    due = _to_months(columns["due_date"]).astype("int64") - start_month.astype("int64")
+    if due.size and due.min() < 0:
+        raise ValueError(f"Deliverable '{columns['deliverable_name'][int(np.argmin(due))]}' is due before the project start")
+    duration = np.maximum(np.rint(columns["duration"]).astype("int64"), 1)
+    work_start = np.maximum(due - duration + 1, 0)
+
+    resource_first = _to_months([r.start_date or start_date for r in resources]).astype("int64") - start_month.astype("int64")
+    resource_last = _to_months([r.end_date or end_date for r in resources]).astype("int64") - start_month.astype("int64")
+    if resource_first.size and (resource_first.min() < 0 or (resource_last < resource_first).any()):
+        raise ValueError("Resource periods must fall inside the project window and end after they start")
+    headcount = np.array([r.count for r in resources], dtype=float)
+    resource_cost = np.array([r.monthly_cost for r in resources], dtype=float) * headcount
+    resource_billing = np.array([r.monthly_rate for r in resources], dtype=float) * headcount
+
+    # The timeline runs to the project end or the last payment, whichever is later
+    last_event = [int(end_month.astype("int64") - start_month.astype("int64"))]
+    if due.size:
+        last_event.append(int(due.max()) + payment_delay_months)
+    if resource_last.size:
+        last_event.append(int(resource_last.max()) + payment_delay_months)
+    size = max(last_event) + 1
+
+    cash_in = np.bincount(due + payment_delay_months, weights=columns["cash_in"], minlength=size)
+    cash_in += _spread(resource_first + payment_delay_months, resource_last + payment_delay_months, resource_billing, size)
+    window = due - work_start + 1
+    cash_out = _spread(work_start, due, (columns["cash_out"] - columns["fixed_overhead"]) / window, size)
+    if overhead_allocation == "per_deliverable":
+        cash_out += _spread(work_start, due, columns["fixed_overhead"] / window, size)
+    else:
+        direct = columns["salaries"] + columns["tools"] + columns["others"]
+        cash_out += _shared_overhead(due - duration + 1, due, _overhead_weights(overhead_allocation, direct, duration),
+                                     sum(overhead_costs.values()), size)
+    cash_out += _spread(resource_first, resource_last, resource_cost, size)
+    # Difference arrays leave float dust on months with no activity
+    cash_in, cash_out = np.round(cash_in, 2), np.round(cash_out, 2)
+
+    net_flow = cash_in - cash_out
+    cumulative = np.cumsum(net_flow)
+    exposure = np.maximum(-cumulative, 0)
+    labels = (start_month + np.arange(size)).astype(str).tolist()
+
+    lowest = int(np.argmin(cumulative))
+    negative = np.flatnonzero(cumulative < 0)
+    if negative.size == 0:
+        break_even_month = labels[0]
+    elif negative[-1] + 1 < size:
+        break_even_month = labels[negative[-1] + 1]
+    else:
+        break_even_month = None
+
+    months = [
+        dict(zip(("month", "cash_in", "cash_out", "net_flow", "cumulative_net_flow", "exposure"), row))
+        for row in zip(labels, cash_in.tolist(), cash_out.tolist(), np.round(net_flow, 2).tolist(),
+                       np.round(cumulative, 2).tolist(), np.round(exposure, 2).tolist())
+    ]
+    return {
+        "months": months,
+        "summary": {
+            "start_month": labels[0],
+            "end_month": labels[-1],
+            "total_months": size,
+            "total_cash_in": round(float(cash_in.sum()), 2),
+            "total_cash_out": round(float(cash_out.sum()), 2),
+            "net_cash_flow": round(float(net_flow.sum()), 2),
+            "peak_negative_balance": round(min(float(cumulative[lowest]), 0.0), 2),
+            "peak_negative_month": labels[lowest] if cumulative[lowest] < 0 else None,
+            "months_in_deficit": int(negative.size),
+            "break_even_month": break_even_month,
+            "payment_delay_months": payment_delay_months,
+        },
+    }
+
+
+# --- Monte Carlo scenarios ---
+
+MAX_SLIPPAGE_MONTHS = 24
+SCENARIO_PERCENTILES = [10, 50, 90]
+
+
+def sample_distribution(spec: Dict[str, Any], size: int, rng: np.random.Generator) -> np.ndarray:
+    """Draw size values from a {"distribution": fixed | normal | uniform | triangular, ...} spec"""
+    kind = (spec.get("distribution") or "fixed").lower()
+
+    def param(name: str) -> float:
+        if spec.get(name) is None:
+            raise ValueError(f"A {kind} distribution needs '{name}'")
+        return float(spec[name])
+
+    if kind == "fixed":
+        return np.full(size, float(spec.get("value", 1.0)))
+    if kind == "normal":
+        std = param("std")
+        if std < 0:
+            raise ValueError("Standard deviation must not be negative")
+        return rng.normal(param("mean"), std, size)
+    if kind == "uniform":
+        low, high = param("low"), param("high")
+        if high < low:
+            raise ValueError("Uniform distribution needs low <= high")
+        return rng.uniform(low, high, size)
+    if kind == "triangular":
+        low, mode, high = param("low"), param("mode"), param("high")
+        if not low <= mode <= high or low == high:
+            raise ValueError("Triangular distribution needs low <= mode <= high and low < high")
+        return rng.triangular(low, mode, high, size)
+    raise ValueError(f"Unknown distribution '{kind}'; use fixed, normal, uniform or triangular")
+
+
+def simulate_scenarios(deliverables: Sequence[Any], catalog: Dict[str, dict], overhead_costs: Dict[str, float],
+                       factors: Dict[str, Dict[str, Any]], simulations: int, seed: Optional[int] = None,
+                       start_date: Optional[str] = None, overhead_allocation: str = "per_deliverable") -> Dict[str, Any]:
+    """Monte Carlo over cost overruns and delivery slippage for a deliverable set.
+
+    factors holds distributions for the salaries, tools, others and overhead
+    multipliers (1.0 = as estimated) and for slippage_months. Each simulation
+    draws one value per factor and applies it to every deliverable: a 15%
+    salary overrun hits the whole team. Slippage delays every payment by that
+    many months and extends each deliverable's fixed monthly overhead by as long;
+    with a shared overhead_allocation only months no other deliverable already
+    covers cost extra.
+
+    Everything is linear in the factors, so the deliverables are reduced once to
+    monthly cost profiles per component and each simulation is a weighted sum of
+    those profiles: the work is O(simulations x months), independent of the
+    number of deliverables.
+    """
+    columns = cashflow_columns(deliverables, catalog, overhead_costs, overhead_allocation)
+    if not len(columns["cash_in"]):
+        raise ValueError("Provide at least one deliverable")
+    rng = np.random.default_rng(seed)
+
+    salary = np.clip(sample_distribution(factors.get("salaries", {}), simulations, rng), 0, None)
+    tools = np.clip(sample_distribution(factors.get("tools", {}), simulations, rng), 0, None)
+    others = np.clip(sample_distribution(factors.get("others", {}), simulations, rng), 0, None)
+    overhead = np.clip(sample_distribution(factors.get("overhead", {}), simulations, rng), 0, None)
+    slippage = np.clip(
+        np.rint(sample_distribution(factors.get("slippage_months", {"value": 0}), simulations, rng)), 0, MAX_SLIPPAGE_MONTHS
+    ).astype("int64")
+
+    # Month index of every deliverable's work window, relative to the first month of work
+    due_month = _to_months(columns["due_date"]).astype("int64")
+    duration = np.maximum(np.rint(columns["duration"]).astype("int64"), 1)
+    work_start = due_month - duration + 1
+    if start_date:
+        work_start = np.maximum(work_start, _to_months([start_date]).astype("int64")[0])
+    origin = int(min(work_start.min(), due_month.min()))
+    first, due = work_start - origin, due_month - origin
+    size = int(due.max()) + MAX_SLIPPAGE_MONTHS + 1
+    window = (due - first + 1).astype(float)
+
+    # Monthly profiles of each cost component as estimated (k = 0)
+    monthly_overhead = sum(overhead_costs.values())
+    slip_values = np.arange(int(slippage.max()) + 1)
+    if overhead_allocation == "per_deliverable":
+        fixed_profile = _spread(first, due, columns["fixed_overhead"] / window, size)
+        # k extra months of fixed overhead after each due month
+        extra_overhead_by_slip = np.vstack([
+            _spread(due + 1, due + k, np.full(due.size, float(monthly_overhead)), size) if k else np.zeros(size)
+            for k in slip_values
+        ])
+    else:
+        # Shared overhead over the catalog windows, each stretched by k months
+        direct = columns["salaries"] + columns["tools"] + columns["others"]
+        weights = _overhead_weights(overhead_allocation, direct, duration)
+        catalog_first = due_month - duration + 1 - origin
+        fixed_profile = _shared_overhead(catalog_first, due, weights, monthly_overhead, size)
+        extra_overhead_by_slip = np.vstack([
+            _shared_overhead(catalog_first, due + k, weights, monthly_overhead, size) - fixed_profile
+            for k in slip_values
+        ])
+    profiles = np.vstack([
+        _spread(first, due, columns[name] / window, size) for name in ("salaries", "tools", "others")
+    ] + [fixed_profile])
+
+    # Per slippage value: payments shifted by k months
+    cash_in_by_slip = np.vstack([np.bincount(due + k, weights=columns["cash_in"], minlength=size) for k in slip_values])
+
+    direct = salary[:, None] * profiles[0] + tools[:, None] * profiles[1] + others[:, None] * profiles[2]
+    cash_out = direct * (1 + OVERHEAD_RATE * overhead)[:, None]
+    cash_out += overhead[:, None] * (profiles[3] + extra_overhead_by_slip[slippage])
+    cumulative = np.cumsum(cash_in_by_slip[slippage] - cash_out, axis=1)
+
+    revenue = float(columns["cash_in"].sum())
+    total_cost = cash_out.sum(axis=1)
+    profit = revenue - total_cost
+    margin = profit / revenue * 100 if revenue > 0 else np.zeros(simulations)
+    peak_negative = np.minimum(cumulative.min(axis=1), 0)
+
+    # Curves stop at the last payment any simulation receives
+    last = int(due.max() + slippage.max()) + 1
+    labels = (np.datetime64(origin, "M") + np.arange(last)).astype(str).tolist()
+    curves = np.percentile(cumulative[:, :last], SCENARIO_PERCENTILES, axis=0)
+
+    def percentiles(values: np.ndarray) -> Dict[str, float]:
+        points = np.percentile(values, [5, 10, 25, 50, 75, 90, 95])
+        return {f"p{p}": round(float(v), 2) for p, v in zip((5, 10, 25, 50, 75, 90, 95), points)}
+
+    counts, edges = np.histogram(margin, bins=20)
+    return {
+        "simulations": simulations,
+        "revenue": round(revenue, 2),
+        "margin": {
+            "mean": round(float(margin.mean()), 2),
+            "std": round(float(margin.std()), 2),
+            "percentiles": percentiles(margin),
+            "histogram": {"edges": np.round(edges, 2).tolist(), "counts": counts.tolist()},
+        },
+        "profit": {"mean": round(float(profit.mean()), 2), "percentiles": percentiles(profit)},
+        "probability_of_loss": round(float((profit < 0).mean()), 4),
+        "peak_negative_balance": {
+            "mean": round(float(peak_negative.mean()), 2), "percentiles": percentiles(peak_negative)
+        },
+        "cumulative_cash_curves": {
+            "months": labels,
+            **{f"p{p}": np.round(curve, 2).tolist() for p, curve in zip(SCENARIO_PERCENTILES, curves)},
+        },
+    }
@@ -0,0 +1,149 @@
+"""
+Services Catalog Index for the Mutawazi Financial Proposal System
+Built once from SERVICES_CATALOG at startup: the parent/child tree implied by
+the codes ("1.0" -> "1.1", "1.2", ...) with price and duration rollups, an
+inverted index over names and descriptions for search, sorted codes for prefix
+lookup, and the serialized /api/services response with its ETag.
+"""
+
+import bisect
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# A query term in the name outweighs one in the description
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if len(token) > 1 or token.isdigit()]
+
+
+def parent_code(code: str, codes) -> Optional[str]:
+    """"1.2" -> "1.0", "1.2.3" -> "1.2"; None for top-level codes or when the parent is not in the catalog"""
+    parts = code.split(".")
+    if len(parts) > 2:
+        candidate = ".".join(parts[:-1])
+    elif len(parts) == 2 and parts[1] != "0":
+        candidate = f"{parts[0]}.0"
+    else:
+        return None
+    return candidate if candidate in codes else None
+
+
+def _code_key(code: str):
+    """Numeric ordering, so "1.10" sorts after "1.9\""""
+    return [int(part) if part.isdigit() else part for part in code.split(".")]
+
+
+class CatalogIndex:
+    def __init__(self, catalog: Dict[str, dict]):
+        self.catalog = catalog
+        self.codes = sorted(catalog)  # Lexicographic, for prefix range lookups
+        self.parents = {code: parent_code(code, catalog) for code in catalog}
+        self.children: Dict[str, List[str]] = {code: [] for code in catalog}
+        for code in sorted(catalog, key=_code_key):
+            if self.parents[code]:
+                self.children[self.parents[code]].append(code)
+        self.roots = [code for code in sorted(catalog, key=_code_key) if not self.parents[code]]
+        self.rollups = {code: self._rollup(code) for code in catalog}
+
+        # token -> {code: weight}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        for code, service in catalog.items():
+            for token in tokenize(service.get("name", "")):
+                self.postings.setdefault(token, {}).setdefault(code, 0)
+                self.postings[token][code] += NAME_WEIGHT
+            for token in tokenize(service.get("description", "")):
+                self.postings.setdefault(token, {}).setdefault(code, 0)
+                self.postings[token][code] += DESCRIPTION_WEIGHT
+        self.tokens = sorted(self.postings)
+
+        self.services_body = json.dumps(
+            {"services": catalog, "total_services": len(catalog)}, ensure_ascii=False
+        ).encode("utf-8")
+        self.services_etag = f'"{hashlib.sha256(self.services_body).hexdigest()[:32]}"'
+        self.tree_body = json.dumps(
+            {"tree": [self._tree_node(code) for code in self.roots], "total_services": len(catalog)}, ensure_ascii=False
+        ).encode("utf-8")
+        self.tree_etag = f'"{hashlib.sha256(self.tree_body).hexdigest()[:32]}"'
+
+    def _rollup(self, code: str) -> Dict[str, Any]:
+        """Aggregates over every descendant of a service"""
+        descendants, stack = [], list(self.children[code])
+        while stack:
+            child = stack.pop()
+            descendants.append(child)
+            stack.extend(self.children[child])
+        prices = [self.catalog[child]["price"] for child in descendants]
+        return {
+            "descendant_count": len(descendants),
+            "children_price_total": sum(prices),
+            "min_child_price": min(prices) if prices else None,
+            "max_child_price": max(prices) if prices else None,
+            "max_child_duration": max((self.catalog[child]["duration"] for child in descendants), default=None),
+        }
+
+    def _tree_node(self, code: str) -> Dict[str, Any]:
+        return {
+            "service_id": code,
+            **self.catalog[code],
+            "rollup": self.rollups[code],
+            "children": [self._tree_node(child) for child in self.children[code]],
+        }
+
+    def describe(self, code: str) -> Dict[str, Any]:
+        return {
+            "service_id": code,
+            **self.catalog[code],
+            "parent_id": self.parents[code],
+            "children": self.children[code],
+        }
+
+    def by_prefix(self, prefix: str) -> List[str]:
+        """Codes starting with prefix, in catalog order"""
+        start = bisect.bisect_left(self.codes, prefix)
+        end = bisect.bisect_left(self.codes, prefix + "\U0010ffff")
+        return sorted(self.codes[start:end], key=_code_key)
+
+    def _expand(self, term: str, prefix: bool) -> Dict[str, int]:
+        """Postings for a term; with prefix=True, merged postings of every indexed token starting with it"""
+        if not prefix:
+            return self.postings.get(term, {})
+        merged: Dict[str, int] = {}
+        position = bisect.bisect_left(self.tokens, term)
+        while position < len(self.tokens) and self.tokens[position].startswith(term):
+            for code, weight in self.postings[self.tokens[position]].items():
+                merged[code] = merged.get(code, 0) + weight
+            position += 1
+        return merged
+
+    def search(self, query: str = "", code_prefix: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+        """Services matching every query term (the last one as a prefix, for type-ahead), best first"""
+        terms = tokenize(query)
+        candidates = set(self.by_prefix(code_prefix)) if code_prefix else None
+
+        scores: Optional[Dict[str, int]] = None
+        for position, term in enumerate(terms):
+            postings = self._expand(term, prefix=position == len(terms) - 1)
+            if scores is None:
+                scores = dict(postings)
+            else:
+                scores = {code: score + postings[code] for code, score in scores.items() if code in postings}
+            if not scores:
+                break
+        if scores is None:  # No terms: everything under the prefix (or the whole catalog)
+            scores = {code: 0 for code in (candidates if candidates is not None else self.catalog)}
+        if candidates is not None:
+            scores = {code: score for code, score in scores.items() if code in candidates}
+
+        ranked = sorted(scores, key=lambda code: (-scores[code], _code_key(code)))
+        return {
+            "query": query,
+            "code_prefix": code_prefix,
+            "total": len(ranked),
+            "results": [{**self.describe(code), "score": scores[code]} for code in ranked[:limit]],
+        }
@@ -0,0 +1,372 @@
+"""
+Diagram Model for the RFP Proposal Generator
+Derives the proposal's diagrams from content that has already been generated
+instead of fixed templates: project phases and their durations from the
+implementation and timeline sections, components from the architecture
+sections, deliverables grouped by their headings, and payment milestones from
+a financial proposal's payment_schedule. Only the generated text is parsed -
+there are no model calls - and the result is Mermaid source for
+mermaid_renderer.
+"""
+
+import hashlib
+import json
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+# Content keys each diagram is derived from
+PHASE_KEYWORDS = ("implementation", "phase", "timeline", "milestone", "methodology", "schedule", "work_plan")
+ARCHITECTURE_KEYWORDS = ("architecture", "technical_approach", "solution_overview", "component")
+MODULE_KEYWORDS = ("modular", "module")
+DELIVERABLE_KEYWORDS = ("deliverable",)
+DIAGRAM_KINDS = ("timeline", "architecture", "modular", "implementation", "deliverables")
+# Section keys each kind of diagram is shown under, checked in this order
+SECTION_KINDS = (
+    ("timeline", ("timeline",)),
+    ("architecture", ("architecture", "technical_approach", "solution_overview")),
+    ("modular", ("modular",)),
+    ("implementation", ("implementation",)),
+    ("deliverables", ("deliverable",)),
+)
+
+MAX_PHASES = 8
+MAX_GROUPS = 6
+MAX_ITEMS = 5
+MAX_MENTION_EDGES = 12
+LABEL_CHARS = 48
+DEFAULT_PHASE_DAYS = 14
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30}
+
+HEADING = re.compile(r"^#{1,6}\s*(.+)$")
+BOLD_LINE = re.compile(r"^\*\*(.+?)\*\*:?$")
+BULLET = re.compile(r"^(?:[-*•●▪]|\d{1,2}[.)])\s+(.+)$")
+PHASE = re.compile(
+    r"^(phase|stage|sprint|step|wave|iteration)\s*(\d+|[ivx]+\b|one|two|three|four|five|six|seven|eight|nine|ten)"
+    r"\s*[:.\-–—)]*\s*(.*)$", re.IGNORECASE)
+# "Discovery Phase (2 weeks)"
+NAMED_PHASE = re.compile(r"^((?:\w+\s+){0,3}\w+)\s+(phase|stage)\b\s*[:.\-–—)]*\s*(.*)$", re.IGNORECASE)
+# "Weeks 1-4: Discovery", "Month 3 - Rollout"
+PERIOD = re.compile(r"^(day|week|month)s?\s+(\d+)(?:\s*(?:-|–|to)\s*(\d+))?\s*[:.\-–—)]*\s*(.*)$", re.IGNORECASE)
+PERIOD_RANGE = re.compile(r"\b(day|week|month)s?\s+(\d+)\s*(?:-|–|to)\s*(\d+)\b", re.IGNORECASE)
+DURATION = re.compile(r"(\d+(?:\.\d+)?)(?:\s*(?:-|–|to)\s*(\d+(?:\.\d+)?))?\s*(day|week|month)s?\b", re.IGNORECASE)
+# Characters that would end a Mermaid label or gantt task name early
+UNSAFE = re.compile(r'[\[\](){}|;"<>#`*_]+')
+
+
+def _plain(text: str) -> str:
+    text = re.sub(r"\*\*|__|`", "", text)
+    return re.sub(r"\s+", " ", text).strip(" \t-–—:.,;")
+
+
+def _label(text: str, limit: int = LABEL_CHARS) -> str:
+    """Text made safe for a node label or task name, cut at a word boundary"""
+    text = re.sub(r"\s+", " ", UNSAFE.sub(" ", text)).strip(" -–—.,")
+    if len(text) > limit:
+        text = text[:limit].rsplit(" ", 1)[0].rstrip(" -–—.,") + "…"
+    return text
+
+
+def _name(item: str) -> str:
+    """The name part of an item: its bold lead, or the text before a colon or dash"""
+    bold = re.match(r"\*\*(.+?)\*\*", item)
+    if bold:
+        return _plain(bold.group(1))
+    head = re.split(r":\s|\s[–—-]\s", item, maxsplit=1)[0]
+    return _plain(head)
+
+
+def _detail(item: str) -> str:
+    bold = re.match(r"\*\*(.+?)\*\*", item)
+    if bold:
+        return _plain(item[bold.end():])
+    parts = re.split(r":\s|\s[–—-]\s", item, maxsplit=1)
+    return _plain(parts[1]) if len(parts) > 1 else ""
+
+
+def outline(text: str) -> List[Dict[str, Any]]:
+    """Headings in order, each with the bullet items under it; items before any heading go under a None title"""
+    groups = [{"title": None, "items": []}]
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        heading = HEADING.match(line) or BOLD_LINE.match(line)
+        bullet = BULLET.match(line)
+        if heading:
+            groups.append({"title": _plain(heading.group(1)), "items": []})
+        elif bullet:
+            groups[-1]["items"].append(bullet.group(1).strip())
+        elif ((line.endswith(":") and len(line.split()) <= 10) or PHASE.match(line) or PERIOD.match(line)
+              or (NAMED_PHASE.match(line) and len(line.split()) <= 8)):
+            groups.append({"title": _plain(line), "items": []})
+    return [group for group in groups if group["title"] or group["items"]]
+
+
+def _texts(content: Dict[str, Any], keywords) -> List[str]:
+    return [
+        value for key, value in content.items()
+        if isinstance(value, str) and value and any(keyword in key.lower() for keyword in keywords)
+    ]
+
+
+def _timing(text: str):
+    """(offset_days, duration_days) stated in a line; either may be None"""
+    period = PERIOD_RANGE.search(text)
+    if period:
+        unit = UNIT_DAYS[period.group(1).lower()]
+        first, last = sorted((int(period.group(2)), int(period.group(3))))
+        return (first - 1) * unit, (last - first + 1) * unit
+    duration = DURATION.search(text)
+    if duration:
+        amount = float(duration.group(2) or duration.group(1))
+        return None, amount * UNIT_DAYS[duration.group(3).lower()]
+    return None, None
+
+
+def _phase(line: str, items: List[str]) -> Optional[Dict[str, Any]]:
+    """A phase from a heading or item such as "Phase 2: Build (6 weeks)" or "Weeks 1-4: Discovery" """
+    plain = _plain(line)
+    match = PHASE.match(plain)
+    named = NAMED_PHASE.match(plain)
+    if match:
+        rest = re.sub(r"\([^)]*\)", "", match.group(3))
+        title = f"{match.group(1).title()} {match.group(2)}"
+        name = f"{title}: {_name(rest)}" if _name(rest) else title
+        key = title.lower()
+        offset, days = _timing(plain)
+    elif named:
+        name = f"{_plain(named.group(1))} {named.group(2).title()}"
+        key = name.lower()
+        offset, days = _timing(plain)
+    else:
+        match = PERIOD.match(plain)
+        if not match:
+            return None
+        unit = UNIT_DAYS[match.group(1).lower()]
+        first = int(match.group(2))
+        last = int(match.group(3) or first)
+        first, last = sorted((first, last))
+        offset, days = (first - 1) * unit, (last - first + 1) * unit
+        name = _name(match.group(4)) or _plain(plain)
+        key = name.lower()
+    if days is None:
+        # A "Duration: 3 weeks" item under the phase
+        for item in items:
+            if re.match(r"(duration|timeline|timeframe|time frame)\b", _plain(item), re.IGNORECASE):
+                offset, days = _timing(_plain(item))
+                break
+    activities = [
+        _name(item) for item in items
+        if not re.match(r"(duration|timeline|timeframe|time frame)\b", _plain(item), re.IGNORECASE)
+    ]
+    return {"key": key, "name": _label(name), "offset": offset, "days": days, "items": [_label(a) for a in activities if a][:MAX_ITEMS]}
+
+
+def extract_phases(content: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Phases described across the implementation and timeline sections, first mention first"""
+    phases: List[Dict[str, Any]] = []
+    seen: Dict[str, Dict[str, Any]] = {}
+    for text in _texts(content, PHASE_KEYWORDS):
+        for group in outline(text):
+            candidates = []
+            if group["title"]:
+                candidates.append((group["title"], group["items"]))
+            candidates += [(item, []) for item in group["items"]]
+            for line, items in candidates:
+                phase = _phase(line, items)
+                if phase is None:
+                    continue
+                key = phase["key"]
+                if key in seen:
+                    # The same phase in another section may add its duration or activities
+                    known = seen[key]
+                    if known["days"] is None:
+                        known["offset"], known["days"] = phase["offset"], phase["days"]
+                    known["items"] = known["items"] or phase["items"]
+                    continue
+                seen[key] = phase
+                phases.append(phase)
+    return phases[:MAX_PHASES]
+
+
+def extract_groups(content: Dict[str, Any], keywords) -> List[Dict[str, Any]]:
+    """Headed groups of named items (components, modules, deliverables) from the matching sections"""
+    groups = []
+    for text in _texts(content, keywords):
+        for group in outline(text):
+            items = [(_label(_name(item)), _detail(item)) for item in group["items"]]
+            items = [(name, detail) for name, detail in items if name]
+            if items:
+                groups.append({"title": _label(group["title"]) if group["title"] else None, "items": items[:MAX_ITEMS]})
+    return groups[:MAX_GROUPS]
+
+
+def _weeks(days: float) -> str:
+    if days % 7 == 0:
+        weeks = int(days // 7)
+        return f"{weeks} week{'s' if weeks != 1 else ''}"
+    return f"{days:g} days"
+
+
+def timeline_diagram(phases: List[Dict[str, Any]], company_name: str, start: date) -> Optional[Dict[str, str]]:
+    if len(phases) < 2:
+        return None
+    lines = ["gantt", f"    title {_label(company_name)} Project Timeline", "    dateFormat YYYY-MM-DD", "    section Phases"]
+    end = 0.0
+    previous_end = 0.0
+    for index, phase in enumerate(phases, 1):
+        days = phase["days"] or DEFAULT_PHASE_DAYS
+        offset = phase["offset"] if phase["offset"] is not None else previous_end
+        task = re.sub(r"\s*:\s*", " - ", phase["name"])
+        lines.append(f"    {task} :p{index}, {(start + timedelta(days=offset)).isoformat()}, {days:g}d")
+        previous_end = offset + days
+        end = max(end, previous_end)
+    stated = sum(1 for phase in phases if phase["days"])
+    description = f"Schedule of the {len(phases)} phases described in the implementation plan, about {round(end / 7)} weeks in total"
+    if stated < len(phases):
+        description += f"; phases without a stated duration are shown as {_weeks(DEFAULT_PHASE_DAYS)}"
+    return {"title": "Project Timeline", "description": description + ".", "source": "\n".join(lines)}
+
+
+def implementation_diagram(phases: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    if len(phases) < 2:
+        return None
+    if not any(phase["items"] for phase in phases):
+        # Phases only: one chain of phase nodes
+        labels = [f"P{index}[{phase['name']}" + (f"<br>{_weeks(phase['days'])}]" if phase["days"] else "]")
+                  for index, phase in enumerate(phases, 1)]
+        lines = ["graph LR"] + [f"    {a} --> {b}" for a, b in zip(labels, labels[1:])]
+    else:
+        # One column per phase, its activities in order
+        lines = ["flowchart TD"]
+        for index, phase in enumerate(phases, 1):
+            title = phase["name"] + (f" ({_weeks(phase['days'])})" if phase["days"] else "")
+            lines.append(f'    subgraph "{title}"')
+            activities = phase["items"] or [phase["name"]]
+            for number, activity in enumerate(activities, 1):
+                lines.append(f"        P{index}A{number}[{activity}]")
+            lines += [f"        P{index}A{number} --> P{index}A{number + 1}" for number in range(1, len(activities))]
+            lines.append("    end")
+    return {
+        "title": "Implementation Process Flow",
+        "description": f"The {len(phases)} implementation phases in order, with the activities the proposal lists for each.",
+        "source": "\n".join(lines),
+    }
+
+
+def tree_diagram(groups: List[Dict[str, Any]], root: str, direction: str, mention_edges: bool) -> Optional[str]:
+    """Root -> group headings -> items; with mention_edges, dotted links where an item's description names another item"""
+    if sum(len(group["items"]) for group in groups) < 2:
+        return None
+    lines = [f"graph {direction}", f"    R[{_label(root)}]"]
+    names: Dict[str, str] = {}
+    details: Dict[str, str] = {}
+    for index, group in enumerate(groups, 1):
+        parent = "R"
+        if group["title"]:
+            parent = f"G{index}"
+            lines.append(f"    R --> {parent}[{group['title']}]")
+        for number, (name, detail) in enumerate(group["items"], 1):
+            node = names.setdefault(name.lower(), f"G{index}I{number}")
+            if node == f"G{index}I{number}":
+                lines.append(f"    {parent} --> {node}[{name}]")
+                details[node] = detail
+    if mention_edges:
+        added = 0
+        for node, detail in details.items():
+            for name, other in names.items():
+                if other != node and len(name) >= 4 and re.search(rf"\b{re.escape(name)}\b", detail, re.IGNORECASE):
+                    lines.append(f"    {node} -.-> {other}")
+                    added += 1
+            if added >= MAX_MENTION_EDGES:
+                break
+    return "\n".join(lines)
+
+
+def payment_diagram(schedule: List[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    milestones = [payment for payment in schedule if isinstance(payment, dict)]
+    if not milestones:
+        return None
+    labels = []
+    for index, payment in enumerate(milestones, 1):
+        name = _label(" ".join(str(payment.get(field) or "") for field in ("phase", "description")).strip()) or f"Payment {index}"
+        amount = payment.get("amount")
+        terms = [str(payment["percent"]).strip()] if payment.get("percent") not in (None, "") else []
+        if isinstance(amount, (int, float)):
+            terms.append(f"{amount:,.0f}")
+        labels.append(f"M{index}[{name}" + (f"<br>{_label(' · '.join(terms))}]" if terms else "]"))
+    lines = ["graph LR"] + ([f"    {labels[0]}"] if len(labels) == 1 else [f"    {a} --> {b}" for a, b in zip(labels, labels[1:])])
+    return {
+        "title": "Payment Milestones",
+        "description": f"The {len(milestones)} payment milestones of the financial proposal in order, with their share and amount.",
+        "source": "\n".join(lines),
+    }
+
+
+def section_kind(section_key: str) -> Optional[str]:
+    """Kind of diagram a section shows, or None"""
+    key = section_key.lower()
+    for kind, keywords in SECTION_KINDS:
+        if any(keyword in key for keyword in keywords):
+            return kind
+    return None
+
+
+def model_key(content: Dict[str, Any], company_name: str) -> str:
+    """Digest of everything the diagrams are derived from; other sections can change without invalidating them"""
+    keywords = PHASE_KEYWORDS + ARCHITECTURE_KEYWORDS + MODULE_KEYWORDS + DELIVERABLE_KEYWORDS
+    sources = {key: value for key, value in content.items() if any(keyword in key.lower() for keyword in keywords)}
+    sources["payment_schedule"] = content.get("payment_schedule")
+    payload = json.dumps([company_name, sources], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_diagram_model(content: Dict[str, Any], company_name: str, start: Optional[date] = None) -> Dict[str, List[Dict[str, str]]]:
+    """Diagrams for each kind of section (see DIAGRAM_KINDS); kinds with too little data get none"""
+    start = start or date.today()
+    phases = extract_phases(content)
+    model: Dict[str, List[Dict[str, str]]] = {kind: [] for kind in DIAGRAM_KINDS}
+
+    timeline = timeline_diagram(phases, company_name, start)
+    schedule = content.get("payment_schedule")
+    if timeline is None and isinstance(schedule, list):
+        timeline = payment_diagram(schedule)
+    if timeline:
+        model["timeline"].append(timeline)
+
+    implementation = implementation_diagram(phases)
+    if implementation:
+        model["implementation"].append(implementation)
+
+    components = extract_groups(content, ARCHITECTURE_KEYWORDS)
+    architecture = tree_diagram(components, "Proposed Solution", "TD", mention_edges=True)
+    if architecture:
+        count = sum(len(group["items"]) for group in components)
+        model["architecture"].append({
+            "title": "System Architecture",
+            "description": f"The {count} components named in the architecture and technical approach, grouped as the proposal describes them.",
+            "source": architecture,
+        })
+
+    modules = extract_groups(content, MODULE_KEYWORDS)
+    modular = tree_diagram(modules, "Core System", "LR", mention_edges=False)
+    if modular:
+        model["modular"].append({
+            "title": "Modular Solution Design",
+            "description": "The solution's modules and their parts as described in the proposal.",
+            "source": modular,
+        })
+
+    deliverables = extract_groups(content, DELIVERABLE_KEYWORDS)
+    if not deliverables and any(phase["items"] for phase in phases):
+        deliverables = [{"title": phase["name"], "items": [(item, "") for item in phase["items"]]} for phase in phases if phase["items"]]
+    breakdown = tree_diagram(deliverables, "Project Deliverables", "LR", mention_edges=False)
+    if breakdown:
+        count = sum(len(group["items"]) for group in deliverables)
+        model["deliverables"].append({
+            "title": "Project Deliverables Structure",
+            "description": f"The {count} deliverables listed in the proposal, organized by the headings they appear under.",
+            "source": breakdown,
+        })
+    return model
@@ -1,16 +1,17 @@
 
 
 # main.py - Fixed Enhanced FastAPI Backend for RFP Proposal Generator
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any, Tuple, Union
+from typing import List, Optional, Dict, Any, Set, Tuple, Union, Callable
 import os
 import uuid
 import shutil
-from datetime import datetime
+from datetime import date, datetime, timezone
 import json
+import hashlib
 import asyncio
 from dotenv import load_dotenv
 load_dotenv()
@@ -36,15 +37,33 @@ from docx.enum.style import WD_STYLE_TYPE
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image as PDFImage
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 import traceback
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+from job_store import JobStore, VersionConflictError
+from job_queue import JobQueue, LeaseLostError, QueueFullError
+from job_events import JobEventBus
+from artifact_sweeper import ArtifactSweeper, job_id_from_filename
+from artifacts import (
+    media_type_for, file_digest, precompress_artifact, compressed_variant, artifact_files,
+    etag_matches, parse_range, iter_file, iter_zip
+)
+from mermaid_renderer import DiagramCache, MermaidSyntaxError, PNG_SCALE
+from diagram_model import build_diagram_model, model_key, section_kind
+from email.utils import formatdate, parsedate_to_datetime
+import threading
+import socket
+from docx.oxml.ns import qn, nsdecls
+from docx.oxml import OxmlElement, parse_xml
+from xml.sax.saxutils import escape as xml_escape
 from io import BytesIO
 import time
+from functools import lru_cache, cached_property
+from dataclasses import dataclass
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait as wait_futures
+import multiprocessing
 
 # Arabic text processing
 try:
@@ -55,6 +74,21 @@ except ImportError:
     ARABIC_SUPPORT = False
     print("WARNING: Arabic text processing libraries not installed. Arabic support disabled.")
 
+# Shaping results are memoized per input string; titles, TOC entries and footers repeat a lot
+ARABIC_SHAPING_CACHE_SIZE = int(os.getenv("ARABIC_SHAPING_CACHE_SIZE", "8192"))
+# cache_hits counts hits in render processes only; this process's hits come from the lru_cache itself
+arabic_shaping_stats = {"calls": 0, "shaped": 0, "seconds": 0.0, "cache_hits": 0}
+
+@lru_cache(maxsize=ARABIC_SHAPING_CACHE_SIZE)
+def shape_arabic_text(text: str) -> str:
+    """Reshape and reorder Arabic text for display; only cache misses reach this body."""
+    start = time.perf_counter()
+    try:
+        return get_display(arabic_reshaper.reshape(text))
+    finally:
+        arabic_shaping_stats["shaped"] += 1
+        arabic_shaping_stats["seconds"] += time.perf_counter() - start
+
 # PDF font registration
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
@@ -150,6 +184,19 @@ app.add_middleware(
 UPLOAD_DIR = "uploads"
 OUTPUT_DIR = "outputs"
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+# Write the Word body as bulk OOXML instead of per-paragraph python-docx calls
+BULK_DOCX_WRITER = os.getenv("BULK_DOCX_WRITER", "1") != "0"
+# PDF output is still disabled by default; the fan-out renders it when switched on
+PDF_OUTPUT_ENABLED = os.getenv("PDF_OUTPUT_ENABLED", "0") == "1"
+# Output formats render in this many processes (0 renders them in threads instead)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(3, os.cpu_count() or 1))))
+# Render processes are spawned, so they import this module again. The process that starts the
+# pool exports its pid here; a child that finds its parent's pid skips the service singletons
+# (job store, queue, event bus, Gemini client) and keeps only the document generators
+RENDER_PARENT_ENV = "RFP_RENDER_PARENT_PID"
+IS_RENDER_PROCESS = os.getenv(RENDER_PARENT_ENV) == str(os.getppid())
+# Characters that are not allowed in XML 1.0 documents (python-docx rejects them too)
+INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
 
 # Ensure directories exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -179,6 +226,25 @@ class ProposalResponse(BaseModel):
     files: Optional[List[str]] = None
     progress: Optional[int] = None
     structure_info: Optional[Dict[str, Any]] = None
+    formats: Optional[Dict[str, Any]] = None
+    version: Optional[int] = None
+    queue_position: Optional[int] = None
+    estimated_start: Optional[str] = None
+    deduplicated: Optional[bool] = None
+
+class BatchJobStatus(ProposalResponse):
+    name: str
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    status: str
+    message: str
+    progress: int
+    counts: Dict[str, int]
+    jobs: List[BatchJobStatus]
+
+class SectionRegenerationRequest(BaseModel):
+    instructions: Optional[str] = None
 
 class ExtractedStructure(BaseModel):
     sections: List[Dict[str, Any]]
@@ -290,6 +356,19 @@ class Section:
         self.subsections.append(section)
         return self
     
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Section':
+        section = cls(
+            key=data.get('key', ''),
+            title=data.get('title', ''),
+            level=data.get('level', 1),
+            subsections=[cls.from_dict(sub) for sub in data.get('subsections', [])],
+            content_requirements=data.get('content_requirements', [])
+        )
+        section.number = data.get('number', '')
+        section.is_dynamic = data.get('is_dynamic', False)
+        return section
+    
     def to_dict(self):
         return {
             "key": self.key,
@@ -301,10 +380,67 @@ class Section:
             "subsections": [sub.to_dict() for sub in self.subsections]
         }
 
-# Visualization Document Generator for Mermaid Diagrams
+# Immutable intermediate proposal model shared by all output renderers
+@dataclass(frozen=True, eq=False)
+class ProposalSectionModel:
+    """Frozen counterpart of Section; renderers read the same attributes"""
+    key: str
+    title: str
+    level: int
+    number: str
+    is_dynamic: bool
+    content_requirements: Tuple[str, ...]
+    subsections: Tuple['ProposalSectionModel', ...]
+
+    @classmethod
+    def from_section(cls, section: Section) -> 'ProposalSectionModel':
+        return cls(
+            key=section.key,
+            title=section.title,
+            level=section.level,
+            number=section.number,
+            is_dynamic=section.is_dynamic,
+            content_requirements=tuple(section.content_requirements),
+            subsections=tuple(cls.from_section(sub) for sub in section.subsections)
+        )
+
+@dataclass(frozen=True, eq=False)
+class ProposalModel:
+    """Everything a renderer needs for one job, built once after content generation"""
+    job_id: str
+    company_name: str
+    sections: Tuple[ProposalSectionModel, ...]
+    content_items: Tuple[Tuple[str, Any], ...]
+    request_data: Tuple[Tuple[str, Any], ...]
+
+    @classmethod
+    def build(cls, job_id: str, request: 'ProposalRequest', structure: List[Section], content: dict) -> 'ProposalModel':
+        return cls(
+            job_id=job_id,
+            company_name=request.company_name,
+            sections=tuple(ProposalSectionModel.from_section(section) for section in structure),
+            content_items=tuple(content.items()),
+            request_data=tuple(request.dict().items())
+        )
+
+    @cached_property
+    def content(self) -> dict:
+        return dict(self.content_items)
+
+    @cached_property
+    def request(self) -> 'ProposalRequest':
+        return ProposalRequest(**dict(self.request_data))
+
+DIAGRAM_MODEL_CACHE_SIZE = int(os.getenv("DIAGRAM_MODEL_CACHE_SIZE", "128"))
+
+# Visualization Document Generator: Mermaid diagrams rendered offline and embedded in every output
 class VisualizationDocumentGenerator:
     def __init__(self):
         self.diagram_generator = MermaidDiagramGenerator()
+        self.diagram_cache = DiagramCache()
+        # (diagram_model.model_key, start date) -> diagram model; regenerating an unrelated section keeps the entry
+        self._models: Dict[Tuple[str, date], Dict[str, List[Dict[str, str]]]] = {}
+        self._model_lock = threading.Lock()
     
     def generate_visualization_html(self, content: dict, structure: List[Section], company_name: str, job_id: str, request: 'ProposalRequest') -> str:
         """Generate a separate HTML file with all visualizations"""
@@ -316,7 +452,6 @@ class VisualizationDocumentGenerator:
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{company_name} - Project Visualizations</title>
-    <script src="https://cdn.jsdelivr.net/npm/mermaid/dist/mermaid.min.js"></script>
     <style>
         body {{
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
@@ -342,10 +477,13 @@ class VisualizationDocumentGenerator:
             border-radius: 10px;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
         }}
-        .mermaid {{
+        .diagram {{
             text-align: center;
             margin: 2rem 0;
+            overflow-x: auto;
         }}
+        .diagram svg {{ max-width: 100%; height: auto; }}
+        .diagram pre {{ text-align: left; background: #f4f4f4; padding: 1rem; border-radius: 5px; }}
         h1 {{ margin: 0; font-size: 2.5rem; }}
         h2 {{ color: #667eea; border-bottom: 2px solid #667eea; padding-bottom: 0.5rem; }}
         h3 {{ color: #555; }}
@@ -367,24 +505,27 @@ class VisualizationDocumentGenerator:
 <body>
     <div class="header">
         <h1>Project Visualizations</h1>
-        <p>Interactive Diagrams and Timeline for {company_name}</p>
+        <p>Diagrams and Timeline for {company_name}</p>
         <p>Proposal Type: {request.proposal_type.title()} | Sector: {request.sector.title()}</p>
     </div>
 """
         
-        # Generate visualizations for each relevant section
-        for section in structure:
-            if self._should_include_visualization(section):
-                html_content += self._generate_section_visualization(section, content, request)
+        # Each kind of diagram is shown once, under the first selected section of that kind
+        diagrams = self.diagrams_by_section(structure, content, request)
+        for section in self._flatten(structure):
+            if section.key in diagrams:
+                html_content += self._generate_section_visualization(section, diagrams[section.key])
+        if not diagrams:
+            html_content += """
+    <div class="visualization-section">
+        <p>The proposal does not describe phases, components or deliverables in enough detail to draw diagrams from.</p>
+    </div>
+"""
         
         html_content += f"""
     <div class="timestamp">
         Generated on {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
     </div>
-    
-    <script>
-        mermaid.initialize({{ startOnLoad: true, theme: 'default' }});
-    </script>
 </body>
 </html>
 """
@@ -398,177 +539,71 @@ class VisualizationDocumentGenerator:
         
         return visualization_filename
     
-    def _should_include_visualization(self, section: Section) -> bool:
-        """Check if section should have visualizations"""
-        visual_keywords = ['timeline', 'architecture', 'modular', 'implementation', 'deliverables', 'structure']
-        return any(keyword in section.key.lower() for keyword in visual_keywords)
+    def _flatten(self, sections) -> list:
+        flat = []
+        for section in sections:
+            flat.append(section)
+            flat.extend(self._flatten(section.subsections))
+        return flat
     
-    def _generate_section_visualization(self, section: Section, content: dict, request: 'ProposalRequest') -> str:
+    def _generate_section_visualization(self, section, diagrams: List[Dict[str, str]]) -> str:
         """Generate visualization for a specific section"""
         section_html = f"""
     <div class="visualization-section">
         <h2>{section.number}. {section.title}</h2>
 """
-        
-        # Generate appropriate diagram based on section type
-        if 'timeline' in section.key.lower():
-            section_html += self._generate_timeline_visualization(section, content, request)
-        elif 'architecture' in section.key.lower():
-            section_html += self._generate_architecture_visualization(section, content, request)
-        elif 'modular' in section.key.lower():
-            section_html += self._generate_modular_visualization(section, content, request)
-        elif 'implementation' in section.key.lower():
-            section_html += self._generate_implementation_visualization(section, content, request)
-        elif 'deliverables' in section.key.lower():
-            section_html += self._generate_deliverables_visualization(section, content, request)
-        
-        section_html += "</div>\n"
-        return section_html
-    
-    def _generate_timeline_visualization(self, section: Section, content: dict, request: 'ProposalRequest') -> str:
-        """Generate timeline visualization"""
-        return f"""
-        <h3>Project Timeline</h3>
-        <div class="description">
-            This interactive timeline shows the complete project schedule with all phases, milestones, and dependencies.
-        </div>
-        <div class="mermaid">
-gantt
-    title {request.company_name} Project Timeline
-    dateFormat YYYY-MM-DD
-    
-    section Planning Phase
-    Requirements Analysis    :active, req, 2024-01-01, 2w
-    System Design          :design, after req, 2w
-    
-    section Development Phase
-    Core Development       :dev, after design, 6w
-    Integration Testing    :test, after dev, 2w
-    
-    section Deployment Phase
-    User Training          :training, after test, 1w
-    Go-Live               :golive, after training, 1w
-        </div>
-"""
-    
-    def _generate_architecture_visualization(self, section: Section, content: dict, request: 'ProposalRequest') -> str:
-        """Generate architecture visualization"""
-        return f"""
-        <h3>System Architecture</h3>
-        <div class="description">
-            This diagram illustrates the complete system architecture with all components and their relationships.
-        </div>
-        <div class="mermaid">
-graph TD
-    A[User Interface Layer] --> B[API Gateway]
-    B --> C[Authentication Service]
-    B --> D[Business Logic Layer]
-    D --> E[Data Access Layer]
-    E --> F[(Primary Database)]
-    E --> G[(Cache Layer)]
-    D --> H[External Services]
-    I[Load Balancer] --> A
-    J[CDN] --> I
-        </div>
-"""
-    
-    def _generate_modular_visualization(self, section: Section, content: dict, request: 'ProposalRequest') -> str:
-        """Generate modular design visualization"""
-        return f"""
-        <h3>Modular Solution Design</h3>
+        for diagram in diagrams:
+            try:
+                figure = self.diagram_cache.svg(diagram['source'])
+            except (MermaidSyntaxError, OSError) as e:
+                print(f"Could not render {diagram['title']} diagram: {e}")
+                figure = f"<pre>{xml_escape(diagram['source'])}</pre>"
+            section_html += f"""
+        <h3>{xml_escape(diagram['title'])}</h3>
         <div class="description">
-            This diagram shows how our modular solution architecture enables scalability and maintainability.
-        </div>
-        <div class="mermaid">
-graph LR
-    Core[Core System] --> UserMgmt[User Management Module]
-    Core --> DataProc[Data Processing Module]
-    Core --> Reports[Reporting Module]
-    Core --> Integration[Integration Module]
-    
-    UserMgmt --> Auth[Authentication]
-    UserMgmt --> Profile[Profile Management]
-    UserMgmt --> Permissions[Permissions]
-    
-    DataProc --> Ingestion[Data Ingestion]
-    DataProc --> Validation[Data Validation]
-    DataProc --> Transform[Data Transformation]
-    
-    Reports --> Dashboard[Dashboard]
-    Reports --> Analytics[Analytics Engine]
-    Reports --> Export[Export Functions]
+            {xml_escape(diagram['description'])}
         </div>
+        <div class="diagram">{figure}</div>
 """
+        section_html += "</div>\n"
+        return section_html
     
-    def _generate_implementation_visualization(self, section: Section, content: dict, request: 'ProposalRequest') -> str:
-        """Generate implementation process visualization"""
-        return f"""
-        <h3>Implementation Process Flow</h3>
-        <div class="description">
-            This flowchart shows the step-by-step implementation process with decision points and deliverables.
-        </div>
-        <div class="mermaid">
-flowchart TD
-    A[Project Kickoff] --> B{{Requirements Review}}
-    B --> C[System Design]
-    C --> D[Development Sprint 1]
-    D --> E[Testing & QA]
-    E --> F{{Quality Gate}}
-    F -->|Pass| G[Development Sprint 2]
-    F -->|Fail| D
-    G --> H[Integration Testing]
-    H --> I[User Acceptance Testing]
-    I --> J{{UAT Approval}}
-    J -->|Approved| K[Production Deployment]
-    J -->|Changes Required| G
-    K --> L[Go-Live Support]
-        </div>
-"""
+    def diagram_model(self, content: dict, request: 'ProposalRequest') -> Dict[str, List[Dict[str, str]]]:
+        """Diagrams derived from the generated content, memoized by the content they depend on"""
+        start = date.today()
+        key = (model_key(content, request.company_name), start)
+        with self._model_lock:
+            model = self._models.get(key)
+        if model is None:
+            model = build_diagram_model(content, request.company_name, start)
+            with self._model_lock:
+                if len(self._models) >= DIAGRAM_MODEL_CACHE_SIZE:
+                    self._models.clear()
+                self._models[key] = model
+        return model
+    
+    def diagrams_by_section(self, structure: list, content: dict, request: 'ProposalRequest') -> Dict[str, List[Dict[str, str]]]:
+        """Section key -> diagrams shown under it; each kind goes to the first selected section of that kind"""
+        model = self.diagram_model(content, request)
+        placed = {}
+        shown = set()
+        for section in self._flatten(structure):
+            kind = section_kind(section.key)
+            if kind is None or kind in shown or not model[kind]:
+                continue
+            if request.selected_sections and section.key not in request.selected_sections:
+                continue
+            shown.add(kind)
+            placed[section.key] = model[kind]
+        return placed
     
-    def _generate_deliverables_visualization(self, section: Section, content: dict, request: 'ProposalRequest') -> str:
-        """Generate deliverables breakdown visualization"""
-        return f"""
-        <h3>Project Deliverables Structure</h3>
-        <div class="description">
-            This diagram shows all project deliverables organized by phase and their interdependencies.
-        </div>
-        <div class="mermaid">
-graph TD
-    subgraph "Phase 1: Planning"
-        A[Requirements Document]
-        B[System Architecture]
-        C[Project Plan]
-    end
-    
-    subgraph "Phase 2: Development"
-        D[Core System]
-        E[User Interface]
-        F[API Documentation]
-    end
-    
-    subgraph "Phase 3: Testing"
-        G[Test Results]
-        H[User Manual]
-        I[Training Materials]
-    end
-    
-    subgraph "Phase 4: Deployment"
-        J[Production System]
-        K[Support Documentation]
-        L[Maintenance Plan]
-    end
-    
-    A --> D
-    B --> D
-    B --> E
-    C --> D
-    D --> G
-    E --> G
-    G --> J
-    H --> I
-    I --> L
-        </div>
-"""
+    def diagram_png(self, source: str) -> Optional[str]:
+        """Path of the cached PNG rendering, or None when the source cannot be rendered"""
+        try:
+            return self.diagram_cache.png(source)
+        except (MermaidSyntaxError, OSError) as e:
+            print(f"Could not render diagram: {e}")
+            return None
 
 # AI Configuration
 class AIConfig:
@@ -587,7 +622,7 @@ class AIConfig:
             print("GEMINI_API_KEY not found in environment variables")
             self.model = None
 
-ai_config = AIConfig()
+ai_config = None if IS_RENDER_PROCESS else AIConfig()  # Rendering never calls the model
 
 # Enhanced Document Processor with Intelligent Structure Extraction
 class EnhancedDocumentProcessor:
@@ -633,6 +668,20 @@ class EnhancedDocumentProcessor:
         except Exception as e:
             return f"Image content extracted (OCR processing error: {str(e)})"
     
+    def estimate_page_count(self, file_path: str) -> int:
+        """Cheap page estimate used for admission, without extracting any text"""
+        file_ext = os.path.splitext(file_path)[1].lower()
+        try:
+            if file_ext == '.pdf':
+                with open(file_path, 'rb') as file:
+                    return max(1, len(PyPDF2.PdfReader(file).pages))
+            if file_ext in ['.docx', '.doc']:
+                words = sum(len(paragraph.text.split()) for paragraph in docx.Document(file_path).paragraphs)
+                return max(1, words // 500)
+        except Exception as e:
+            print(f"Could not count pages of {file_path}: {e}")
+        return 1
+
     def process_file(self, file_path: str) -> tuple:
         file_ext = os.path.splitext(file_path)[1].lower()
         
@@ -867,7 +916,7 @@ Ensure each section has appropriate content_requirements that guide content gene
 """
         
         try:
-            response = ai_config.model.generate_content(
+            response = await ai_config.model.generate_content_async(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
@@ -1018,17 +1067,31 @@ Ensure each section has appropriate content_requirements that guide content gene
         
         return flat_list
     
-    async def generate_proposal_content(self, rfp_text: str, structure: List[Section], request: ProposalRequest) -> dict:
+    async def generate_proposal_content(self, rfp_text: str, structure: List[Section], request: ProposalRequest,
+                                        on_section_complete: Optional[Callable[[Section, str, int, int], None]] = None,
+                                        completed_sections: Optional[Dict[str, str]] = None) -> dict:
+        """Generate content for every selected section not already in completed_sections (a checkpoint)"""
         try:
             flat_sections = self.flatten_sections(structure)
-            sections_to_generate = self._filter_sections(flat_sections, request)
+            completed_sections = completed_sections or {}
+            selected_sections = self._filter_sections(flat_sections, request)
+            sections_to_generate = [s for s in selected_sections if s.key not in completed_sections]
             
             if ai_config.model:
-                content = await self._generate_content_with_ai(rfp_text, sections_to_generate, request)
+                content = await self._generate_content_with_ai(
+                    rfp_text, sections_to_generate, request, on_section_complete,
+                    already_completed=len(selected_sections) - len(sections_to_generate)
+                )
             else:
                 content = self._generate_mock_content(sections_to_generate, request)
+                if on_section_complete:
+                    offset = len(selected_sections) - len(sections_to_generate)
+                    for index, section in enumerate(sections_to_generate, offset + 1):
+                        on_section_complete(section, content[section.key], index, len(selected_sections))
             
-            return content
+            # Keep document order: checkpointed and fresh sections interleave
+            merged = {**completed_sections, **content}
+            return {s.key: merged[s.key] for s in selected_sections if s.key in merged}
         except Exception as e:
             print(f"Error generating content: {e}")
             raise HTTPException(status_code=500, detail=f"Error generating content: {str(e)}")
@@ -1039,12 +1102,24 @@ Ensure each section has appropriate content_requirements that guide content gene
         
         return [s for s in sections if s.key in request.selected_sections]
     
-    async def _generate_content_with_ai(self, rfp_text: str, sections: List[Section], request: ProposalRequest) -> dict:
+    async def _generate_content_with_ai(self, rfp_text: str, sections: List[Section], request: ProposalRequest,
+                                        on_section_complete: Optional[Callable[[Section, str, int, int], None]] = None,
+                                        already_completed: int = 0) -> dict:
         content = {}
         tasks = []
+        completed = already_completed
+        total = already_completed + len(sections)
+
+        async def generate(section: Section) -> Optional[str]:
+            nonlocal completed
+            section_content = await self._generate_single_section_content(rfp_text, section, request)
+            completed += 1
+            if on_section_complete:
+                on_section_complete(section, section_content, completed, total)
+            return section_content
 
         for section in sections:
-            tasks.append(self._generate_single_section_content(rfp_text, section, request))
+            tasks.append(generate(section))
 
         results = await asyncio.gather(*tasks)
 
@@ -1054,7 +1129,13 @@ Ensure each section has appropriate content_requirements that guide content gene
 
         return content
 
-    async def _generate_single_section_content(self, rfp_text: str, section: Section, request: ProposalRequest) -> Optional[str]:
+    async def regenerate_section_content(self, rfp_text: str, section: Section, request: ProposalRequest, instructions: Optional[str] = None) -> Optional[str]:
+        """Generate fresh content for a single section (one LLM call)"""
+        if ai_config.model:
+            return await self._generate_single_section_content(rfp_text, section, request, instructions)
+        return self._generate_mock_content([section], request)[section.key]
+
+    async def _generate_single_section_content(self, rfp_text: str, section: Section, request: ProposalRequest, instructions: Optional[str] = None) -> Optional[str]:
         section_info = f"{section.number}. {section.title} (Level {section.level})"
         if section.content_requirements:
             section_info += f" - Requirements: {', '.join(section.content_requirements)}"
@@ -1130,12 +1211,15 @@ GENERAL REQUIREMENTS:
 8. IMPORTANT: Incorporate relevant insights from the special and additional documents where applicable to this section.
 9. Reference standards, best practices, and methodologies from the supporting documents when relevant.
 10. CRITICAL: For deliverables and pricing sections, focus on BUSINESS VALUE and CLIENT OUTCOMES first.
-
+{f'''
+REVIEWER FEEDBACK (this section is being rewritten, follow these instructions):
+{instructions}
+''' if instructions else ''}
 Respond with ONLY the detailed content for the section as a single string, in {request.language}. Do not wrap it in JSON or markdown.
 """
 
         try:
-            response = ai_config.model.generate_content(
+            response = await ai_config.model.generate_content_async(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
                     temperature=0.7,
@@ -1209,7 +1293,7 @@ Respond with a concise but comprehensive analysis (maximum 1500 words) that can
 """
 
                 try:
-                    response = ai_config.model.generate_content(prompt)
+                    response = await ai_config.model.generate_content_async(prompt)
                     insights = response.text.strip()
                     print(f"Generated special document insights: {len(insights)} characters")
                     return insights
@@ -1248,7 +1332,7 @@ Provide a well-organized analysis (maximum 2000 words) that identifies the most
 """
 
                 try:
-                    response = ai_config.model.generate_content(prompt)
+                    response = await ai_config.model.generate_content_async(prompt)
                     insights = response.text.strip()
                     print(f"Generated additional documents insights: {len(insights)} characters")
                     return insights
@@ -1357,14 +1441,29 @@ class EnhancedDocumentGenerator:
     def _process_arabic_text(self, text):
         if not text or not ARABIC_SUPPORT:
             return text
+        arabic_shaping_stats["calls"] += 1
         try:
-            reshaped_text = arabic_reshaper.reshape(text)
-            bidi_text = get_display(reshaped_text)
-            return bidi_text
+            return shape_arabic_text(text)
         except Exception as e:
             print(f"Arabic text processing error: {e}")
             return text
 
+    def process_arabic_texts(self, texts: List[str]) -> List[str]:
+        """Shape a list of strings, shaping each distinct string only once"""
+        shaped = {text: self._process_arabic_text(text) for text in dict.fromkeys(texts)}
+        return [shaped[text] for text in texts]
+
+    def get_arabic_shaping_stats(self) -> dict:
+        """Shaping counters since startup, for timing Arabic rendering separately"""
+        cache_info = shape_arabic_text.cache_info()
+        return {
+            "calls": arabic_shaping_stats["calls"],
+            "shaped": arabic_shaping_stats["shaped"],
+            "cache_hits": cache_info.hits + arabic_shaping_stats["cache_hits"],
+            "cache_size": cache_info.currsize,
+            "shaping_seconds": round(arabic_shaping_stats["seconds"], 4)
+        }
+
     def add_page_numbers_and_logos_to_word(self, doc, logo_top_left_path: Optional[str] = None, logo_bottom_right_path: Optional[str] = None, lang: str = 'en'):
         """Adds page numbers and logos to each section footer in a Word document."""
         
@@ -1583,7 +1682,10 @@ class EnhancedDocumentGenerator:
             self._create_custom_styles(doc)
             self._create_title_page(doc, company_name, lang)
             self._create_dynamic_toc(doc, structure, request, lang)
-            self._add_dynamic_content(doc, structure, content, request, lang)
+            if BULK_DOCX_WRITER:
+                self._add_dynamic_content_bulk(doc, structure, content, request, lang)
+            else:
+                self._add_dynamic_content(doc, structure, content, request, lang)
             self.add_page_numbers_and_logos_to_word(
                 doc, 
                 request.logo_top_left_path, 
@@ -1704,8 +1806,10 @@ class EnhancedDocumentGenerator:
             if section.subsections:
                 self._add_toc_entries_recursive(doc, section.subsections, request, lang, level + 1)
     
-    def _add_dynamic_content(self, doc, sections: List[Section], content: dict, request: ProposalRequest, lang: str):
+    def _add_dynamic_content(self, doc, sections: List[Section], content: dict, request: ProposalRequest, lang: str, diagrams: Optional[dict] = None):
         """Add content based on dynamic structure"""
+        if diagrams is None:
+            diagrams = visualization_generator.diagrams_by_section(sections, content, request)
         for section in sections:
             if not self._should_include_section(section, request):
                 continue
@@ -1741,15 +1845,166 @@ class EnhancedDocumentGenerator:
                         for run in p.runs:
                             run.font.rtl = True
                     p.paragraph_format.space_after = Pt(12)
+
+            for diagram in diagrams.get(section.key, []):
+                image_path = visualization_generator.diagram_png(diagram['source'])
+                if image_path:
+                    doc.add_picture(image_path, width=self._diagram_width(image_path))
+                    doc.paragraphs[-1].alignment = WD_ALIGN_PARAGRAPH.CENTER
+                    caption = doc.add_paragraph(diagram['title'])
+                    caption.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                    caption.paragraph_format.space_after = Pt(12)
             
             doc.add_paragraph()
             
             if section.subsections:
-                self._add_dynamic_content(doc, section.subsections, content, request, lang)
+                self._add_dynamic_content(doc, section.subsections, content, request, lang, diagrams)
             
             if section.level == 1 and section != sections[-1]:
                 doc.add_page_break()
-    
+
+    def _add_dynamic_content_bulk(self, doc, sections: List[Section], content: dict, request: ProposalRequest, lang: str):
+        """Fast path for _add_dynamic_content: serialize the whole body as OOXML and insert it in one lxml call"""
+        style_ids = self._docx_style_ids(doc)
+        fragments = []
+        diagrams = visualization_generator.diagrams_by_section(sections, content, request)
+        self._build_body_xml(doc, fragments, sections, content, request, lang, style_ids, [0], diagrams)
+
+        container = parse_xml(f'<w:body {nsdecls("w")}>{"".join(fragments)}</w:body>')
+        body = doc.element.body
+        sectPr = body.find(qn('w:sectPr'))
+        index = body.index(sectPr) if sectPr is not None else len(body)
+        body[index:index] = list(container)
+
+    def _build_body_xml(self, doc, fragments: list, sections: List[Section], content: dict, request: ProposalRequest, lang: str, style_ids: dict, bookmark_counter: list, diagrams: dict):
+        """Append the OOXML for sections (and their subsections) to fragments, mirroring _add_dynamic_content"""
+        rtl = lang == 'ar'
+        heading_align = 'left' if lang == 'en' else 'right'
+
+        for section in sections:
+            if not self._should_include_section(section, request):
+                continue
+
+            clean_title = section.title.replace('*', '').replace('#', '')
+            bookmark_counter[0] += 1
+            fragments.append(self._ooxml_paragraph(
+                f'{section.number}. {clean_title}',
+                style_id=style_ids['headings'][min(section.level, 4)],
+                align=heading_align,
+                rtl=rtl,
+                bookmark=(bookmark_counter[0], f"section_{section.key}")
+            ))
+
+            if section.key in content and content[section.key]:
+                fragments.extend(self._section_body_xml(content[section.key], lang, style_ids))
+            fragments.extend(self._diagram_body_xml(doc, diagrams.get(section.key, [])))
+
+            fragments.append('<w:p/>')
+
+            if section.subsections:
+                self._build_body_xml(doc, fragments, section.subsections, content, request, lang, style_ids, bookmark_counter, diagrams)
+
+            if section.level == 1 and section != sections[-1]:
+                fragments.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    def _section_body_xml(self, section_content: str, lang: str, style_ids: dict) -> List[str]:
+        """OOXML paragraphs for one section's content lines (bullets become List Bullet paragraphs)"""
+        rtl = lang == 'ar'
+        body_align = 'both' if lang == 'en' else 'right'
+        fragments = []
+
+        cleaned_content = section_content.replace('*', '').replace('#', '')
+        for line in cleaned_content.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith(('- ', '• ')):
+                fragments.append(self._ooxml_paragraph(line[2:], style_id=style_ids['bullet'], align=body_align, rtl=rtl, space_after=240))
+            else:
+                fragments.append(self._ooxml_paragraph(line, align=body_align, rtl=rtl, space_after=240))
+
+        return fragments
+
+    def _diagram_body_xml(self, doc, diagrams: List[Dict[str, str]]) -> List[str]:
+        """OOXML paragraphs embedding a section's rendered diagrams, each followed by its title as caption"""
+        fragments = []
+        for diagram in diagrams:
+            image_path = visualization_generator.diagram_png(diagram['source'])
+            if not image_path:
+                continue
+            inline = doc.part.new_pic_inline(image_path, self._diagram_width(image_path), None)
+            fragments.append(f'<w:p><w:pPr><w:jc w:val="center"/></w:pPr><w:r><w:drawing>{inline.xml}</w:drawing></w:r></w:p>')
+            fragments.append(self._ooxml_paragraph(diagram['title'], align='center', space_after=240))
+        return fragments
+
+    def _diagram_width(self, image_path: str):
+        """Width of a diagram at its natural 96 dpi size, capped at the text width"""
+        with Image.open(image_path) as image:
+            natural_inches = image.width / PNG_SCALE / 96
+        return Inches(min(natural_inches, 6.0))
+
+    def _docx_style_ids(self, doc) -> dict:
+        return {
+            'bullet': doc.styles['List Bullet'].style_id,
+            'headings': {i: doc.styles[f'Heading {i}'].style_id for i in range(1, 5)}
+        }
+
+    def patch_word_section(self, filename: str, section_key: str, section_content: str, request: ProposalRequest, diagrams: List[Dict[str, str]]) -> bool:
+        """Replace one section's body in an existing Word document in place, located by its TOC bookmark.
+
+        The body is every paragraph between the bookmarked heading and the empty paragraph
+        that closes the section, including the section's diagrams; the given diagrams are
+        added back after the new text. Returns False when the section is not in the document.
+        """
+        lang = request.language if request.language in TRANSLATIONS else 'en'
+        filepath = os.path.join(OUTPUT_DIR, filename)
+        doc = Document(filepath)
+        body = doc.element.body
+
+        heading = None
+        for bookmark in body.iter(qn('w:bookmarkStart')):
+            if bookmark.get(qn('w:name')) == f"section_{section_key}":
+                heading = next(bookmark.iterancestors(qn('w:p')), None)
+                break
+        if heading is None:
+            return False
+
+        sibling = heading.getnext()
+        while sibling is not None and sibling.tag == qn('w:p') and sibling.find(qn('w:r')) is not None:
+            following = sibling.getnext()
+            body.remove(sibling)
+            sibling = following
+
+        fragments = self._section_body_xml(section_content, lang, self._docx_style_ids(doc))
+        fragments += self._diagram_body_xml(doc, diagrams)
+        if fragments:
+            container = parse_xml(f'<w:body {nsdecls("w")}>{"".join(fragments)}</w:body>')
+            index = body.index(heading) + 1
+            body[index:index] = list(container)
+
+        doc.save(filepath)
+        return True
+
+    def _ooxml_paragraph(self, text: str, style_id: Optional[str] = None, align: Optional[str] = None, rtl: bool = False, space_after: Optional[int] = None, bookmark: Optional[Tuple[int, str]] = None) -> str:
+        """Serialize a single-run paragraph; space_after is in twentieths of a point"""
+        ppr = ''
+        if style_id:
+            ppr += f'<w:pStyle w:val="{style_id}"/>'
+        if space_after is not None:
+            ppr += f'<w:spacing w:after="{space_after}"/>'
+        if align:
+            ppr += f'<w:jc w:val="{align}"/>'
+
+        text = xml_escape(INVALID_XML_CHARS.sub('', text))
+        run = f'<w:r>{"<w:rPr><w:rtl/></w:rPr>" if rtl else ""}<w:t xml:space="preserve">{text}</w:t></w:r>'
+        if bookmark:
+            bookmark_id, bookmark_name = bookmark
+            name = xml_escape(bookmark_name, {'"': '&quot;'})
+            run = f'<w:bookmarkStart w:id="{bookmark_id}" w:name="{name}"/>{run}<w:bookmarkEnd w:id="{bookmark_id}"/>'
+
+        return f'<w:p>{f"<w:pPr>{ppr}</w:pPr>" if ppr else ""}{run}</w:p>'
+
     def _should_include_section(self, section: Section, request: ProposalRequest) -> bool:
         """Check if section should be included based on user selection"""
         if not request.selected_sections:
@@ -1776,6 +2031,7 @@ class EnhancedDocumentGenerator:
 
             filename = f"proposal_{company_name.replace(' ', '_')}_{job_id}.pdf"
             filepath = os.path.join(OUTPUT_DIR, filename)
+            shaping_before = self.get_arabic_shaping_stats()
             
             doc = SimpleDocTemplate(filepath, pagesize=A4)
             styles = getSampleStyleSheet()
@@ -1816,13 +2072,27 @@ class EnhancedDocumentGenerator:
 
             buffer = BytesIO()
             doc_for_count = SimpleDocTemplate(buffer, pagesize=A4)
-            doc_for_count.build(story)
+            # build() consumes the list it is given; the final pass below needs the story intact
+            doc_for_count.build(list(story))
             total_pages = doc_for_count.page
             buffer.close()
+            # The same flowables are laid out again; a "postponed" mark left by the first pass would fail the second
+            for flowable in story:
+                flowable.__dict__.pop('_postponed', None)
+
+            # Shape every "Page X of Y" label in one batch instead of once per rendered page
+            page_labels = self._build_page_labels(total_pages, lang)
 
             # Pass 2: Build the final PDF with page numbers
-            handler = lambda canvas, doc: self._add_page_numbers_and_logos_to_pdf(canvas, doc, request.logo_top_left_path, request.logo_bottom_right_path, total_pages, lang)
+            handler = lambda canvas, doc: self._add_page_numbers_and_logos_to_pdf(canvas, doc, request.logo_top_left_path, request.logo_bottom_right_path, total_pages, lang, page_labels)
             doc.build(story, onFirstPage=handler, onLaterPages=handler)
+
+            if lang == 'ar':
+                shaping_after = self.get_arabic_shaping_stats()
+                print(f"Arabic shaping for {filename}: "
+                      f"{shaping_after['calls'] - shaping_before['calls']} strings, "
+                      f"{shaping_after['shaped'] - shaping_before['shaped']} shaped, "
+                      f"{shaping_after['shaping_seconds'] - shaping_before['shaping_seconds']:.3f}s")
             
             return filename
             
@@ -1831,19 +2101,27 @@ class EnhancedDocumentGenerator:
             traceback.print_exc()
             raise HTTPException(status_code=500, detail=f"Error generating PDF document: {str(e)}")
 
-    def _add_page_numbers_and_logos_to_pdf(self, canvas, doc, logo_top_left_path, logo_bottom_right_path, total_pages, lang: str = 'en'):
+    def _build_page_labels(self, total_pages: int, lang: str) -> List[str]:
+        """Footer labels for every page, already shaped when the document is Arabic"""
+        page_text = TRANSLATIONS[lang]['page']
+        of_text = TRANSLATIONS[lang]['of']
+        labels = [f"{page_text} {page} {of_text} {total_pages}" for page in range(1, total_pages + 1)]
+        if lang == 'ar' and AMIRI_FONT_PATH:
+            labels = self.process_arabic_texts(labels)
+        return labels
+
+    def _add_page_numbers_and_logos_to_pdf(self, canvas, doc, logo_top_left_path, logo_bottom_right_path, total_pages, lang: str = 'en', page_labels: Optional[List[str]] = None):
         """Add page numbers and logos to each page of a PDF document."""
         logo_top_left = self._get_image_for_doc(logo_top_left_path)
         logo_bottom_right = self._get_image_for_doc(logo_bottom_right_path)
         canvas.saveState()
         
-        page_text = TRANSLATIONS[lang]['page']
-        of_text = TRANSLATIONS[lang]['of']
-        page_number_text = f"{page_text} {doc.page} {of_text} {total_pages}"
+        if not page_labels:
+            page_labels = self._build_page_labels(total_pages, lang)
+        page_number_text = page_labels[min(doc.page, len(page_labels)) - 1]
         
         if lang == 'ar' and AMIRI_FONT_PATH:
             canvas.setFont('AmiriFamily', 9)
-            page_number_text = self._process_arabic_text(page_number_text)
         else:
             canvas.setFont('Times-Roman', 9)
 
@@ -1887,8 +2165,10 @@ class EnhancedDocumentGenerator:
             if section.subsections:
                 self._add_pdf_toc_recursive(story, section.subsections, styles, request, lang, level + 1)
     
-    def _add_pdf_content_recursive(self, story: list, sections: List[Section], content: dict, styles, request: ProposalRequest, lang: str):
+    def _add_pdf_content_recursive(self, story: list, sections: List[Section], content: dict, styles, request: ProposalRequest, lang: str, diagrams: Optional[dict] = None):
         """Add PDF content recursively"""
+        if diagrams is None:
+            diagrams = visualization_generator.diagrams_by_section(sections, content, request)
         for section in sections:
             if not self._should_include_section(section, request):
                 continue
@@ -1909,24 +2189,46 @@ class EnhancedDocumentGenerator:
                 cleaned_content = content[section.key].replace('*', '').replace('#', '')
                 body_style = styles['Normal'] if lang == 'en' else styles['ArabicBody']
                 paragraphs = cleaned_content.split('\n\n')
+                p_texts = []
                 for para_text in paragraphs:
                     if para_text.strip():
                         if para_text.strip().startswith(('* ', '- ')):
-                            p_text = f"• {para_text.strip()[2:]}"
+                            p_texts.append(f"• {para_text.strip()[2:]}")
                         else:
-                            p_text = para_text.strip()
-                        
-                        processed_text = self._process_arabic_text(p_text) if lang == 'ar' else p_text
-                        story.append(Paragraph(processed_text, body_style))
-                        story.append(Spacer(1, 10))
+                            p_texts.append(para_text.strip())
+                
+                if lang == 'ar':
+                    p_texts = self.process_arabic_texts(p_texts)
+                for processed_text in p_texts:
+                    story.append(Paragraph(processed_text, body_style))
+                    story.append(Spacer(1, 10))
+
+            self._add_pdf_diagrams(story, diagrams.get(section.key, []), styles)
             
             if section.subsections:
-                self._add_pdf_content_recursive(story, section.subsections, content, styles, request, lang)
+                self._add_pdf_content_recursive(story, section.subsections, content, styles, request, lang, diagrams)
             
             if section.level == 1:
                 story.append(Spacer(1, 20))
                 story.append(PageBreak())
 
+    def _add_pdf_diagrams(self, story: list, diagrams: List[Dict[str, str]], styles):
+        """A section's rendered diagrams, scaled down to fit the page, each with its title as caption"""
+        caption_style = ParagraphStyle('DiagramCaption', parent=styles['Italic'], alignment=1)
+        # SimpleDocTemplate's frame: one inch margins, less 6pt of padding on each side
+        max_width, max_height = A4[0] - 2 * inch - 12, A4[1] - 4 * inch
+        for diagram in diagrams:
+            image_path = visualization_generator.diagram_png(diagram['source'])
+            if not image_path:
+                continue
+            # Natural size at 96 dpi, in points
+            with Image.open(image_path) as image:
+                width, height = image.width / PNG_SCALE * 0.75, image.height / PNG_SCALE * 0.75
+            scale = min(1.0, max_width / width, max_height / height)
+            story.append(PDFImage(image_path, width=width * scale, height=height * scale))
+            story.append(Paragraph(diagram['title'], caption_style))
+            story.append(Spacer(1, 10))
+
 # Global instances
 processor = EnhancedDocumentProcessor()
 ai_generator = EnhancedAIContentGenerator()
@@ -1934,10 +2236,185 @@ doc_generator = EnhancedDocumentGenerator()
 diagram_generator = MermaidDiagramGenerator()
 visualization_generator = VisualizationDocumentGenerator()
 
-# Storage for job status and generated structures
-job_status = {}
-generated_structures = {}
-active_jobs = set()  # Track active job IDs to prevent duplicates
+# Job status, structures and content live in the reports tables so every worker sees them
+job_store = None if IS_RENDER_PROCESS else JobStore()
+section_locks = {}  # One regeneration at a time per job within this process
+
+# Progress events for /status/{job_id}/stream; the bus tails job_events so it sees every worker's events
+event_bus = None if IS_RENDER_PROCESS else JobEventBus(job_store)
+SSE_KEEPALIVE_SECONDS = 15
+TERMINAL_EVENTS = {"done", "failed", "cancelled"}
+
+def report_stage(job_id: str, stage: str, progress: int, message: str, **details):
+    """Record a pipeline stage transition for /status and publish it to stream subscribers"""
+    job_store.update_progress(job_id, progress, message)
+    job_store.publish(job_id, "stage", {"stage": stage, "progress": progress, "message": message, **details})
+
+# Most RFP bundles a single /upload-batch request may carry
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "50"))
+# Generation runs in worker processes (worker.py) that lease jobs from this queue; the API only enqueues
+job_queue = None if IS_RENDER_PROCESS else JobQueue()
+# Queue consumers to run inside the API process itself (0 = dedicated workers only)
+EMBEDDED_WORKERS = int(os.getenv("EMBEDDED_WORKERS", "0"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))
+# How quickly a worker notices that its job was cancelled from another process
+CANCEL_CHECK_INTERVAL = float(os.getenv("CANCEL_CHECK_INTERVAL", "1.0"))
+running_jobs: Dict[str, asyncio.Task] = {}  # Jobs executing in this process, for immediate cancellation
+
+# Admission cost model, in rough worker-seconds: parsing per RFP page, one LLM call per section, rendering per format
+JOB_BASE_COST = 10
+PAGE_COST = 2
+SECTION_COST = 8
+DEFAULT_SECTION_ESTIMATE = 15  # Dynamic structures usually land around this many sections
+FORMAT_COSTS = {"docx": 5, "html": 1, "pdf": 15, "xlsx": 2}
+
+def estimate_job_cost(page_count: int, request: ProposalRequest, section_count: Optional[int] = None) -> float:
+    # section_count is known up front when resuming: only the sections still missing are charged
+    if section_count is None:
+        if request.proposal_type == "financial":
+            section_count = 1
+        else:
+            section_count = len(request.selected_sections) if request.selected_sections else DEFAULT_SECTION_ESTIMATE
+    format_cost = sum(FORMAT_COSTS.get(fmt, 5) for fmt in get_output_formats(request))
+    return JOB_BASE_COST + page_count * PAGE_COST + section_count * SECTION_COST + format_cost
+
+def queue_position_info(job_id: str) -> Dict[str, Any]:
+    """queue_position / estimated_start fields for a job that has not started yet"""
+    position = job_queue.position(job_id)
+    if position is None:
+        return {}
+    return {
+        "queue_position": position["queue_position"],
+        "estimated_start": datetime.fromtimestamp(position["estimated_start"], tz=timezone.utc).isoformat()
+    }
+
+# Multi-format rendering: every requested format renders from the same ProposalModel in parallel
+render_pool = None
+render_threads = ThreadPoolExecutor(thread_name_prefix="render")  # Used when RENDER_WORKERS is 0
+# Renders per job that are still running; cancelling the awaiting task does not stop a started render
+in_flight_renders: Dict[str, Set[Future]] = {}
+
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """Lazily start the render process pool (None when RENDER_WORKERS is 0)"""
+    global render_pool
+    if render_pool is None and RENDER_WORKERS > 0:
+        os.environ[RENDER_PARENT_ENV] = str(os.getpid())
+        render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return render_pool
+
+def summarize_structure(structure: List[Section]) -> Dict[str, Any]:
+    """Section counts and leading titles, stored once so status polls never flatten the tree"""
+    return {
+        "total_sections": len(ai_generator.flatten_sections(structure)),
+        "main_sections": len(structure),
+        "section_titles": [s.title for s in structure[:5]]
+    }
+
+def load_structure(job_id: str) -> Optional[List[Section]]:
+    structure_data = job_store.get_structure(job_id)
+    if structure_data is None:
+        return None
+    return [Section.from_dict(section) for section in structure_data]
+
+def get_output_formats(request: ProposalRequest) -> List[str]:
+    """Formats to render for a request, in the order their files are reported"""
+    if request.proposal_type == "financial":
+        return ["xlsx", "html"]
+
+    formats = []
+    if request.output_format in ["all", "docx"]:
+        formats.append("docx")
+    if PDF_OUTPUT_ENABLED and request.output_format in ["all", "pdf"]:
+        formats.append("pdf")
+    # Visualization HTML is always generated alongside the main document
+    formats.append("html")
+    return formats
+
+def render_proposal_format(output_format: str, model: ProposalModel) -> dict:
+    """Render one format from the model. Runs in a render process, so errors are returned rather than raised.
+
+    From a render process the result also carries the Arabic shaping done for
+    it, which the parent adds to its own counters for /health.
+    """
+    start = time.perf_counter()
+    structure = list(model.sections)
+    shaping_before = doc_generator.get_arabic_shaping_stats() if IS_RENDER_PROCESS else None
+    try:
+        if output_format == "docx":
+            filename = doc_generator.generate_word_document(model.content, structure, model.company_name, model.job_id, model.request)
+        elif output_format == "pdf":
+            filename = doc_generator.generate_pdf_document(model.content, structure, model.company_name, model.job_id, model.request)
+        elif output_format == "html":
+            filename = visualization_generator.generate_visualization_html(model.content, structure, model.company_name, model.job_id, model.request)
+        elif output_format == "xlsx":
+            filename = generate_excel_financial_enhanced(model.content, structure, model.company_name, model.job_id, model.request)
+        else:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        # gzip/brotli variants are built once here instead of on every download
+        precompress_artifact(os.path.join(OUTPUT_DIR, filename))
+        result = {"file": filename, "error": None}
+    except Exception as e:
+        result = {"file": None, "error": e.detail if isinstance(e, HTTPException) else str(e)}
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    if shaping_before is not None:
+        shaping_after = doc_generator.get_arabic_shaping_stats()
+        result["shaping"] = {
+            "calls": shaping_after["calls"] - shaping_before["calls"],
+            "shaped": shaping_after["shaped"] - shaping_before["shaped"],
+            "cache_hits": shaping_after["cache_hits"] - shaping_before["cache_hits"],
+            "seconds": shaping_after["shaping_seconds"] - shaping_before["shaping_seconds"],
+        }
+    return result
+
+async def render_proposal_formats(job_id: str, model: ProposalModel, formats: List[str]) -> List[str]:
+    """Render all formats concurrently, tracking each one under the job's "formats" status"""
+    pool = get_render_pool()
+    format_status = {fmt: {"status": "rendering", "file": None, "error": None} for fmt in formats}
+    job_store.update_progress(job_id, formats=format_status)
+    completed = 0
+    in_flight = in_flight_renders.setdefault(job_id, set())
+
+    async def render(fmt: str) -> dict:
+        nonlocal completed
+        try:
+            future = (pool or render_threads).submit(render_proposal_format, fmt, model)
+            in_flight.add(future)
+            result = await asyncio.wrap_future(future)
+            in_flight.discard(future)
+        except Exception as e:
+            result = {"file": None, "error": str(e), "seconds": None}
+        for key, value in (result.get("shaping") or {}).items():
+            arabic_shaping_stats[key] += value
+
+        format_status[fmt] = {
+            "status": "completed" if result["file"] else "failed",
+            "file": result["file"],
+            "error": result["error"],
+            "seconds": result["seconds"]
+        }
+        completed += 1
+        progress = 70 + (20 * completed) // len(formats)
+        if result["file"]:
+            message = f"Rendered {fmt.upper()} ({completed}/{len(formats)})"
+            print(f"✅ Rendered {fmt} in {result['seconds']}s: {result['file']}")
+        else:
+            message = f"Warning: {fmt.upper()} generation failed: {result['error']}"
+            print(f"⚠️  Warning: {fmt} generation failed: {result['error']}")
+        job_store.update_progress(job_id, progress, message, dict(format_status))
+        job_store.publish(job_id, "file", {"format": fmt, **format_status[fmt], "progress": progress, "message": message})
+        return result
+
+    results = await asyncio.gather(*(render(fmt) for fmt in formats))
+    in_flight_renders.pop(job_id, None)
+    return [result["file"] for result in results if result["file"]]
+
+async def settle_renders(job_id: str):
+    """Stop a cancelled job's renders that have not started and wait for the rest to finish writing"""
+    futures = in_flight_renders.pop(job_id, set())
+    for future in futures:
+        future.cancel()
+    if futures:
+        await asyncio.to_thread(wait_futures, futures)
 
 # Enhanced API endpoints
 @app.post("/test-upload")
@@ -2053,9 +2530,116 @@ async def analyze_rfp_structure(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error analyzing RFP: {str(e)}")
 
+def hash_upload(upload: UploadFile) -> str:
+    """SHA-256 of an uploaded file; rewinds it so it can still be saved afterwards"""
+    hasher = hashlib.sha256()
+    for chunk in iter(lambda: upload.file.read(1024 * 1024), b""):
+        hasher.update(chunk)
+    upload.file.seek(0)
+    return hasher.hexdigest()
+
+def request_fingerprint(params: Dict[str, Any], uploads: Dict[str, List[Optional[UploadFile]]]) -> str:
+    """Hash of the normalized form parameters and the contents of every uploaded file"""
+    normalized = {
+        "proposal_type": (params["proposal_type"] or "").strip().lower(),
+        "sector": " ".join((params["sector"] or "").split()).lower(),
+        "company_name": " ".join((params["company_name"] or "").split()),
+        "selected_sections": sorted(set(params["selected_sections"])) if params["selected_sections"] else None,
+        "use_dynamic_structure": bool(params["use_dynamic_structure"]),
+        "output_format": (params["output_format"] or "all").strip().lower(),
+        "language": (params["language"] or "en").strip().lower(),
+        # File order matters (RFP text is concatenated in order); names only matter through their extension
+        "uploads": {
+            role: [
+                [os.path.splitext(upload.filename or "")[1].lower(), hash_upload(upload)]
+                for upload in role_uploads if upload is not None
+            ]
+            for role, role_uploads in uploads.items()
+        }
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+async def duplicate_job_response(job_id: str) -> ProposalResponse:
+    response = await get_job_status_enhanced(job_id)
+    state = "is already being generated" if response.status == "processing" else "was already generated"
+    response.message = f"An identical proposal {state}; returning that job. Set force_regenerate to start a new one."
+    response.deduplicated = True
+    print(f"Duplicate submission attached to job {job_id}")
+    return response
+
+async def analyze_supporting_documents(prefix: str, special_document: Optional[UploadFile],
+                                       additional_documents: List[UploadFile], proposal_type: str, sector: str) -> Dict[str, Any]:
+    """Extract and analyze the special and additional documents once; returns the ProposalRequest fields they fill"""
+    # Process special document if provided
+    special_document_content = None
+    special_document_insights = None
+    if special_document:
+        print(f"Processing special document: {special_document.filename}")
+        try:
+            special_temp_path = os.path.join(UPLOAD_DIR, f"{prefix}_special_{special_document.filename}")
+            with open(special_temp_path, "wb") as buffer:
+                shutil.copyfileobj(special_document.file, buffer)
+
+            # Extract content from special document
+            special_text, special_structure = processor.process_file(special_temp_path)
+            special_document_content = special_text
+
+            # Generate insights from special document using AI
+            special_document_insights = await ai_generator.analyze_special_document(
+                special_text, special_structure, proposal_type, sector
+            )
+
+            # Clean up temporary file
+            if os.path.exists(special_temp_path):
+                os.remove(special_temp_path)
+
+            print(f"Special document processed successfully, extracted {len(special_text)} characters")
+        except Exception as e:
+            print(f"Error processing special document: {str(e)}")
+        finally:
+            special_document.file.close()
+
+    # Process additional documents if provided
+    additional_documents_content = []
+    additional_documents_insights = None
+    if additional_documents:
+        print(f"Processing {len(additional_documents)} additional documents")
+        try:
+            for i, doc in enumerate(additional_documents):
+                doc_temp_path = os.path.join(UPLOAD_DIR, f"{prefix}_additional_{i}_{doc.filename}")
+                with open(doc_temp_path, "wb") as buffer:
+                    shutil.copyfileobj(doc.file, buffer)
+
+                # Extract content from additional document
+                doc_text, doc_structure = processor.process_file(doc_temp_path)
+                additional_documents_content.append(doc_text)
+
+                # Clean up temporary file
+                if os.path.exists(doc_temp_path):
+                    os.remove(doc_temp_path)
+
+                doc.file.close()
+
+            # Generate combined insights from all additional documents
+            if additional_documents_content:
+                combined_additional_text = "\n\n".join(additional_documents_content)
+                additional_documents_insights = await ai_generator.analyze_additional_documents(
+                    combined_additional_text, proposal_type, sector
+                )
+
+            print(f"Additional documents processed successfully, total content: {sum(len(text) for text in additional_documents_content)} characters")
+        except Exception as e:
+            print(f"Error processing additional documents: {str(e)}")
+
+    return {
+        "special_document_content": special_document_content,
+        "special_document_insights": special_document_insights,
+        "additional_documents_content": additional_documents_content,
+        "additional_documents_insights": additional_documents_insights
+    }
+
 @app.post("/upload-and-generate", response_model=ProposalResponse)
 async def upload_and_generate_enhanced(
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     proposal_type: str = Form(...),
     sector: str = Form(...),
@@ -2067,9 +2651,11 @@ async def upload_and_generate_enhanced(
     logo_bottom_right: Optional[UploadFile] = File(None),
     special_document: Optional[UploadFile] = File(None),
     additional_documents: List[UploadFile] = File(default=[]),
-    language: Optional[str] = Form("en")
+    language: Optional[str] = Form("en"),
+    force_regenerate: Optional[bool] = Form(False)
 ):
     """Enhanced upload and generate with dynamic structure"""
+    job_id = str(uuid.uuid4())
     try:
         print("--- New Upload Request ---")
         print(f"Received parameters:")
@@ -2091,25 +2677,81 @@ async def upload_and_generate_enhanced(
             print("No bottom-right logo received.")
         print("--------------------------")
 
-        job_id = str(uuid.uuid4())
-        
         selected_sections_list = None
         if selected_sections:
             selected_sections_list = [s.strip() for s in selected_sections.split(',')]
+
+        # Identical uploads + parameters attach to the existing job instead of starting another one
+        fingerprint = await asyncio.to_thread(
+            request_fingerprint,
+            {
+                "proposal_type": proposal_type,
+                "sector": sector,
+                "company_name": company_name,
+                "selected_sections": selected_sections_list,
+                "use_dynamic_structure": use_dynamic_structure,
+                "output_format": output_format,
+                "language": language
+            },
+            {
+                "files": files,
+                "logo_top_left": [logo_top_left],
+                "logo_bottom_right": [logo_bottom_right],
+                "special_document": [special_document],
+                "additional_documents": additional_documents
+            }
+        )
+        if not force_regenerate:
+            existing_job_id = job_store.find_job_by_fingerprint(fingerprint)
+            if existing_job_id:
+                return await duplicate_job_response(existing_job_id)
         
-        # Check if there are too many active jobs (prevent system overload)
-        if len(active_jobs) > 10:
-            raise HTTPException(status_code=429, detail="Too many active jobs. Please wait and try again.")
-        
-        # Add to active jobs
-        active_jobs.add(job_id)
-        
-        job_status[job_id] = {
-            "status": "processing",
-            "message": "Analyzing RFP and generating proposal structure...",
-            "progress": 10,
-            "files": []
-        }
+        temp_file_paths = []
+        for file in files:
+            temp_path = os.path.join(UPLOAD_DIR, f"{job_id}_{file.filename}")
+            try:
+                with open(temp_path, "wb") as buffer:
+                    shutil.copyfileobj(file.file, buffer)
+                temp_file_paths.append(temp_path)
+            finally:
+                file.file.close()
+
+        # Admission: reserve queue capacity for this job's estimated cost before doing any work
+        page_count = sum(processor.estimate_page_count(path) for path in temp_file_paths)
+        job_cost = estimate_job_cost(page_count, ProposalRequest(
+            proposal_type=proposal_type,
+            sector=sector,
+            company_name=company_name,
+            selected_sections=selected_sections_list,
+            output_format=output_format
+        ))
+        try:
+            job_queue.admit(job_id, company_name, job_cost)
+        except QueueFullError as e:
+            remove_upload_files(temp_file_paths)
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(e.retry_after, 1))})
+        print(f"Admitted job {job_id}: {page_count} pages, estimated cost {job_cost:.0f}")
+        
+        created_job_id = job_store.create_job(
+            job_id,
+            {
+                "proposal_type": proposal_type,
+                "sector": sector,
+                "company_name": company_name,
+                "language": language,
+                "output_format": output_format,
+                "selected_sections": selected_sections_list
+            },
+            [file.filename for file in files],
+            "Analyzing RFP and generating proposal structure...",
+            fingerprint=fingerprint,
+            dedupe=not force_regenerate
+        )
+        if created_job_id != job_id:
+            # A concurrent identical request got in first; hand back its job and our reservation
+            job_queue.delete(job_id)
+            remove_upload_files(temp_file_paths)
+            return await duplicate_job_response(created_job_id)
         
         logo_top_left_path = None
         if logo_top_left:
@@ -2129,66 +2771,9 @@ async def upload_and_generate_enhanced(
             print(f"Saved bottom-right logo to: {logo_bottom_right_path}")
             print(f"File exists: {os.path.exists(logo_bottom_right_path)}")
         
-        # Process special document if provided
-        special_document_content = None
-        special_document_insights = None
-        if special_document:
-            print(f"Processing special document: {special_document.filename}")
-            try:
-                special_temp_path = os.path.join(UPLOAD_DIR, f"{job_id}_special_{special_document.filename}")
-                with open(special_temp_path, "wb") as buffer:
-                    shutil.copyfileobj(special_document.file, buffer)
-                
-                # Extract content from special document
-                special_text, special_structure = processor.process_file(special_temp_path)
-                special_document_content = special_text
-                
-                # Generate insights from special document using AI
-                special_document_insights = await ai_generator.analyze_special_document(
-                    special_text, special_structure, proposal_type, sector
-                )
-                
-                # Clean up temporary file
-                if os.path.exists(special_temp_path):
-                    os.remove(special_temp_path)
-                    
-                print(f"Special document processed successfully, extracted {len(special_text)} characters")
-            except Exception as e:
-                print(f"Error processing special document: {str(e)}")
-            finally:
-                special_document.file.close()
-        
-        # Process additional documents if provided
-        additional_documents_content = []
-        additional_documents_insights = None
-        if additional_documents:
-            print(f"Processing {len(additional_documents)} additional documents")
-            try:
-                for i, doc in enumerate(additional_documents):
-                    doc_temp_path = os.path.join(UPLOAD_DIR, f"{job_id}_additional_{i}_{doc.filename}")
-                    with open(doc_temp_path, "wb") as buffer:
-                        shutil.copyfileobj(doc.file, buffer)
-                    
-                    # Extract content from additional document
-                    doc_text, doc_structure = processor.process_file(doc_temp_path)
-                    additional_documents_content.append(doc_text)
-                    
-                    # Clean up temporary file
-                    if os.path.exists(doc_temp_path):
-                        os.remove(doc_temp_path)
-                    
-                    doc.file.close()
-                
-                # Generate combined insights from all additional documents
-                if additional_documents_content:
-                    combined_additional_text = "\n\n".join(additional_documents_content)
-                    additional_documents_insights = await ai_generator.analyze_additional_documents(
-                        combined_additional_text, proposal_type, sector
-                    )
-                    
-                print(f"Additional documents processed successfully, total content: {sum(len(text) for text in additional_documents_content)} characters")
-            except Exception as e:
-                print(f"Error processing additional documents: {str(e)}")
+        supporting = await analyze_supporting_documents(
+            job_id, special_document, additional_documents, proposal_type, sector
+        )
         
         request = ProposalRequest(
             proposal_type=proposal_type,
@@ -2199,39 +2784,258 @@ async def upload_and_generate_enhanced(
             logo_top_left_path=logo_top_left_path,
             logo_bottom_right_path=logo_bottom_right_path,
             language=language,
-            special_document_content=special_document_content,
-            additional_documents_content=additional_documents_content,
-            special_document_insights=special_document_insights,
-            additional_documents_insights=additional_documents_insights
+            **supporting
         )
-        
-        temp_file_paths = []
-        for file in files:
-            temp_path = os.path.join(UPLOAD_DIR, f"{job_id}_{file.filename}")
-            try:
-                with open(temp_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
-                temp_file_paths.append(temp_path)
-            finally:
-                file.file.close()
+        job_store.save_request(job_id, request.dict())
 
-        background_tasks.add_task(
-            process_enhanced_proposal, 
-            job_id, 
-            temp_file_paths, 
-            request, 
-            use_dynamic_structure
-        )
+        job_queue.enqueue(job_id, {
+            "files": temp_file_paths,
+            "use_dynamic_structure": use_dynamic_structure
+        })
+        report_stage(job_id, "queued", 10, "Queued, waiting for a generation worker...", **queue_position_info(job_id))
         
         return ProposalResponse(
             job_id=job_id,
             status="processing",
-            message="Your proposal is being generated with dynamic structure analysis."
+            message="Your proposal is being generated with dynamic structure analysis.",
+            **queue_position_info(job_id)
         )
     
-    except Exception as e:
+    except BaseException as e:
+        # Give back any reserved capacity, also when the request is cancelled; the job never reached the workers
+        job_queue.delete(job_id)
+        if job_store.get_job(job_id):
+            job_store.fail_job(job_id, f"Error starting proposal generation: {str(e)}")
+        if isinstance(e, HTTPException) or not isinstance(e, Exception):
+            raise
         raise HTTPException(status_code=500, detail=f"Error starting proposal generation: {str(e)}")
 
+def split_bundles(files: List[UploadFile], bundle_sizes: Optional[str]) -> List[List[UploadFile]]:
+    """Group uploaded files into RFP bundles: consecutive runs of the given sizes, or one file per bundle"""
+    if not bundle_sizes:
+        return [[file] for file in files]
+    try:
+        sizes = [int(size) for size in bundle_sizes.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bundle_sizes must be a comma-separated list of integers")
+    if any(size < 1 for size in sizes) or sum(sizes) != len(files):
+        raise HTTPException(status_code=400, detail=f"bundle_sizes must be positive and add up to the {len(files)} uploaded files")
+    bundles, start = [], 0
+    for size in sizes:
+        bundles.append(files[start:start + size])
+        start += size
+    return bundles
+
+@app.post("/upload-batch", response_model=BatchResponse)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    proposal_type: str = Form(...),
+    sector: str = Form(...),
+    company_name: str = Form(...),
+    bundle_sizes: Optional[str] = Form(None),
+    selected_sections: Optional[str] = Form(None),
+    use_dynamic_structure: Optional[bool] = Form(True),
+    output_format: Optional[str] = Form("all"),
+    logo_top_left: Optional[UploadFile] = File(None),
+    logo_bottom_right: Optional[UploadFile] = File(None),
+    special_document: Optional[UploadFile] = File(None),
+    additional_documents: List[UploadFile] = File(default=[]),
+    language: Optional[str] = Form("en"),
+    force_regenerate: Optional[bool] = Form(False)
+):
+    """Submit several RFP bundles with shared settings as one batch.
+
+    Every bundle becomes a normal job on the shared queue, so workers overlap the
+    extraction, LLM and rendering stages of different bundles. Shared inputs are
+    handled once for the whole batch: logos are stored once and copied per job,
+    and the special/additional documents are analyzed with a single set of LLM calls.
+    """
+    bundles = split_bundles(files, bundle_sizes)
+    if len(bundles) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch can contain at most {MAX_BATCH_SIZE} RFP bundles")
+
+    batch_id = str(uuid.uuid4())
+    selected_sections_list = [s.strip() for s in selected_sections.split(',')] if selected_sections else None
+    params = {
+        "proposal_type": proposal_type,
+        "sector": sector,
+        "company_name": company_name,
+        "selected_sections": selected_sections_list,
+        "use_dynamic_structure": use_dynamic_structure,
+        "output_format": output_format,
+        "language": language
+    }
+    shared_uploads = {
+        "logo_top_left": [logo_top_left],
+        "logo_bottom_right": [logo_bottom_right],
+        "special_document": [special_document],
+        "additional_documents": additional_documents
+    }
+    base_request = ProposalRequest(
+        proposal_type=proposal_type,
+        sector=sector,
+        company_name=company_name,
+        selected_sections=selected_sections_list,
+        output_format=output_format
+    )
+    print(f"--- New Batch Request {batch_id}: {len(bundles)} bundles, {len(files)} files for {company_name} ---")
+
+    batch_jobs = []   # {"job_id", "name"} for every bundle, in order
+    new_jobs = {}     # job_id -> saved RFP paths, for bundles that start a new job
+    try:
+        # Admit every new bundle before doing any expensive work; a batch that does not fit is rejected whole
+        for bundle in bundles:
+            name = bundle[0].filename or f"bundle_{len(batch_jobs) + 1}"
+            fingerprint = await asyncio.to_thread(request_fingerprint, params, {"files": bundle, **shared_uploads})
+            existing_job_id = None if force_regenerate else job_store.find_job_by_fingerprint(fingerprint)
+            if existing_job_id:
+                batch_jobs.append({"job_id": existing_job_id, "name": name})
+                continue
+
+            job_id = str(uuid.uuid4())
+            temp_file_paths = []
+            new_jobs[job_id] = temp_file_paths
+            for file in bundle:
+                temp_path = os.path.join(UPLOAD_DIR, f"{job_id}_{file.filename}")
+                try:
+                    with open(temp_path, "wb") as buffer:
+                        shutil.copyfileobj(file.file, buffer)
+                    temp_file_paths.append(temp_path)
+                finally:
+                    file.file.close()
+
+            page_count = sum(processor.estimate_page_count(path) for path in temp_file_paths)
+            job_queue.admit(job_id, company_name, estimate_job_cost(page_count, base_request))
+
+            created_job_id = job_store.create_job(
+                job_id,
+                {**{key: params[key] for key in ("proposal_type", "sector", "company_name", "language", "output_format")},
+                 "selected_sections": selected_sections_list},
+                [file.filename for file in bundle],
+                "Queued as part of a batch...",
+                fingerprint=fingerprint,
+                dedupe=not force_regenerate
+            )
+            if created_job_id != job_id:
+                # A concurrent identical request got in first; use its job and give back our reservation
+                job_queue.delete(job_id)
+                remove_upload_files(new_jobs.pop(job_id))
+            batch_jobs.append({"job_id": created_job_id, "name": name})
+
+        # Shared inputs: stored and analyzed once, then reused by every job in the batch
+        shared_logos = {}
+        for role, logo in (("logo_top_left", logo_top_left), ("logo_bottom_right", logo_bottom_right)):
+            if logo:
+                shared_path = os.path.join(UPLOAD_DIR, f"{batch_id}_{logo.filename}")
+                with open(shared_path, "wb") as buffer:
+                    shutil.copyfileobj(logo.file, buffer)
+                shared_logos[role] = (shared_path, logo.filename)
+        supporting = await analyze_supporting_documents(
+            batch_id, special_document, additional_documents, proposal_type, sector
+        ) if new_jobs else {}
+
+        for job_id, temp_file_paths in new_jobs.items():
+            # Each job gets its own copy of the logos so cleanup and the sweeper can treat it like any other job
+            logo_paths = {}
+            for role, (shared_path, filename) in shared_logos.items():
+                job_logo_path = os.path.abspath(os.path.join(UPLOAD_DIR, f"{job_id}_{filename}"))
+                shutil.copyfile(shared_path, job_logo_path)
+                logo_paths[f"{role}_path"] = job_logo_path
+
+            request = base_request.copy(update={"language": language, **logo_paths, **supporting})
+            job_store.save_request(job_id, request.dict())
+            job_queue.enqueue(job_id, {
+                "files": temp_file_paths,
+                "use_dynamic_structure": use_dynamic_structure
+            })
+            report_stage(job_id, "queued", 10, "Queued, waiting for a generation worker...", **queue_position_info(job_id))
+        remove_upload_files([shared_path for shared_path, _ in shared_logos.values()])
+
+        job_store.create_batch(batch_id, batch_jobs, {**params, "bundles": len(bundles)})
+        print(f"Batch {batch_id}: {len(new_jobs)} new jobs, {len(batch_jobs) - len(new_jobs)} attached to existing jobs")
+
+    except BaseException as e:
+        # Give back every reservation, also when the request is cancelled; none of the batch's new jobs reached the workers
+        for job_id, temp_file_paths in new_jobs.items():
+            job_queue.delete(job_id)
+            remove_upload_files(temp_file_paths)
+            if job_store.get_job(job_id):
+                job_store.fail_job(job_id, f"Error starting batch generation: {str(e)}")
+        if not isinstance(e, Exception):
+            raise
+        if isinstance(e, QueueFullError):
+            raise HTTPException(status_code=429, detail=f"The batch does not fit in the queue: {e}",
+                                headers={"Retry-After": str(max(e.retry_after, 1))})
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=f"Error starting batch generation: {str(e)}")
+
+    return await get_batch_status(batch_id)
+
+@app.get("/batch/{batch_id}", response_model=BatchResponse)
+async def get_batch_status(batch_id: str):
+    """Per-job status plus aggregate progress for a batch"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    jobs = []
+    for entry in batch["jobs"]:
+        try:
+            job = await get_job_status_enhanced(entry["job_id"])
+        except HTTPException:
+            job = ProposalResponse(job_id=entry["job_id"], status="expired", message="Job no longer exists", progress=0)
+        jobs.append(BatchJobStatus(name=entry["name"], **job.dict(exclude={"structure_info"})))
+
+    counts: Dict[str, int] = {}
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+    finished = sum(1 for job in jobs if job.status != "processing")
+    if counts.get("processing"):
+        status = "processing"
+    elif counts.get("completed") == len(jobs):
+        status = "completed"
+    else:
+        status = "partial" if counts.get("completed") else "error"
+    # Finished jobs count as done whether or not they succeeded
+    progress = sum(100 if job.status != "processing" else (job.progress or 0) for job in jobs) // max(len(jobs), 1)
+
+    return BatchResponse(
+        batch_id=batch_id,
+        status=status,
+        message=f"{finished} of {len(jobs)} proposals finished ({counts.get('completed', 0)} completed)",
+        progress=progress,
+        counts=counts,
+        jobs=jobs
+    )
+
+@app.get("/batch/{batch_id}/download")
+async def download_batch(batch_id: str):
+    """One zip of every completed job's files, streamed as it is built"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    entries = []
+    for position, entry in enumerate(batch["jobs"], 1):
+        status_data = job_store.get_job(entry["job_id"])
+        if status_data is None or status_data["status"] != "completed":
+            continue
+        folder = f"{position:02d}_{os.path.splitext(os.path.basename(entry['name']))[0]}"
+        for filename in status_data["files"]:
+            path = os.path.join(OUTPUT_DIR, filename)
+            if os.path.exists(path):
+                entries.append((path, f"{folder}/{filename}"))
+        job_store.touch(entry["job_id"])
+    if not entries:
+        raise HTTPException(status_code=409, detail="No proposals in this batch have finished yet")
+
+    return StreamingResponse(
+        iter_zip(entries),
+        media_type=media_type_for("batch.zip"),
+        headers={"Content-Disposition": content_disposition(f"proposals_{batch_id[:8]}.zip")}
+    )
+
 async def process_enhanced_proposal(
     job_id: str, 
     temp_file_paths: List[str], 
@@ -2242,118 +3046,92 @@ async def process_enhanced_proposal(
     print(f"BACKGROUND TASK STARTED for job {job_id}")
     print(f"Logo paths in request: top={request.logo_top_left_path}, bottom={request.logo_bottom_right_path}")
     try:
-        job_status[job_id]["message"] = "Processing uploaded RFP files..."
-        job_status[job_id]["progress"] = 20
+        # A retried or resumed job picks up whatever an earlier attempt already persisted
+        checkpoint = job_store.get_checkpoint(job_id)
 
-        # Process uploaded files
-        combined_text = ""
-        all_structures = []
-        
-        for temp_path in temp_file_paths:
-            text, structure = processor.process_file(temp_path)
-            combined_text += text + "\n\n"
-            all_structures.append(structure)
-        
-        for temp_path in temp_file_paths:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        if checkpoint["rfp_text"] is not None:
+            report_stage(job_id, "parsing", 20, "Resuming from checkpoint: RFP text already extracted")
+            combined_text = checkpoint["rfp_text"]
+            combined_structure = None
+        else:
+            report_stage(job_id, "parsing", 20, "Processing uploaded RFP files...")
+
+            # Process uploaded files
+            combined_text = ""
+            combined_structure = ExtractedStructure(
+                sections=[],
+                requirements=[],
+                scope=""
+            )
 
-        job_status[job_id]["message"] = "Analyzing RFP structure and generating proposal outline..."
-        job_status[job_id]["progress"] = 40
+            for temp_path in temp_file_paths:
+                text, structure = processor.process_file(temp_path)
+                combined_text += text + "\n\n"
+                combined_structure.sections.extend(structure.sections)
+                combined_structure.requirements.extend(structure.requirements)
+                combined_structure.scope += " " + structure.scope
 
-        combined_structure = ExtractedStructure(
-            sections=[],
-            requirements=[],
-            scope=""
-        )
-        
-        for struct in all_structures:
-            combined_structure.sections.extend(struct.sections)
-            combined_structure.requirements.extend(struct.requirements)
-            combined_structure.scope += " " + struct.scope
+            job_store.save_extracted_text(job_id, combined_text)
 
-        if use_dynamic_structure:
-            proposal_structure = await ai_generator.analyze_rfp_and_generate_structure(
-                combined_text, combined_structure, request
-            )
+        if checkpoint["structure"] is not None:
+            report_stage(job_id, "structuring", 40, "Resuming from checkpoint: proposal outline already generated")
+            proposal_structure = [Section.from_dict(section) for section in checkpoint["structure"]]
+            structure_summary = summarize_structure(proposal_structure)
         else:
-            proposal_structure = ai_generator._generate_fallback_structure(combined_structure)
-            ai_generator.number_sections(proposal_structure)
-        
-        generated_structures[job_id] = proposal_structure
+            report_stage(job_id, "structuring", 40, "Analyzing RFP structure and generating proposal outline...")
+
+            if combined_structure is None:
+                combined_structure = processor.extract_structure_from_text(combined_text)
+
+            if use_dynamic_structure:
+                proposal_structure = await ai_generator.analyze_rfp_and_generate_structure(
+                    combined_text, combined_structure, request
+                )
+            else:
+                proposal_structure = ai_generator._generate_fallback_structure(combined_structure)
+                ai_generator.number_sections(proposal_structure)
+
+            structure_summary = summarize_structure(proposal_structure)
+            job_store.save_structure(job_id, [section.to_dict() for section in proposal_structure], structure_summary)
 
-        job_status[job_id]["message"] = "Generating proposal content..."
-        job_status[job_id]["progress"] = 60
+        completed_sections = checkpoint["sections"]
+        if completed_sections:
+            content_message = f"Generating proposal content ({len(completed_sections)} sections restored from checkpoint)..."
+        else:
+            content_message = "Generating proposal content..."
+        report_stage(job_id, "content", 60, content_message, structure_info=structure_summary)
 
-        # Generate content and files based on proposal type
+        def section_completed(section: Section, section_content: Optional[str], completed: int, total: int):
+            if section_content:
+                job_store.checkpoint_section(job_id, section.key, section_content)
+            progress = 60 + (10 * completed) // total
+            message = f"Generated section {completed}/{total}: {section.title}"
+            job_store.update_progress(job_id, progress, message)
+            job_store.publish(job_id, "section", {
+                "key": section.key, "title": section.title, "completed": completed, "total": total,
+                "progress": progress, "message": message
+            })
+
+        # Generate content, then render every requested format from one model
         generated_files = []
         
         try:
             if request.proposal_type == "technical":
                 content = await ai_generator.generate_proposal_content(
-                    combined_text, proposal_structure, request
+                    combined_text, proposal_structure, request, section_completed, completed_sections
                 )
-                
-                # Generate Word document
-                if request.output_format in ["all", "docx"]:
-                    try:
-                        word_file = doc_generator.generate_word_document(
-                            content, proposal_structure, request.company_name, job_id, request
-                        )
-                        generated_files = [word_file]
-                    except Exception as e:
-                        print(f"Error generating Word document: {e}")
-                        job_status[job_id]["message"] = f"Warning: Word document generation failed: {str(e)}"
-                
-                # Generate Visualization HTML document (ALWAYS generated alongside main document)
-                try:
-                    job_status[job_id]["message"] = "Generating interactive visualizations..."
-                    job_status[job_id]["progress"] = 85
-                    
-                    visualization_file = visualization_generator.generate_visualization_html(
-                        content, proposal_structure, request.company_name, job_id, request
-                    )
-                    generated_files.append(visualization_file)
-                    print(f"✅ Generated visualization file: {visualization_file}")
-                except Exception as e:
-                    print(f"⚠️  Warning: Visualization generation failed: {e}")
-                    # Continue even if visualization fails - don't break main generation
-                
-                # Generate PDF document
-                # if request.output_format in ["all", "pdf"]:
-                #     try:
-                #         pdf_file = doc_generator.generate_pdf_document(
-                #             content, proposal_structure, request.company_name, job_id, request
-                #         )
-                #         generated_files.append(pdf_file)
-                #     except Exception as e:
-                #         print(f"Error generating PDF document: {e}")
-                #         error_msg = str(e)
-                #         if "Arabic" in error_msg or "Amiri" in error_msg or "bidi" in error_msg:
-                #             job_status[job_id]["message"] = f"Warning: PDF generation failed - {error_msg}"
-                #         else:
-                #             job_status[job_id]["message"] = f"Warning: PDF document generation failed: {error_msg}"
-                
             elif request.proposal_type == "financial":
-                financial_content = await generate_financial_content(combined_text, request)
-                excel_file = generate_excel_financial_enhanced(
-                    financial_content, proposal_structure, request.company_name, job_id, request
-                )
-                generated_files = [excel_file]
-                
-                # Generate Visualization HTML document for financial proposals too
-                try:
-                    job_status[job_id]["message"] = "Generating financial visualizations..."
-                    job_status[job_id]["progress"] = 85
-                    
-                    visualization_file = visualization_generator.generate_visualization_html(
-                        financial_content, proposal_structure, request.company_name, job_id, request
-                    )
-                    generated_files.append(visualization_file)
-                    print(f"✅ Generated financial visualization file: {visualization_file}")
-                except Exception as e:
-                    print(f"⚠️  Warning: Financial visualization generation failed: {e}")
-                    # Continue even if visualization fails
+                content = await generate_financial_content(combined_text, request)
+            else:
+                content = None
+
+            if content is not None:
+                job_store.save_content(job_id, content, combined_text)
+
+                report_stage(job_id, "rendering", 70, "Rendering documents and visualizations...")
+
+                model = ProposalModel.build(job_id, request, proposal_structure, content)
+                generated_files = await render_proposal_formats(job_id, model, get_output_formats(request))
             
         except Exception as e:
             print(f"Error in document generation phase: {e}")
@@ -2361,8 +3139,7 @@ async def process_enhanced_proposal(
             if not generated_files:  # Only fail if no files were generated
                 raise e
 
-        job_status[job_id]["message"] = "Finalizing documents..."
-        job_status[job_id]["progress"] = 90
+        report_stage(job_id, "finalizing", 90, "Finalizing documents...")
 
         # Check if any files were actually generated
         if not generated_files:
@@ -2375,63 +3152,212 @@ async def process_enhanced_proposal(
         else:
             success_message += f" Generated {len(generated_files)} files."
 
-        job_status[job_id] = {
-            "status": "completed",
-            "message": success_message,
-            "progress": 100,
-            "files": generated_files,
-            "structure_summary": {
-                "total_sections": len(ai_generator.flatten_sections(proposal_structure)),
-                "main_sections": len(proposal_structure),
-                "dynamic_generation": use_dynamic_structure
-            }
-        }
-        
-        # Remove from active jobs
-        active_jobs.discard(job_id)
-        
-        asyncio.create_task(schedule_cleanup(job_id, 300))
+        job_store.complete_job(
+            job_id,
+            generated_files,
+            success_message,
+            {**summarize_structure(proposal_structure), "dynamic_generation": use_dynamic_structure},
+            (job_store.get_job(job_id) or {}).get("formats") or {}
+        )
 
     except Exception as e:
         print("Error in process_enhanced_proposal:", e)
         traceback.print_exc()
         
-        # Remove from active jobs on error
-        active_jobs.discard(job_id)
-        
-        job_status[job_id] = {
-            "status": "error",
-            "message": f"Error generating proposal: {str(e)}",
-            "progress": 0,
-            "files": []
-        }
-        asyncio.create_task(schedule_cleanup(job_id, 300))
+        job_store.fail_job(job_id, f"Error generating proposal: {str(e)}")
 
-async def schedule_cleanup(job_id: str, delay_seconds: int):
-    """Schedules a cleanup task to remove job data after a delay."""
-    await asyncio.sleep(delay_seconds)
-    cleanup_job_data(job_id)
+def remove_upload_files(paths: List[str]):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+class LeaseHeartbeat:
+    """Renews a queue lease and watches for cancellation from a thread, so blocking parsing or rendering cannot starve it"""
+
+    def __init__(self, job_id: str, worker_id: str, on_stop):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.on_stop = on_stop
+        self.lost = False
+        self.cancelled = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def _run(self):
+        renew_every = job_queue.visibility_timeout / 3
+        last_renewal = time.monotonic()
+        while not self._stop.wait(min(CANCEL_CHECK_INTERVAL, renew_every)):
+            try:
+                if job_queue.is_withdrawn(self.job_id):
+                    print(f"Job {self.job_id} was cancelled; stopping it")
+                    self.cancelled = True
+                    self.on_stop()
+                    return
+                if time.monotonic() - last_renewal >= renew_every:
+                    job_queue.heartbeat(self.job_id, self.worker_id)
+                    last_renewal = time.monotonic()
+            except LeaseLostError as e:
+                print(f"⚠️ {e}; abandoning this delivery")
+                self.lost = True
+                self.on_stop()
+                return
+            except Exception as e:
+                print(f"Heartbeat for job {self.job_id} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        return False
+
+async def process_queued_job(worker_id: str, leased: dict):
+    """Run one leased job through the pipeline and acknowledge it"""
+    job_id = leased["job_id"]
+    payload = leased["payload"]
+
+    if leased["dead"]:
+        print(f"Job {job_id} exhausted its delivery attempts")
+        job_store.fail_job(job_id, "Error generating proposal: the job was interrupted too many times. Please try again.")
+        remove_upload_files(payload["files"])
+        return
+
+    status_data = job_store.get_job(job_id)
+    inputs = job_store.get_inputs(job_id)
+    if status_data is None or inputs is None or status_data["status"] != "processing":
+        # Cleaned up while queued, or finished by a worker that died before acknowledging
+        job_queue.ack(job_id, worker_id)
+        remove_upload_files(payload["files"])
+        return
+
+    print(f"Worker {worker_id} picked up job {job_id} (attempt {leased['attempt']})")
+    request = ProposalRequest(**inputs["request"])
+    loop = asyncio.get_running_loop()
+    task = asyncio.create_task(
+        process_enhanced_proposal(job_id, payload["files"], request, payload["use_dynamic_structure"])
+    )
+    running_jobs[job_id] = task
+
+    try:
+        with LeaseHeartbeat(job_id, worker_id, lambda: loop.call_soon_threadsafe(task.cancel)) as heartbeat:
+            try:
+                await task
+            except asyncio.CancelledError:
+                if heartbeat.lost:
+                    # Another worker owns the job now; leave its uploads and status alone
+                    return
+                if not (heartbeat.cancelled or job_queue.is_withdrawn(job_id)):
+                    raise  # Worker shutdown: the lease expires and another worker retries the job
+                # Outstanding LLM calls and section tasks were cancelled with the task. Renders already
+                # running in a process or thread still write their files, so let them finish first
+                await settle_renders(job_id)
+                remove_job_outputs(job_id)
+                remove_upload_files(payload["files"])
+                print(f"Job {job_id} cancelled")
+                return
+    finally:
+        running_jobs.pop(job_id, None)
+        in_flight_renders.pop(job_id, None)
+
+    job_queue.ack(job_id, worker_id)
+    remove_upload_files(payload["files"])
+
+def remove_job_outputs(job_id: str):
+    """Delete every output file (and compressed variant) whose name carries this job id"""
+    for entry in os.scandir(OUTPUT_DIR):
+        if job_id in entry.name and entry.is_file():
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                print(f"Error removing {entry.path}: {e}")
+
+def cancel_job(job_id: str) -> bool:
+    """Cancel a queued or running job wherever it runs; False if it had already finished"""
+    cancelled = job_store.cancel_job(job_id, "Proposal generation was cancelled.")
+    # Frees the admission capacity immediately; a worker in another process notices within CANCEL_CHECK_INTERVAL
+    job_queue.cancel(job_id)
+    task = running_jobs.get(job_id)
+    if task is not None:
+        task.cancel()
+    return cancelled
+
+async def run_job_worker(worker_id: str, stop_event: Optional[asyncio.Event] = None):
+    """Lease and process queued jobs until stop_event is set"""
+    print(f"Generation worker {worker_id} started")
+    while stop_event is None or not stop_event.is_set():
+        try:
+            leased = await asyncio.to_thread(job_queue.lease, worker_id)
+        except Exception as e:
+            print(f"Worker {worker_id} could not lease a job: {e}")
+            leased = None
+
+        if leased is None:
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            continue
+
+        try:
+            await process_queued_job(worker_id, leased)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Worker {worker_id} failed on job {leased['job_id']}: {e}")
+            traceback.print_exc()
+            job_queue.release(leased["job_id"], worker_id, str(e))
+    print(f"Generation worker {worker_id} stopped")
+
+embedded_worker_tasks = []
+
+# Expired jobs, disk quota and orphaned files are handled by one sweeper (cleanup_job_data removes a job)
+artifact_sweeper = None
+sweeper_task = None
+
+@app.on_event("startup")
+async def start_artifact_sweeper():
+    global artifact_sweeper, sweeper_task
+    artifact_sweeper = ArtifactSweeper(job_store, job_queue, OUTPUT_DIR, UPLOAD_DIR, cleanup_job_data,
+                                       diagram_cache=visualization_generator.diagram_cache)
+    sweeper_task = asyncio.create_task(artifact_sweeper.run())
+
+@app.on_event("shutdown")
+async def stop_artifact_sweeper():
+    if sweeper_task:
+        sweeper_task.cancel()
+
+@app.on_event("startup")
+async def start_embedded_workers():
+    if EMBEDDED_WORKERS <= 0:
+        print("No embedded generation workers; run `python worker.py` to process queued jobs")
+        return
+    base_id = f"{socket.gethostname()}-{os.getpid()}-embedded"
+    for index in range(EMBEDDED_WORKERS):
+        embedded_worker_tasks.append(asyncio.create_task(run_job_worker(f"{base_id}-{index}")))
+
+@app.on_event("shutdown")
+async def stop_embedded_workers():
+    for task in embedded_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*embedded_worker_tasks, return_exceptions=True)
+    embedded_worker_tasks.clear()
 
 def cleanup_job_data(job_id: str):
-    """Cleans up the job data from the global dictionaries."""
-    if job_id in job_status:
-        files_to_delete = job_status[job_id].get("files", [])
+    """Cleans up the job's files and its record in the job store."""
+    status_data = job_store.get_job(job_id)
+    if status_data:
+        files_to_delete = status_data.get("files", [])
         for filename in files_to_delete:
-            file_path = os.path.join(OUTPUT_DIR, filename)
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    print(f"Cleaned up file: {file_path}")
-                except OSError as e:
-                    print(f"Error cleaning up file {file_path}: {e}")
+            for file_path in artifact_files(os.path.join(OUTPUT_DIR, filename)):
+                if os.path.exists(file_path):
+                    try:
+                        os.remove(file_path)
+                        print(f"Cleaned up file: {file_path}")
+                    except OSError as e:
+                        print(f"Error cleaning up file {file_path}: {e}")
 
-        del job_status[job_id]
+        job_store.delete_job(job_id)
 
-    if job_id in generated_structures:
-        del generated_structures[job_id]
-    
-    # Remove from active jobs if still there
-    active_jobs.discard(job_id)
+    job_queue.delete(job_id)
+    section_locks.pop(job_id, None)
     
     print(f"Cleaned up job data for {job_id}")
 
@@ -2474,7 +3400,7 @@ Respond ONLY with valid JSON.
 '''
     
     try:
-        response = ai_config.model.generate_content(
+        response = await ai_config.model.generate_content_async(
             prompt,
             generation_config=genai.types.GenerationConfig(
                 temperature=0.7,
@@ -2630,11 +3556,10 @@ def create_roi_analysis_sheet(ws, content: dict, company_name: str):
 @app.get("/status/{job_id}", response_model=ProposalResponse)
 async def get_job_status_enhanced(job_id: str):
     """Get enhanced job status with structure information"""
-    if job_id not in job_status:
+    status_data = job_store.get_job(job_id)
+    if status_data is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    status_data = job_status[job_id]
-    
     # Debug: Print files being returned
     files_list = status_data.get("files", [])
     if files_list:
@@ -2645,27 +3570,94 @@ async def get_job_status_enhanced(job_id: str):
         "status": status_data["status"],
         "message": status_data["message"],
         "files": files_list,
-        "progress": status_data.get("progress", 0)
+        "progress": status_data.get("progress", 0),
+        "formats": status_data.get("formats"),
+        "version": status_data.get("version")
     }
+    if status_data["status"] == "processing":
+        response_data.update(queue_position_info(job_id))
     
-    if status_data["status"] != "error" and job_id in generated_structures:
-        structure = generated_structures[job_id]
+    summary = status_data.get("structure_summary")
+    if status_data["status"] != "error" and summary:
         response_data["structure_info"] = {
-            "total_sections": len(ai_generator.flatten_sections(structure)),
-            "main_sections": len(structure),
-            "section_titles": [s.title for s in structure[:5]]
+            "total_sections": summary["total_sections"],
+            "main_sections": summary["main_sections"],
+            "section_titles": summary["section_titles"]
         }
     
     return ProposalResponse(**response_data)
 
+def format_sse(event_id: int, event: str, data: dict) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/status/{job_id}/stream")
+async def stream_job_status(job_id: str, request: Request, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events: stage, section and file events until the job is done or failed.
+
+    A fresh connection starts with a "status" snapshot; a reconnect with
+    Last-Event-ID replays whatever it missed instead.
+    """
+    if job_store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    cursor = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    async def event_stream():
+        nonlocal cursor
+        queue = event_bus.subscribe(job_id)
+        try:
+            if cursor is not None:
+                for event in await asyncio.to_thread(job_store.get_events, cursor, [job_id]):
+                    cursor = event["id"]
+                    yield format_sse(event["id"], event["event"], event["data"])
+                    if event["event"] in TERMINAL_EVENTS:
+                        return
+
+            job = await asyncio.to_thread(job_store.get_job, job_id)
+            if job is None:
+                return  # Removed since the 404 check (cleanup or the sweeper); nothing left to report
+            if cursor is None or job["status"] != "processing":
+                # Snapshot first, then only events newer than it
+                cursor = await asyncio.to_thread(job_store.last_event_id, job_id)
+                snapshot = await get_job_status_enhanced(job_id)
+                yield format_sse(cursor, "status", snapshot.dict(exclude_none=True))
+                if snapshot.status != "processing":
+                    return
+
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    job = await asyncio.to_thread(job_store.get_job, job_id)
+                    if job is None or job["status"] != "processing":
+                        # Finished without us seeing the terminal event: replay what is left and stop
+                        for event in await asyncio.to_thread(job_store.get_events, cursor, [job_id]):
+                            cursor = event["id"]
+                            yield format_sse(event["id"], event["event"], event["data"])
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                if event["id"] <= cursor:
+                    continue
+                cursor = event["id"]
+                yield format_sse(event["id"], event["event"], event["data"])
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            event_bus.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/structure/{job_id}")
 async def get_generated_structure(job_id: str):
     """Get the generated structure for a specific job"""
-    if job_id not in generated_structures:
+    structure = load_structure(job_id)
+    if structure is None:
         raise HTTPException(status_code=404, detail="Structure not found for this job")
     
-    structure = generated_structures[job_id]
-    
     return {
         "job_id": job_id,
         "structure": [section.to_dict() for section in structure],
@@ -2673,32 +3665,233 @@ async def get_generated_structure(job_id: str):
         "main_sections": len(structure)
     }
 
+@app.post("/regenerate/{job_id}/{section_key}", response_model=ProposalResponse)
+async def regenerate_section(job_id: str, section_key: str, regeneration: Optional[SectionRegenerationRequest] = None):
+    """Regenerate one section of a completed job and patch its documents in place"""
+    status_data = job_store.get_job(job_id)
+    content = job_store.get_content(job_id)
+    inputs = job_store.get_inputs(job_id)
+    structure = load_structure(job_id)
+    if status_data is None or content is None or inputs is None or structure is None:
+        raise HTTPException(status_code=404, detail="Job not found or its content is no longer available")
+    if status_data["status"] != "completed":
+        raise HTTPException(status_code=409, detail="Only completed jobs can be edited")
+
+    request = ProposalRequest(**inputs["request"])
+    if request.proposal_type != "technical":
+        raise HTTPException(status_code=400, detail="Section regeneration is only available for technical proposals")
+
+    section = next((s for s in ai_generator.flatten_sections(structure) if s.key == section_key), None)
+    if section is None:
+        raise HTTPException(status_code=404, detail=f"Section '{section_key}' not found in this proposal")
+
+    lock = section_locks.setdefault(job_id, asyncio.Lock())
+    async with lock:
+        # Re-read under the lock: another edit in this process may have just finished
+        status_data = job_store.get_job(job_id)
+        content = job_store.get_content(job_id) or content
+        new_content = await ai_generator.regenerate_section_content(
+            inputs["rfp_text"], section, request, regeneration.instructions if regeneration else None
+        )
+        if not new_content:
+            raise HTTPException(status_code=502, detail=f"Content generation for '{section.title}' returned nothing")
+
+        previous_content, content = content, {**content, section_key: new_content}
+        formats = status_data.get("formats") or {}
+
+        # Word is patched in place unless the edit changed the diagrams drawn from the content, in which
+        # case Word and the visualization HTML are re-rendered with the new ones; PDF always re-renders
+        previous_diagrams = await asyncio.to_thread(visualization_generator.diagram_model, previous_content, request)
+        diagrams_changed = previous_diagrams != await asyncio.to_thread(visualization_generator.diagram_model, content, request)
+        rerender = ["docx", "pdf", "html"] if diagrams_changed else ["pdf"]
+        docx_file = formats.get("docx", {}).get("file")
+        if not diagrams_changed and docx_file and os.path.exists(os.path.join(OUTPUT_DIR, docx_file)):
+            diagrams = visualization_generator.diagrams_by_section(structure, content, request).get(section_key, [])
+            await asyncio.to_thread(doc_generator.patch_word_section, docx_file, section_key, new_content, request, diagrams)
+
+        model = ProposalModel.build(job_id, request, structure, content)
+        for output_format in rerender:
+            if formats.get(output_format, {}).get("file"):
+                result = await asyncio.to_thread(render_proposal_format, output_format, model)
+                if result["error"]:
+                    raise HTTPException(status_code=500, detail=f"Error re-rendering {output_format.upper()}: {result['error']}")
+
+        try:
+            version = job_store.add_version(
+                job_id, status_data["version"] or 1, content, status_data.get("files", []),
+                f"Section '{section.title}' regenerated"
+            )
+        except VersionConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    return ProposalResponse(
+        job_id=job_id,
+        status=status_data["status"],
+        message=f"Section '{section.title}' regenerated (version {version})",
+        files=status_data.get("files", []),
+        progress=status_data.get("progress", 100),
+        formats=formats,
+        version=version
+    )
+
+def content_disposition(filename: str) -> str:
+    ascii_name = filename.encode("ascii", "ignore").decode() or "download"
+    if ascii_name == filename:
+        return f'attachment; filename="{filename}"'
+    return f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(filename)}'
+
 @app.get("/download/{filename}")
-async def download_file(filename: str):
-    """Download generated file"""
+async def download_file(filename: str, request: Request):
+    """Download generated file, with conditional GET, byte ranges and precompressed HTML"""
     file_path = os.path.join(OUTPUT_DIR, filename)
-    if not os.path.exists(file_path):
+    if os.path.basename(filename) != filename or not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="File not found")
-    
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type='application/octet-stream'
+
+    stat = os.stat(file_path)
+    digest = await asyncio.to_thread(file_digest, file_path, stat)
+
+    # A download pins the job against eviction and extends its expiry
+    job_id = job_id_from_filename(filename)
+    if job_id:
+        await asyncio.to_thread(job_store.touch, job_id)
+    range_header = request.headers.get("range")
+    # Ranges always address the identity encoding; otherwise prefer a precompressed variant
+    variant = None if range_header else compressed_variant(file_path, request.headers.get("accept-encoding", ""))
+
+    etag = f'"{digest}-{variant[0]}"' if variant else f'"{digest}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        # Regenerated files keep their name, so clients revalidate every time (cheap with ETags)
+        "Cache-Control": "private, no-cache",
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, etag)
+    elif if_modified_since:
+        try:
+            not_modified = int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = content_disposition(filename)
+    media_type = media_type_for(filename)
+
+    if variant:
+        encoding, variant_path = variant
+        headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(os.path.getsize(variant_path))
+        return StreamingResponse(iter_file(variant_path), media_type=media_type, headers=headers)
+
+    # If-Range: only honour the range when the client's copy is still current
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() not in (etag, last_modified):
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, stat.st_size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(iter_file(file_path, start, end), status_code=206, media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(stat.st_size)
+    return StreamingResponse(iter_file(file_path), media_type=media_type, headers=headers)
+
+@app.post("/cancel/{job_id}", response_model=ProposalResponse)
+async def cancel_job_endpoint(job_id: str):
+    """Stop a queued or running job; its record stays, marked cancelled"""
+    status_data = job_store.get_job(job_id)
+    if status_data is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not cancel_job(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is already {status_data['status']}")
+    return await get_job_status_enhanced(job_id)
+
+@app.post("/resume/{job_id}", response_model=ProposalResponse)
+async def resume_job_endpoint(job_id: str):
+    """Re-queue a failed or cancelled job; it continues from its last checkpoint"""
+    status_data = job_store.get_job(job_id)
+    if status_data is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status_data["status"] not in ("error", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Only failed or cancelled jobs can be resumed; this job is {status_data['status']}")
+
+    checkpoint = job_store.get_checkpoint(job_id)
+    inputs = job_store.get_inputs(job_id)
+    if checkpoint["rfp_text"] is None or inputs is None or not inputs["request"]:
+        raise HTTPException(status_code=409, detail="This job stopped before its RFP was processed. Please submit it again.")
+    request = ProposalRequest(**inputs["request"])
+
+    # Charge admission only for the work left to do
+    if checkpoint["structure"] is not None and request.proposal_type == "technical":
+        flat_sections = ai_generator._filter_sections(
+            ai_generator.flatten_sections([Section.from_dict(section) for section in checkpoint["structure"]]), request
+        )
+        total_sections = len(flat_sections)
+        missing_sections = sum(1 for section in flat_sections if section.key not in checkpoint["sections"])
+    else:
+        total_sections = missing_sections = None
+    job_cost = estimate_job_cost(0, request, missing_sections)
+
+    previous = job_queue.get(job_id)
+    payload = previous["payload"] if previous and previous["payload"] else {}
+    job_queue.delete(job_id)
+    try:
+        job_queue.admit(job_id, request.company_name, job_cost)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(e.retry_after, 1))})
+
+    if total_sections is not None:
+        message = f"Resuming: {total_sections - missing_sections} of {total_sections} sections restored from checkpoint"
+    else:
+        message = "Resuming from checkpoint..."
+    if not job_store.reopen_job(job_id, message):
+        job_queue.delete(job_id)
+        raise HTTPException(status_code=409, detail="Job was resumed or removed by another request")
+
+    # The uploads may already be gone; the checkpointed RFP text stands in for them
+    job_queue.enqueue(job_id, {
+        "files": [path for path in payload.get("files", []) if os.path.exists(path)],
+        "use_dynamic_structure": payload.get("use_dynamic_structure", True)
+    })
+    print(f"Resumed job {job_id}: {message}, estimated cost {job_cost:.0f}")
+
+    return ProposalResponse(
+        job_id=job_id,
+        status="processing",
+        message=message,
+        **queue_position_info(job_id)
     )
 
 @app.delete("/cleanup/{job_id}")
 async def cleanup_job_enhanced(job_id: str):
     """Enhanced cleanup with structure removal"""
-    if job_id in job_status:
-        for filename in job_status[job_id].get("files", []):
-            file_path = os.path.join(OUTPUT_DIR, filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        
-        del job_status[job_id]
+    status_data = job_store.get_job(job_id)
+    if status_data:
+        if status_data["status"] == "processing":
+            cancel_job(job_id)
+        for filename in status_data.get("files", []):
+            for file_path in artifact_files(os.path.join(OUTPUT_DIR, filename)):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
         
-        if job_id in generated_structures:
-            del generated_structures[job_id]
+        job_store.delete_job(job_id)
+        job_queue.delete(job_id)
+        section_locks.pop(job_id, None)
         
         return {"message": "Job and associated data cleaned up successfully"}
     
@@ -2711,7 +3904,12 @@ async def health_check():
         "status": "healthy",
         "ai_model_available": ai_config.model is not None,
         "arabic_support": ARABIC_SUPPORT and AMIRI_FONT_PATH is not None,
-        "active_jobs": len(job_status),
+        "arabic_shaping": doc_generator.get_arabic_shaping_stats(),
+        "active_jobs": job_store.count_active(),
+        "status_streams": event_bus.subscriber_count(),
+        "artifacts": artifact_sweeper.last_sweep if artifact_sweeper else {},
+        "queue": job_queue.stats(),
+        "embedded_workers": EMBEDDED_WORKERS,
         "version": "2.1.0"
     }
 
@@ -3,9 +3,9 @@ Mutawazi Financial Proposal System - FastAPI Backend (Updated)
 A complete REST API for the financial proposal generation system with AI price justification
 """
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional, Any, Union
 import pandas as pd
@@ -19,6 +19,12 @@ import google.generativeai as genai
 import asyncio
 import aiohttp
 
+from catalog_index import CatalogIndex
+from cashflow_engine import deliverable_cashflow, monthly_timeline, simulate_scenarios
+from pricing_solver import PRICE_CEILING_RATIO, PRICE_FLOOR_RATIO, solve_prices
+from proposal_export import iter_proposal_xlsx
+from proposal_store import ProposalStore
+
 # import os
 from dotenv import load_dotenv
 
@@ -74,6 +80,58 @@ class DeliverableData(BaseModel):
 
 class CashFlowRequest(BaseModel):
     deliverables: List[DeliverableData]
+    overhead_allocation: str = Field(
+        default="per_deliverable",
+        description="per_deliverable (full monthly overhead per deliverable), shared (split evenly across deliverables in progress each month) or shared_by_cost"
+    )
+
+class ResourceRate(BaseModel):
+    role: str = Field(..., description="Role or resource name")
+    monthly_cost: float = Field(..., ge=0, description="Monthly cost per head")
+    monthly_rate: float = Field(..., ge=0, description="Monthly rate billed to the client per head")
+    count: int = Field(default=1, gt=0, description="Number of people in this role")
+    start_date: Optional[str] = Field(None, description="First month on the project (YYYY-MM-DD), defaults to the project start")
+    end_date: Optional[str] = Field(None, description="Last month on the project (YYYY-MM-DD), defaults to the project end")
+
+class CashFlowTimelineRequest(BaseModel):
+    quotation_code: Optional[str] = Field(None, description="Take the project window from stored metadata")
+    start_date: Optional[str] = Field(None, description="Project start in YYYY-MM-DD format")
+    end_date: Optional[str] = Field(None, description="Project end in YYYY-MM-DD format")
+    deliverables: List[DeliverableData] = Field(default_factory=list)
+    resources: List[ResourceRate] = Field(default_factory=list)
+    payment_delay_months: int = Field(default=0, ge=0, description="Months between earning and receiving a payment")
+    overhead_allocation: str = Field(default="per_deliverable", description="As for /api/cashflow/deliverables")
+
+class ScenarioDistribution(BaseModel):
+    distribution: str = Field(default="fixed", description="fixed, normal, uniform or triangular")
+    value: float = Field(default=1.0, description="Value of a fixed distribution")
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    low: Optional[float] = None
+    mode: Optional[float] = None
+    high: Optional[float] = None
+
+class ScenarioRequest(BaseModel):
+    deliverables: List[DeliverableData]
+    salaries: ScenarioDistribution = Field(default_factory=ScenarioDistribution, description="Salary cost multiplier")
+    tools: ScenarioDistribution = Field(default_factory=ScenarioDistribution, description="Tools cost multiplier")
+    others: ScenarioDistribution = Field(default_factory=ScenarioDistribution, description="Other expenses multiplier")
+    overhead: ScenarioDistribution = Field(default_factory=ScenarioDistribution, description="Overhead multiplier")
+    slippage_months: ScenarioDistribution = Field(
+        default_factory=lambda: ScenarioDistribution(value=0), description="Delivery slippage in months"
+    )
+    simulations: int = Field(default=10000, ge=100, le=50000)
+    seed: Optional[int] = Field(None, description="Fix for reproducible results")
+    start_date: Optional[str] = Field(None, description="Project start; no work is scheduled before it")
+    overhead_allocation: str = Field(default="per_deliverable", description="As for /api/cashflow/deliverables")
+
+class PriceSolverRequest(BaseModel):
+    deliverables: List[DeliverableData] = Field(..., description="Amounts, where given, are the starting prices")
+    target_margin: Optional[float] = Field(None, ge=0, lt=100, description="Profit margin to reach, as a percentage of revenue")
+    cash_positive: bool = Field(default=False, description="Keep cumulative net flow non-negative in due-date order")
+    floor_ratio: float = Field(default=PRICE_FLOOR_RATIO, ge=0, le=1, description="Lowest price as a multiple of the catalog price")
+    ceiling_ratio: float = Field(default=PRICE_CEILING_RATIO, ge=1, description="Highest price as a multiple of the catalog price")
+    overhead_allocation: str = Field(default="per_deliverable", description="As for /api/cashflow/deliverables")
 
 class PaymentTerm(BaseModel):
     description: str = Field(..., description="Payment description")
@@ -84,10 +142,13 @@ class ProposalItem(BaseModel):
     quantity: int = Field(default=1, gt=0)
     unit_price: float = Field(..., gt=0)
     total_price: float = Field(..., gt=0)
+    service_id: Optional[str] = Field(None, description="ID from services catalog, for service mix analytics")
+    cost: Optional[float] = Field(None, ge=0, description="Internal cost of the item, for margin analytics")
 
 class FinalProposalRequest(BaseModel):
     proposal_items: List[ProposalItem]
     payment_terms: List[PaymentTerm]
+    quotation_code: Optional[str] = Field(None, description="Quotation code returned by /api/metadata; a new one is created if omitted")
 
 class OverheadCosts(BaseModel):
     salaries: float = Field(default=50000)
@@ -117,9 +178,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global storage for proposal data (in production, use database)
-proposals_storage = {}
-current_session = {}
+# Metadata, proposals and readiness sessions, persisted in SQLite and keyed by quotation code
+proposal_store = ProposalStore()
 
 # Pre-loaded data
 READINESS_QUESTIONS = [
@@ -381,6 +441,9 @@ SERVICES_CATALOG = {
     }
 }
 
+# Tree, search index and serialized responses, built once since the catalog is static
+catalog_index = CatalogIndex(SERVICES_CATALOG)
+
 DEFAULT_OVERHEAD_COSTS = {
     "salaries": 50000,
     "utilities": 15000,
@@ -538,8 +601,14 @@ async def root():
             "readiness": "/api/readiness",
             "metadata": "/api/metadata", 
             "cashflow": "/api/cashflow",
+            "cashflow_timeline": "/api/cashflow/timeline",
+            "cashflow_scenarios": "/api/cashflow/scenarios",
+            "pricing_solver": "/api/pricing/solve",
             "proposal": "/api/proposal",
+            "analytics": "/api/analytics",
             "services": "/api/services",
+            "services_search": "/api/services/search",
+            "services_tree": "/api/services/tree",
             "price_justification": "/api/price_justification"
         }
     }
@@ -588,14 +657,14 @@ async def assess_readiness(assessment: ReadinessAssessment):
     
     # Store in session
     session_id = str(uuid.uuid4())
-    current_session[session_id] = {
+    proposal_store.save_session(session_id, {
         "readiness": {
             "score": score,
             "status": status,
             "can_proceed": can_proceed,
             "answers": assessment.answers
         }
-    }
+    }, datetime.now().isoformat())
     
     return ReadinessResponse(
         score=score,
@@ -632,10 +701,7 @@ async def create_project_metadata(metadata: ProjectMetadata):
         }
         
         # Store in proposals
-        proposals_storage[quotation_code] = {
-            'metadata': processed_metadata,
-            'created_at': datetime.now().isoformat()
-        }
+        proposal_store.save_metadata(quotation_code, processed_metadata, datetime.now().isoformat())
         
         return {
             "success": True,
@@ -648,13 +714,31 @@ async def create_project_metadata(metadata: ProjectMetadata):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing metadata: {e}")
 
+def cached_json(request: Request, body: bytes, etag: str) -> Response:
+    """Precomputed JSON body, or 304 when the client already holds this version"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/api/services")
-async def get_services_catalog():
+async def get_services_catalog(request: Request):
     """Get available services catalog"""
-    return {
-        "services": SERVICES_CATALOG,
-        "total_services": len(SERVICES_CATALOG)
-    }
+    return cached_json(request, catalog_index.services_body, catalog_index.services_etag)
+
+@app.get("/api/services/tree")
+async def get_services_tree(request: Request):
+    """Services grouped under their parent codes, with price and duration rollups"""
+    return cached_json(request, catalog_index.tree_body, catalog_index.tree_etag)
+
+@app.get("/api/services/search")
+async def search_services(
+    q: str = Query("", description="Words from the service name or description; the last word matches as a prefix"),
+    code_prefix: Optional[str] = Query(None, description="Only services whose code starts with this, e.g. '2.'"),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Search the services catalog"""
+    return catalog_index.search(q, code_prefix, limit)
 
 @app.get("/api/services/{service_id}")
 async def get_service_by_id(service_id: str):
@@ -662,99 +746,79 @@ async def get_service_by_id(service_id: str):
     if service_id not in SERVICES_CATALOG:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    return {
-        "service_id": service_id,
-        **SERVICES_CATALOG[service_id]
-    }
+    return catalog_index.describe(service_id)
 
 @app.post("/api/cashflow/deliverables")
 async def calculate_deliverable_cashflow(request: CashFlowRequest):
     """Calculate deliverable-based cash flow with service catalog integration"""
     try:
-        deliverables = []
-        cumulative_net_flow = 0
-        
-        for i, deliv_data in enumerate(request.deliverables):
-            # If service ID is provided, use catalog data
-            service_info = None
-            if deliv_data.service_id:
-                service_info = SERVICES_CATALOG.get(deliv_data.service_id)
-                if not service_info:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Service ID {deliv_data.service_id} not found in catalog"
-                    )
-                
-                # Use catalog price if amount not provided
-                if deliv_data.amount is None:
-                    amount = service_info['price']
-                else:
-                    amount = deliv_data.amount
-            else:
-                if deliv_data.amount is None:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail="Amount is required when service ID is not provided"
-                    )
-                amount = deliv_data.amount
-            
-            # Calculate overhead
-            base_costs = deliv_data.salaries + deliv_data.tools + deliv_data.others
-            # overhead = calculate_overhead(base_costs, DEFAULT_OVERHEAD_COSTS)
-            # Get duration from service or default to 1 month   
-            duration = service_info['duration'] if service_info else 1
-            overhead = calculate_overhead(base_costs, DEFAULT_OVERHEAD_COSTS, duration)
-            
-            # Calculate totals
-            cash_out = base_costs + overhead
-            net_flow = amount - cash_out
-            cumulative_net_flow += net_flow
-            
-            deliverable = {
-                'deliverable_name': deliv_data.name,
-                'due_date': deliv_data.due_date,
-                'service_id': deliv_data.service_id,
-                'cash_in': amount,
-                'salaries': deliv_data.salaries,
-                'tools': deliv_data.tools,
-                'others': deliv_data.others,
-                'overhead': overhead,
-                'cash_out': cash_out,
-                'net_flow': net_flow,
-                'cumulative_net_flow': cumulative_net_flow,
-                'is_profitable': net_flow > 0
-            }
-            
-            # Add service info if available
-            if service_info:
-                deliverable['service_info'] = {
-                    'name': service_info['name'],
-                    'catalog_price': service_info['price'],
-                    'duration': service_info['duration'],
-                    'unit': service_info['unit']
-                }
-            
-            deliverables.append(deliverable)
-        
-        # Calculate summary
-        total_revenue = sum(d['cash_in'] for d in deliverables)
-        total_costs = sum(d['cash_out'] for d in deliverables)
-        total_profit = total_revenue - total_costs
-        profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
-        
-        return {
-            "deliverables": deliverables,
-            "summary": {
-                "total_revenue": total_revenue,
-                "total_costs": total_costs,
-                "total_profit": total_profit,
-                "profit_margin": round(profit_margin, 2),
-                "is_profitable": total_profit > 0
-            }
-        }
-        
+        result = deliverable_cashflow(
+            request.deliverables, SERVICES_CATALOG, DEFAULT_OVERHEAD_COSTS, request.overhead_allocation
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating cash flow: {e}")
+    # The result is already plain JSON types; skip the per-value encoder pass, which dominates for large BoQs
+    return JSONResponse(content=result)
+
+@app.post("/api/cashflow/timeline")
+async def calculate_cashflow_timeline(request: CashFlowTimelineRequest):
+    """Month-by-month cash flow for deliverable and resource-based BoQs, with the peak financing need"""
+    start_date, end_date = request.start_date, request.end_date
+    if request.quotation_code:
+        metadata = (proposal_store.get(request.quotation_code) or {}).get('metadata')
+        if not metadata:
+            raise HTTPException(status_code=404, detail="No project metadata stored for this quotation code")
+        start_date = start_date or metadata['start_date']
+        end_date = end_date or metadata['end_date']
+    if not start_date or not end_date:
+        raise HTTPException(status_code=400, detail="Provide start_date and end_date, or a quotation_code with stored metadata")
+    if not request.deliverables and not request.resources:
+        raise HTTPException(status_code=400, detail="Provide at least one deliverable or resource")
+
+    try:
+        timeline = monthly_timeline(
+            request.deliverables, request.resources, start_date, end_date,
+            SERVICES_CATALOG, DEFAULT_OVERHEAD_COSTS, request.payment_delay_months, request.overhead_allocation
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating cash flow timeline: {e}")
+    return JSONResponse(content=timeline)
+
+@app.post("/api/cashflow/scenarios")
+async def simulate_cashflow_scenarios(request: ScenarioRequest):
+    """Monte Carlo sensitivity analysis: margin distribution, probability of loss and P10/P50/P90 cash curves"""
+    factors = {
+        name: getattr(request, name).dict()
+        for name in ("salaries", "tools", "others", "overhead", "slippage_months")
+    }
+    try:
+        result = simulate_scenarios(
+            request.deliverables, SERVICES_CATALOG, DEFAULT_OVERHEAD_COSTS, factors,
+            request.simulations, request.seed, request.start_date, request.overhead_allocation
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error simulating scenarios: {e}")
+    return JSONResponse(content=result)
+
+@app.post("/api/pricing/solve")
+async def solve_deliverable_prices(request: PriceSolverRequest):
+    """Per-deliverable prices that reach a target margin and/or stay cash-positive within catalog price bands"""
+    try:
+        result = solve_prices(
+            request.deliverables, SERVICES_CATALOG, DEFAULT_OVERHEAD_COSTS, request.target_margin,
+            request.cash_positive, request.floor_ratio, request.ceiling_ratio, request.overhead_allocation
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error solving prices: {e}")
+    return JSONResponse(content=result)
 
 @app.post("/api/price_justification")
 async def generate_price_justification_endpoint(request: PriceJustificationRequest):
@@ -780,6 +844,10 @@ async def create_financial_proposal(request: FinalProposalRequest):
                 status_code=400, 
                 detail=f"Payment terms must sum to 100%. Current sum: {total_percentage}%"
             )
+        unknown_services = [item.service_id for item in request.proposal_items
+                            if item.service_id and item.service_id not in SERVICES_CATALOG]
+        if unknown_services:
+            raise HTTPException(status_code=400, detail=f"Service ID {unknown_services[0]} not found in catalog")
         
         # Calculate total amount
         total_amount = sum(item.total_price for item in request.proposal_items)
@@ -793,8 +861,14 @@ async def create_financial_proposal(request: FinalProposalRequest):
                 "amount": total_amount * (term.percentage / 100)
             })
         
-        # Generate proposal
-        quotation_code = generate_quotation_code()
+        # The proposal joins its project's metadata when one was saved, else it gets a new code
+        if request.quotation_code:
+            stored = proposal_store.get(request.quotation_code)
+            if stored is None or "metadata" not in stored:
+                raise HTTPException(status_code=404, detail=f"Project metadata {request.quotation_code} not found")
+            quotation_code = request.quotation_code
+        else:
+            quotation_code = generate_quotation_code()
         proposal = {
             'date': datetime.now().strftime('%Y-%m-%d'),
             'offer_number': quotation_code,
@@ -806,10 +880,7 @@ async def create_financial_proposal(request: FinalProposalRequest):
         }
         
         # Store proposal
-        proposals_storage[quotation_code] = {
-            'proposal': proposal,
-            'created_at': datetime.now().isoformat()
-        }
+        proposal_store.save_proposal(quotation_code, proposal, datetime.now().isoformat())
         
         return {
             "success": True,
@@ -817,33 +888,50 @@ async def create_financial_proposal(request: FinalProposalRequest):
             "proposal": proposal
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating proposal: {e}")
 
 @app.get("/api/proposal/{quotation_code}")
 async def get_proposal(quotation_code: str):
     """Get stored proposal by quotation code"""
-    if quotation_code not in proposals_storage:
+    data = proposal_store.get(quotation_code)
+    if data is None:
         raise HTTPException(status_code=404, detail="Proposal not found")
     
-    return proposals_storage[quotation_code]
+    return data
 
 @app.get("/api/proposals")
-async def list_all_proposals():
-    """List all stored proposals"""
+async def list_all_proposals(
+    limit: int = Query(50, ge=1, le=200, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    client: Optional[str] = Query(None, description="Client name (English), case-insensitive"),
+    rfp_code: Optional[str] = Query(None, description="RFP code"),
+    created_from: Optional[str] = Query(None, description="Created on or after (YYYY-MM-DD)"),
+    created_to: Optional[str] = Query(None, description="Created on or before (YYYY-MM-DD)")
+):
+    """List stored proposals, newest first, one page at a time"""
+    try:
+        items, next_cursor, total_count = proposal_store.list_proposals(
+            limit, cursor, client, rfp_code, created_from, created_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
-        "proposals": list(proposals_storage.keys()),
-        "total_count": len(proposals_storage)
+        "proposals": [item["quotation_code"] for item in items],
+        "items": items,
+        "total_count": total_count,
+        "next_cursor": next_cursor
     }
 
 @app.get("/api/proposal/{quotation_code}/summary")
 async def get_proposal_summary(quotation_code: str):
     """Get formatted proposal summary"""
-    if quotation_code not in proposals_storage:
+    data = proposal_store.get(quotation_code)
+    if data is None:
         raise HTTPException(status_code=404, detail="Proposal not found")
     
-    data = proposals_storage[quotation_code]
-    
     if 'metadata' in data and 'proposal' in data:
         metadata = data['metadata']
         proposal = data['proposal']
@@ -876,15 +964,32 @@ PROJECT ITEMS:
     
     return {"summary": "Incomplete proposal data"}
 
+@app.get("/api/proposal/{quotation_code}/xlsx")
+async def export_proposal_xlsx(quotation_code: str):
+    """Download the proposal as an Excel workbook, streamed as it is written"""
+    data = proposal_store.get(quotation_code)
+    if data is None or 'proposal' not in data:
+        raise HTTPException(status_code=404, detail="Proposal not found")
+
+    return StreamingResponse(
+        iter_proposal_xlsx(quotation_code, data['proposal'], data.get('metadata')),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="financial_proposal_{quotation_code}.xlsx"'}
+    )
+
 @app.delete("/api/proposal/{quotation_code}")
 async def delete_proposal(quotation_code: str):
     """Delete a proposal"""
-    if quotation_code not in proposals_storage:
+    if not proposal_store.delete(quotation_code):
         raise HTTPException(status_code=404, detail="Proposal not found")
     
-    del proposals_storage[quotation_code]
     return {"success": True, "message": f"Proposal {quotation_code} deleted"}
 
+@app.get("/api/analytics")
+async def get_portfolio_analytics(top: int = Query(10, ge=1, le=100, description="Clients and services to list")):
+    """Pipeline value, average margin, totals by client and month, and service mix across stored proposals"""
+    return proposal_store.analytics(top)
+
 @app.get("/api/overhead")
 async def get_overhead_costs():
     """Get current overhead costs (admin only)"""
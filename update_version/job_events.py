@@ -0,0 +1,88 @@
+"""
+Job Event Stream for the RFP Proposal Generator
+Fans job events out to Server-Sent Events clients. One tailer task per API
+process reads new rows from the job_events table and hands them to the
+subscribers of each job, so a single query serves every open stream and
+events written by any worker process reach every client. Events published
+by this process wake the tailer at once; the rest arrive on the next poll.
+"""
+
+import asyncio
+import os
+from typing import Dict, Optional, Set
+
+from job_store import JobStore
+
+# How often the tailer checks the database for events from other processes
+EVENT_POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL", "0.5"))
+EVENT_BATCH_SIZE = 500
+
+
+class JobEventBus:
+    def __init__(self, store: JobStore, poll_interval: float = EVENT_POLL_INTERVAL):
+        self.store = store
+        self.poll_interval = poll_interval
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tailer: Optional[asyncio.Task] = None
+        self._last_id = 0
+        store.add_listener(self._on_publish)
+
+    def _on_publish(self):
+        """Called from whichever thread published; hop onto the tailer's loop"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:  # Loop closed between the check and the call
+            pass
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Queue that receives every event for job_id published after this call"""
+        loop = asyncio.get_running_loop()
+        if self._tailer is None or self._tailer.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._last_id = self.store.last_event_id()
+            self._tailer = loop.create_task(self._tail())
+
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def _tail(self):
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            # One cursor over every job's events; filtering happens below, against
+            # the subscribers present at dispatch time, so a stream that
+            # subscribes while the query runs still gets its job's events.
+            try:
+                events = await asyncio.to_thread(self.store.get_events, self._last_id, None, EVENT_BATCH_SIZE)
+            except Exception as e:
+                print(f"Job event tailer failed to read events: {e}")
+                continue
+
+            for event in events:
+                self._last_id = max(self._last_id, event["id"])
+                for queue in self._subscribers.get(event["job_id"], ()):
+                    queue.put_nowait(event)
+            if len(events) == EVENT_BATCH_SIZE:
+                self._wakeup.set()
+        self._tailer = None
@@ -0,0 +1,386 @@
+"""
+Durable Job Queue for the RFP Proposal Generator
+A SQLite-backed work queue in proposal_generator.db. Web nodes enqueue
+generation jobs; worker processes (worker.py) lease them, keep the lease
+alive with heartbeats, and acknowledge them when done. A lease that is not
+renewed within the visibility timeout makes the job visible again, so a
+crashed worker's job is picked up by another one.
+
+Admission and ordering: every job carries a cost estimate and a tenant.
+Capacity is checked and reserved in the same transaction that admits the
+job, and jobs are handed out by weighted fair queuing (smallest virtual
+finish time first), so one tenant's backlog cannot starve the others.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from job_store import JOB_STORE_PATH, _Transaction
+
+# Seconds a leased job stays invisible to other workers without a heartbeat
+VISIBILITY_TIMEOUT = float(os.getenv("QUEUE_VISIBILITY_TIMEOUT", "120"))
+# Deliveries before a job is given up on (each expired lease counts as one)
+MAX_DELIVERY_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+# Delay before a failed delivery is retried
+RETRY_DELAY = float(os.getenv("QUEUE_RETRY_DELAY", "10"))
+
+# Admission limits, in cost units (roughly worker-seconds) of admitted but unfinished work
+ADMISSION_MAX_COST = float(os.getenv("ADMISSION_MAX_COST", "6000"))
+ADMISSION_TENANT_MAX_COST = float(os.getenv("ADMISSION_TENANT_MAX_COST", "2000"))
+# Per-tenant scheduling weights, e.g. "acme=2,globex=0.5"; unlisted tenants get 1
+TENANT_WEIGHTS = {
+    name.strip().lower(): float(weight)
+    for name, _, weight in (item.partition("=") for item in os.getenv("TENANT_WEIGHTS", "").split(",") if "=" in item)
+}
+# Seconds an admitted job may stay 'held' before enqueue(); older holds are treated as abandoned
+ADMISSION_HOLD_TIMEOUT = float(os.getenv("ADMISSION_HOLD_TIMEOUT", "900"))
+# Starting guess for wall-clock seconds per cost unit; refined from finished jobs
+SECONDS_PER_COST = float(os.getenv("ADMISSION_SECONDS_PER_COST", "1.0"))
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id VARCHAR NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner VARCHAR,
+    lease_expires_at REAL,
+    last_error TEXT,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS queue_tenants (
+    tenant VARCHAR PRIMARY KEY,
+    last_finish REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue_state (
+    key VARCHAR PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue_workers (
+    worker_id VARCHAR PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_job_queue_lease ON job_queue (status, lease_expires_at);
+"""
+
+# Scheduling columns added to job_queue on top of its original layout
+QUEUE_COLUMNS = {
+    "tenant": "VARCHAR NOT NULL DEFAULT ''",
+    "cost": "REAL NOT NULL DEFAULT 0",
+    "virtual_start": "REAL NOT NULL DEFAULT 0",
+    "virtual_finish": "REAL NOT NULL DEFAULT 0",
+    "leased_at": "REAL",
+}
+
+QUEUE_INDEXES = """
+DROP INDEX IF EXISTS ix_job_queue_ready;
+CREATE INDEX IF NOT EXISTS ix_job_queue_fair ON job_queue (status, virtual_finish);
+CREATE INDEX IF NOT EXISTS ix_job_queue_tenant ON job_queue (tenant, status);
+"""
+
+# Queue states that still hold admitted capacity
+OPEN_STATES = ("held", "queued", "leased")
+
+
+class LeaseLostError(Exception):
+    """Raised when a worker no longer holds the lease on a job it is processing"""
+
+
+class QueueFullError(Exception):
+    """Raised when admitting a job would exceed the global or per-tenant capacity"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    def __init__(self, db_path: str = JOB_STORE_PATH, visibility_timeout: float = VISIBILITY_TIMEOUT,
+                 max_attempts: int = MAX_DELIVERY_ATTEMPTS):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript(QUEUE_SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(job_queue)")}
+        for column, column_type in QUEUE_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE job_queue ADD COLUMN {column} {column_type}")
+        conn.executescript(QUEUE_INDEXES)
+
+    def _state(self, conn: sqlite3.Connection, key: str, default: float) -> float:
+        row = conn.execute("SELECT value FROM queue_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def _set_state(self, conn: sqlite3.Connection, key: str, value: float):
+        conn.execute(
+            "INSERT INTO queue_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    # --- Producer side ---
+
+    def admit(self, job_id: str, tenant: str, cost: float):
+        """Reserve capacity for a job and give it its fair-queuing tags.
+
+        The job stays 'held' (invisible to workers) until enqueue() supplies its payload.
+        Raises QueueFullError when the reservation does not fit.
+        """
+        tenant = tenant.strip().lower()
+        now = time.time()
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in OPEN_STATES)
+        with _Transaction(conn):
+            total_cost, tenant_cost = conn.execute(
+                f"""SELECT COALESCE(SUM(cost), 0), COALESCE(SUM(CASE WHEN tenant = ? THEN cost END), 0)
+                    FROM job_queue WHERE status IN ({placeholders})""",
+                (tenant, *OPEN_STATES)
+            ).fetchone()
+            seconds_per_cost = self._state(conn, "seconds_per_cost", SECONDS_PER_COST)
+            if tenant_cost + cost > ADMISSION_TENANT_MAX_COST and tenant_cost > 0:
+                raise QueueFullError(
+                    "Too many proposals are already queued for this company. Please wait and try again.",
+                    int(max(tenant_cost + cost - ADMISSION_TENANT_MAX_COST, cost) * seconds_per_cost)
+                )
+            if total_cost + cost > ADMISSION_MAX_COST and total_cost > 0:
+                raise QueueFullError(
+                    "The generator is at capacity. Please wait and try again.",
+                    int(max(total_cost + cost - ADMISSION_MAX_COST, cost) * seconds_per_cost)
+                )
+
+            # Weighted fair queuing: a tenant's next job starts where its previous one
+            # finishes in virtual time, or at the current virtual time if it was idle
+            virtual_time = self._state(conn, "virtual_time", 0.0)
+            row = conn.execute("SELECT last_finish FROM queue_tenants WHERE tenant = ?", (tenant,)).fetchone()
+            virtual_start = max(virtual_time, row["last_finish"] if row else 0.0)
+            virtual_finish = virtual_start + cost / TENANT_WEIGHTS.get(tenant, 1.0)
+            conn.execute(
+                """INSERT INTO queue_tenants (tenant, last_finish) VALUES (?, ?)
+                   ON CONFLICT(tenant) DO UPDATE SET last_finish = excluded.last_finish""",
+                (tenant, virtual_finish)
+            )
+            conn.execute(
+                """INSERT INTO job_queue (job_id, payload, status, max_attempts, available_at, enqueued_at,
+                                          tenant, cost, virtual_start, virtual_finish)
+                   VALUES (?, '{}', 'held', ?, ?, ?, ?, ?, ?, ?)""",
+                (job_id, self.max_attempts, now, now, tenant, cost, virtual_start, virtual_finish)
+            )
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any]):
+        """Make an admitted job visible to workers"""
+        cursor = self._connect().execute(
+            "UPDATE job_queue SET payload = ?, status = 'queued', available_at = ? WHERE job_id = ? AND status = 'held'",
+            (json.dumps(payload, ensure_ascii=False), time.time(), job_id)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(f"Job {job_id} was not admitted to the queue")
+
+    def expire_holds(self, now: Optional[float] = None, limit: int = 100) -> List[str]:
+        """Give up on held jobs that were never enqueued (the admitting request crashed or
+        was cancelled mid-way), freeing their capacity; returns their job ids"""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        with _Transaction(conn):
+            job_ids = [row["job_id"] for row in conn.execute(
+                "SELECT job_id FROM job_queue WHERE status = 'held' AND enqueued_at < ? ORDER BY enqueued_at LIMIT ?",
+                (now - ADMISSION_HOLD_TIMEOUT, limit)
+            )]
+            conn.executemany(
+                """UPDATE job_queue SET status = 'dead', finished_at = ?,
+                                        last_error = 'Admission hold expired before the job was queued'
+                   WHERE job_id = ? AND status = 'held'""",
+                [(now, job_id) for job_id in job_ids]
+            )
+        return job_ids
+
+    # --- Consumer side ---
+
+    def lease(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Claim the next visible job: abandoned leases first, then queued jobs by virtual finish time"""
+        now = time.time()
+        conn = self._connect()
+        with _Transaction(conn):
+            conn.execute(
+                """INSERT INTO queue_workers (worker_id, last_seen) VALUES (?, ?)
+                   ON CONFLICT(worker_id) DO UPDATE SET last_seen = excluded.last_seen""",
+                (worker_id, now)
+            )
+            row = conn.execute(
+                """SELECT id, job_id, payload, attempts, max_attempts, virtual_start FROM job_queue
+                   WHERE status = 'leased' AND lease_expires_at < ?
+                   ORDER BY lease_expires_at LIMIT 1""",
+                (now,)
+            ).fetchone() or conn.execute(
+                """SELECT id, job_id, payload, attempts, max_attempts, virtual_start FROM job_queue
+                   WHERE status = 'queued' AND available_at <= ?
+                   ORDER BY virtual_finish, id LIMIT 1""",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row["attempts"] >= row["max_attempts"]:
+                # Every delivery so far died without an ack; stop handing it out
+                conn.execute(
+                    """UPDATE job_queue SET status = 'dead', lease_owner = NULL, finished_at = ?,
+                                            last_error = COALESCE(last_error, 'Lease expired on every attempt')
+                       WHERE id = ?""",
+                    (now, row["id"])
+                )
+                return {"job_id": row["job_id"], "payload": json.loads(row["payload"]), "dead": True}
+
+            conn.execute(
+                """UPDATE job_queue SET status = 'leased', attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?,
+                                        leased_at = ?
+                   WHERE id = ?""",
+                (worker_id, now + self.visibility_timeout, now, row["id"])
+            )
+            # System virtual time follows the start tag of the job entering service
+            if row["virtual_start"] > self._state(conn, "virtual_time", 0.0):
+                self._set_state(conn, "virtual_time", row["virtual_start"])
+        return {
+            "job_id": row["job_id"],
+            "payload": json.loads(row["payload"]),
+            "attempt": row["attempts"] + 1,
+            "dead": False,
+        }
+
+    def heartbeat(self, job_id: str, worker_id: str):
+        """Extend the lease; raises LeaseLostError if it expired and another worker took the job"""
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute(
+            "UPDATE job_queue SET lease_expires_at = ? WHERE job_id = ? AND status = 'leased' AND lease_owner = ?",
+            (now + self.visibility_timeout, job_id, worker_id)
+        )
+        if cursor.rowcount == 0:
+            raise LeaseLostError(f"Worker {worker_id} no longer holds the lease on job {job_id}")
+        conn.execute("UPDATE queue_workers SET last_seen = ? WHERE worker_id = ?", (now, worker_id))
+
+    def ack(self, job_id: str, worker_id: str):
+        now = time.time()
+        conn = self._connect()
+        with _Transaction(conn):
+            row = conn.execute(
+                "SELECT cost, leased_at FROM job_queue WHERE job_id = ? AND lease_owner = ?", (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return
+            conn.execute(
+                """UPDATE job_queue SET status = 'done', lease_owner = NULL, lease_expires_at = NULL, finished_at = ?
+                   WHERE job_id = ?""",
+                (now, job_id)
+            )
+            # Calibrate cost units against real run times (exponential moving average)
+            if row["cost"] > 0 and row["leased_at"]:
+                observed = (now - row["leased_at"]) / row["cost"]
+                previous = self._state(conn, "seconds_per_cost", SECONDS_PER_COST)
+                self._set_state(conn, "seconds_per_cost", 0.8 * previous + 0.2 * observed)
+
+    def release(self, job_id: str, worker_id: str, error: str, retry_delay: float = RETRY_DELAY) -> bool:
+        """Give a job back after a failed delivery; returns False when no attempts are left"""
+        now = time.time()
+        conn = self._connect()
+        with _Transaction(conn):
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM job_queue WHERE job_id = ? AND lease_owner = ?",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return False
+            retry = row["attempts"] < row["max_attempts"]
+            conn.execute(
+                """UPDATE job_queue SET status = ?, available_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+                                        last_error = ?, finished_at = ?
+                   WHERE job_id = ?""",
+                ("queued" if retry else "dead", now + retry_delay, error, None if retry else now, job_id)
+            )
+        return retry
+
+    def cancel(self, job_id: str) -> bool:
+        """Withdraw a job: frees its capacity at once, and its worker sees the change on the next check"""
+        cursor = self._connect().execute(
+            f"""UPDATE job_queue SET status = 'cancelled', lease_owner = NULL, lease_expires_at = NULL, finished_at = ?
+                WHERE job_id = ? AND status IN ({', '.join('?' for _ in OPEN_STATES)})""",
+            (time.time(), job_id, *OPEN_STATES)
+        )
+        return cursor.rowcount > 0
+
+    def is_withdrawn(self, job_id: str) -> bool:
+        """True once a job was cancelled or deleted"""
+        row = self._connect().execute("SELECT status FROM job_queue WHERE job_id = ?", (job_id,)).fetchone()
+        return row is None or row["status"] == "cancelled"
+
+    def delete(self, job_id: str):
+        self._connect().execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+
+    # --- Reporting ---
+
+    def position(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Queue position and estimated start for a job that is still waiting, else None"""
+        now = time.time()
+        conn = self._connect()
+        job = conn.execute(
+            "SELECT id, status, virtual_finish FROM job_queue WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if job is None or job["status"] not in ("held", "queued"):
+            return None
+
+        ahead = conn.execute(
+            """SELECT COUNT(*), COALESCE(SUM(cost), 0) FROM job_queue
+               WHERE status = 'queued' AND (virtual_finish < ? OR (virtual_finish = ? AND id < ?))""",
+            (job["virtual_finish"], job["virtual_finish"], job["id"])
+        ).fetchone()
+        seconds_per_cost = self._state(conn, "seconds_per_cost", SECONDS_PER_COST)
+        # Work still left on jobs that are running right now
+        running_seconds = sum(
+            max(0.0, row["cost"] * seconds_per_cost - (now - (row["leased_at"] or now)))
+            for row in conn.execute("SELECT cost, leased_at FROM job_queue WHERE status = 'leased'")
+        )
+        workers = conn.execute(
+            "SELECT COUNT(*) FROM queue_workers WHERE last_seen > ?", (now - self.visibility_timeout,)
+        ).fetchone()[0]
+
+        wait_seconds = (ahead[1] * seconds_per_cost + running_seconds) / max(workers, 1)
+        return {
+            "queue_position": ahead[0] + 1,
+            "estimated_start": now + wait_seconds,
+            "workers": workers,
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            """SELECT job_id, payload, status, attempts, lease_owner, lease_expires_at, last_error, tenant, cost, virtual_finish
+               FROM job_queue WHERE job_id = ?""",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {**dict(row), "payload": json.loads(row["payload"])}
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) AS count FROM job_queue GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
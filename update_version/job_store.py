@@ -0,0 +1,626 @@
+"""
+Persistent Job Store for the RFP Proposal Generator
+Keeps the job lifecycle of ex.py in the reports / report_versions tables of
+proposal_generator.db so that jobs survive restarts and every uvicorn worker
+sees the same state.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "proposal_generator.db"))
+# Progress/message updates are buffered and written at most this often (seconds)
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "1.0"))
+# How long finished jobs keep their files; every download pushes a completed job's expiry out again
+ARTIFACT_TTL_SECONDS = float(os.getenv("ARTIFACT_TTL_SECONDS", str(24 * 3600)))
+FAILED_JOB_TTL_SECONDS = float(os.getenv("FAILED_JOB_TTL_SECONDS", "3600"))
+
+# Same layout as the tables created by the main application; only used for a fresh database
+REPORTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER NOT NULL,
+    title VARCHAR NOT NULL,
+    client_name VARCHAR NOT NULL,
+    proposal_type VARCHAR NOT NULL,
+    sector VARCHAR NOT NULL,
+    language VARCHAR,
+    status VARCHAR,
+    rfp_files TEXT,
+    output_files TEXT,
+    structure_data TEXT,
+    content_data TEXT,
+    estimated_pages INTEGER,
+    word_count INTEGER,
+    complexity VARCHAR,
+    progress INTEGER,
+    error_message TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME,
+    completed_at DATETIME,
+    owner_id INTEGER,
+    PRIMARY KEY (id)
+);
+CREATE TABLE IF NOT EXISTS report_versions (
+    id INTEGER NOT NULL,
+    version_number INTEGER NOT NULL,
+    description VARCHAR,
+    output_files TEXT,
+    structure_data TEXT,
+    content_data TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    report_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(report_id) REFERENCES reports (id)
+);
+"""
+
+# Job-tracking columns added to reports on top of the original schema
+JOB_COLUMNS = {
+    "job_id": "VARCHAR",
+    "message": "TEXT",
+    "request_data": "TEXT",
+    "rfp_text": "TEXT",
+    "formats_data": "TEXT",
+    "summary_data": "TEXT",
+    "version": "INTEGER",
+    "expires_at": "REAL",
+    "last_accessed_at": "REAL",
+    "request_fingerprint": "VARCHAR",
+}
+
+# Append-only progress events; the SSE endpoint tails this table so events reach
+# clients no matter which process produced them
+EVENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id VARCHAR NOT NULL,
+    event VARCHAR NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_job_events_job_id ON job_events (job_id, id);
+"""
+
+# One row per generated section, written as each section arrives, so a retried
+# or resumed job only pays for the sections it is missing
+CHECKPOINTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_checkpoints (
+    job_id VARCHAR NOT NULL,
+    section_key VARCHAR NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, section_key)
+);
+"""
+
+# Batch submissions: one row per batch, its jobs in submission order
+BATCHES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id VARCHAR PRIMARY KEY,
+    settings TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    batch_id VARCHAR NOT NULL,
+    position INTEGER NOT NULL,
+    job_id VARCHAR NOT NULL,
+    name VARCHAR,
+    PRIMARY KEY (batch_id, position)
+);
+CREATE INDEX IF NOT EXISTS ix_batch_jobs_job_id ON batch_jobs (job_id);
+"""
+
+INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS ix_reports_job_id ON reports (job_id);
+CREATE INDEX IF NOT EXISTS ix_reports_status ON reports (status);
+CREATE INDEX IF NOT EXISTS ix_report_versions_report_id ON report_versions (report_id);
+CREATE INDEX IF NOT EXISTS ix_reports_fingerprint ON reports (request_fingerprint, status) WHERE request_fingerprint IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_reports_expires_at ON reports (expires_at) WHERE expires_at IS NOT NULL;
+CREATE TABLE IF NOT EXISTS store_locks (
+    name VARCHAR PRIMARY KEY,
+    owner VARCHAR NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Fields that go through the write-behind buffer instead of straight to the database
+BUFFERED_FIELDS = {"progress": "progress", "message": "message", "formats": "formats_data"}
+
+
+class VersionConflictError(Exception):
+    """Raised when a job was edited concurrently and the expected version is stale"""
+
+
+class JobStore:
+    def __init__(self, db_path: str = JOB_STORE_PATH, flush_interval: float = PROGRESS_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+        self._listeners = []
+        self._init_schema()
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="job-store-flusher", daemon=True)
+        self._flusher.start()
+
+    # --- Connection and schema ---
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, in WAL mode so readers never block the writer"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript(REPORTS_SCHEMA)
+        conn.executescript(EVENTS_SCHEMA)
+        conn.executescript(CHECKPOINTS_SCHEMA)
+        conn.executescript(BATCHES_SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(reports)")}
+        for column, column_type in JOB_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE reports ADD COLUMN {column} {column_type}")
+        conn.executescript(INDEXES)
+        # Jobs finished before expiry tracking existed get a fresh TTL instead of living forever
+        conn.execute(
+            "UPDATE reports SET expires_at = ? WHERE job_id IS NOT NULL AND status != 'processing' AND expires_at IS NULL",
+            (time.time() + ARTIFACT_TTL_SECONDS,)
+        )
+
+    # --- Write-behind buffer for progress updates ---
+
+    def update_progress(self, job_id: str, progress: Optional[int] = None, message: Optional[str] = None, formats: Optional[dict] = None):
+        """Record a progress change; it reaches the database within flush_interval seconds"""
+        updates = {"progress": progress, "message": message, "formats": formats}
+        with self._pending_lock:
+            pending = self._pending.setdefault(job_id, {})
+            pending.update({field: value for field, value in updates.items() if value is not None})
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Job store flush failed: {e}")
+
+    def flush(self, job_id: Optional[str] = None):
+        """Write buffered progress updates (for one job, or all of them) in a single transaction"""
+        with self._pending_lock:
+            if job_id is None:
+                batch, self._pending = self._pending, {}
+            else:
+                batch = {job_id: self._pending.pop(job_id)} if job_id in self._pending else {}
+        if not batch:
+            return
+
+        conn = self._connect()
+        with _Transaction(conn):
+            for pending_job_id, fields in batch.items():
+                assignments = ", ".join(f"{BUFFERED_FIELDS[field]} = ?" for field in fields)
+                values = [json.dumps(value) if field == "formats" else value for field, value in fields.items()]
+                # Never let a late progress write resurrect a finished job
+                conn.execute(
+                    f"UPDATE reports SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE job_id = ? AND status = 'processing'",
+                    values + [pending_job_id]
+                )
+
+    # --- Events ---
+
+    def publish(self, job_id: str, event: str, data: dict, conn: Optional[sqlite3.Connection] = None) -> int:
+        """Append an event for a job and wake any in-process listeners.
+
+        When conn is given the insert joins the caller's transaction, and the
+        caller notifies listeners once it has committed.
+        """
+        cursor = (conn or self._connect()).execute(
+            "INSERT INTO job_events (job_id, event, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, event, json.dumps(data, ensure_ascii=False), time.time())
+        )
+        if conn is None:
+            self._notify()
+        return cursor.lastrowid
+
+    def _notify(self):
+        for listener in list(self._listeners):
+            listener()
+
+    def add_listener(self, listener):
+        """Register a callable invoked (from any thread) whenever this process publishes an event"""
+        self._listeners.append(listener)
+
+    def get_events(self, after_id: int, job_ids: Optional[List[str]] = None, limit: int = 500) -> List[Dict[str, Any]]:
+        """Events newer than after_id, oldest first, optionally only for some jobs"""
+        query = "SELECT id, job_id, event, data FROM job_events WHERE id > ?"
+        params: List[Any] = [after_id]
+        if job_ids is not None:
+            query += f" AND job_id IN ({', '.join('?' for _ in job_ids)})"
+            params.extend(job_ids)
+        rows = self._connect().execute(query + " ORDER BY id LIMIT ?", params + [limit]).fetchall()
+        return [{"id": row["id"], "job_id": row["job_id"], "event": row["event"], "data": json.loads(row["data"])} for row in rows]
+
+    def last_event_id(self, job_id: Optional[str] = None) -> int:
+        if job_id is None:
+            row = self._connect().execute("SELECT MAX(id) FROM job_events").fetchone()
+        else:
+            row = self._connect().execute("SELECT MAX(id) FROM job_events WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] or 0
+
+    # --- Job lifecycle ---
+
+    def create_job(self, job_id: str, request_data: dict, rfp_files: List[str], message: str, progress: int = 10,
+                   fingerprint: Optional[str] = None, dedupe: bool = False) -> str:
+        """Insert a new processing job and return its id.
+
+        With dedupe, a live job (processing or completed) that has the same
+        fingerprint wins: its id is returned and nothing is inserted. The check
+        and the insert share one transaction, so concurrent duplicates cannot
+        both get through.
+        """
+        conn = self._connect()
+        proposal_type = request_data.get("proposal_type", "technical")
+        company_name = request_data.get("company_name", "")
+        with _Transaction(conn):
+            if dedupe and fingerprint:
+                existing = self._find_live_job(conn, fingerprint)
+                if existing:
+                    return existing
+            conn.execute(
+                """INSERT INTO reports (job_id, title, client_name, proposal_type, sector, language, status, rfp_files,
+                                        output_files, progress, message, request_data, request_fingerprint, version, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, 'processing', ?, '[]', ?, ?, ?, ?, 0, CURRENT_TIMESTAMP)""",
+                (
+                    job_id,
+                    f"{proposal_type.title()} Proposal - {company_name}",
+                    company_name,
+                    proposal_type,
+                    request_data.get("sector", ""),
+                    request_data.get("language", "en"),
+                    json.dumps(rfp_files),
+                    progress,
+                    message,
+                    json.dumps(request_data, ensure_ascii=False),
+                    fingerprint,
+                )
+            )
+        return job_id
+
+    def find_job_by_fingerprint(self, fingerprint: str) -> Optional[str]:
+        return self._find_live_job(self._connect(), fingerprint)
+
+    def _find_live_job(self, conn: sqlite3.Connection, fingerprint: str) -> Optional[str]:
+        """Newest job with this fingerprint that is still running or still has its files"""
+        row = conn.execute(
+            """SELECT job_id FROM reports WHERE request_fingerprint = ? AND status IN ('processing', 'completed')
+               ORDER BY id DESC LIMIT 1""",
+            (fingerprint,)
+        ).fetchone()
+        return row["job_id"] if row else None
+
+    def save_request(self, job_id: str, request_data: dict):
+        self._connect().execute(
+            "UPDATE reports SET request_data = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (json.dumps(request_data, ensure_ascii=False), job_id)
+        )
+
+    def save_structure(self, job_id: str, structure: List[dict], summary: dict):
+        """Store the section tree with a precomputed summary, so status reads never walk the tree"""
+        self.flush(job_id)
+        self._connect().execute(
+            "UPDATE reports SET structure_data = ?, summary_data = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (json.dumps(structure, ensure_ascii=False), json.dumps(summary, ensure_ascii=False), job_id)
+        )
+
+    # --- Checkpoints ---
+
+    def save_extracted_text(self, job_id: str, rfp_text: str):
+        self._connect().execute(
+            "UPDATE reports SET rfp_text = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?", (rfp_text, job_id)
+        )
+
+    def checkpoint_section(self, job_id: str, section_key: str, content: str):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO job_checkpoints (job_id, section_key, content, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, section_key, content, time.time())
+        )
+
+    def get_checkpoint(self, job_id: str) -> Dict[str, Any]:
+        """Everything a restarted job can reuse: extracted RFP text, structure and finished sections"""
+        conn = self._connect()
+        row = conn.execute("SELECT rfp_text, structure_data FROM reports WHERE job_id = ?", (job_id,)).fetchone()
+        sections = {
+            section["section_key"]: section["content"]
+            for section in conn.execute("SELECT section_key, content FROM job_checkpoints WHERE job_id = ?", (job_id,))
+        }
+        return {
+            "rfp_text": row["rfp_text"] if row else None,
+            "structure": json.loads(row["structure_data"]) if row and row["structure_data"] else None,
+            "sections": sections,
+        }
+
+    def reopen_job(self, job_id: str, message: str) -> bool:
+        """Put a failed or cancelled job back into processing so it can resume from its checkpoint"""
+        conn = self._connect()
+        with _Transaction(conn):
+            cursor = conn.execute(
+                """UPDATE reports SET status = 'processing', progress = 10, message = ?, error_message = NULL, expires_at = NULL,
+                                      updated_at = CURRENT_TIMESTAMP
+                   WHERE job_id = ? AND status IN ('error', 'cancelled')""",
+                (message, job_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self.publish(job_id, "stage", {"stage": "resuming", "progress": 10, "message": message}, conn)
+        self._notify()
+        return True
+
+    def save_content(self, job_id: str, content: dict, rfp_text: str):
+        self.flush(job_id)
+        self._connect().execute(
+            "UPDATE reports SET content_data = ?, rfp_text = ?, word_count = ?, updated_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (json.dumps(content, ensure_ascii=False), rfp_text, _count_words(content), job_id)
+        )
+
+    def complete_job(self, job_id: str, files: List[str], message: str, summary: dict, formats: Optional[dict] = None) -> bool:
+        """Mark a job completed and record its first version; False if it was cancelled or removed meanwhile"""
+        self.flush(job_id)
+        conn = self._connect()
+        with _Transaction(conn):
+            cursor = conn.execute(
+                """UPDATE reports SET status = 'completed', progress = 100, message = ?, output_files = ?, formats_data = ?,
+                                      summary_data = ?, version = 1, error_message = NULL, expires_at = ?,
+                                      updated_at = CURRENT_TIMESTAMP, completed_at = CURRENT_TIMESTAMP
+                   WHERE job_id = ? AND status = 'processing'""",
+                (message, json.dumps(files), json.dumps(formats or {}), json.dumps(summary),
+                 time.time() + ARTIFACT_TTL_SECONDS, job_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            conn.execute(
+                """INSERT INTO report_versions (version_number, description, output_files, structure_data, content_data, report_id)
+                   SELECT 1, ?, output_files, structure_data, content_data, id FROM reports WHERE job_id = ?""",
+                ("Initial generation", job_id)
+            )
+            conn.execute("DELETE FROM job_checkpoints WHERE job_id = ?", (job_id,))
+            self.publish(job_id, "done", {"message": message, "files": files, "formats": formats or {}, "version": 1}, conn)
+        self._notify()
+        return True
+
+    def fail_job(self, job_id: str, message: str):
+        self._finish(job_id, "error", "failed", message)
+
+    def cancel_job(self, job_id: str, message: str) -> bool:
+        """Mark a processing job cancelled; False if it had already finished"""
+        return self._finish(job_id, "cancelled", "cancelled", message)
+
+    def _finish(self, job_id: str, status: str, event: str, message: str) -> bool:
+        self.flush(job_id)
+        conn = self._connect()
+        with _Transaction(conn):
+            cursor = conn.execute(
+                """UPDATE reports SET status = ?, progress = 0, message = ?, error_message = ?, output_files = '[]',
+                                      expires_at = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE job_id = ? AND status = 'processing'""",
+                (status, message, message, time.time() + FAILED_JOB_TTL_SECONDS, job_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self.publish(job_id, event, {"message": message}, conn)
+        self._notify()
+        return True
+
+    def add_version(self, job_id: str, expected_version: int, content: dict, files: List[str], description: str) -> int:
+        """Store edited content as a new version; raises VersionConflictError if someone else got there first"""
+        conn = self._connect()
+        new_version = expected_version + 1
+        with _Transaction(conn):
+            cursor = conn.execute(
+                """UPDATE reports SET content_data = ?, output_files = ?, version = ?, message = ?, word_count = ?,
+                                      last_accessed_at = ?, expires_at = MAX(COALESCE(expires_at, 0), ?),
+                                      updated_at = CURRENT_TIMESTAMP
+                   WHERE job_id = ? AND version = ?""",
+                (json.dumps(content, ensure_ascii=False), json.dumps(files), new_version, description,
+                 _count_words(content), time.time(), time.time() + ARTIFACT_TTL_SECONDS, job_id, expected_version)
+            )
+            if cursor.rowcount == 0:
+                raise VersionConflictError(f"Job {job_id} is no longer at version {expected_version}")
+            conn.execute(
+                """INSERT INTO report_versions (version_number, description, output_files, structure_data, content_data, report_id)
+                   SELECT version, ?, output_files, structure_data, content_data, id FROM reports WHERE job_id = ?""",
+                (description, job_id)
+            )
+        return new_version
+
+    def delete_job(self, job_id: str) -> bool:
+        with self._pending_lock:
+            self._pending.pop(job_id, None)
+        conn = self._connect()
+        with _Transaction(conn):
+            conn.execute("DELETE FROM report_versions WHERE report_id IN (SELECT id FROM reports WHERE job_id = ?)", (job_id,))
+            conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_checkpoints WHERE job_id = ?", (job_id,))
+            cursor = conn.execute("DELETE FROM reports WHERE job_id = ?", (job_id,))
+        return cursor.rowcount > 0
+
+    # --- Batches ---
+
+    def create_batch(self, batch_id: str, jobs: List[Dict[str, str]], settings: dict):
+        """jobs: [{"job_id", "name"}] in submission order"""
+        conn = self._connect()
+        with _Transaction(conn):
+            conn.execute(
+                "INSERT INTO batches (batch_id, settings, created_at) VALUES (?, ?, ?)",
+                (batch_id, json.dumps(settings, ensure_ascii=False), time.time())
+            )
+            conn.executemany(
+                "INSERT INTO batch_jobs (batch_id, position, job_id, name) VALUES (?, ?, ?, ?)",
+                [(batch_id, position, job["job_id"], job["name"]) for position, job in enumerate(jobs)]
+            )
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        row = conn.execute("SELECT settings, created_at FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        jobs = conn.execute(
+            "SELECT job_id, name FROM batch_jobs WHERE batch_id = ? ORDER BY position", (batch_id,)
+        ).fetchall()
+        return {
+            "batch_id": batch_id,
+            "settings": json.loads(row["settings"] or "{}"),
+            "created_at": row["created_at"],
+            "jobs": [{"job_id": job["job_id"], "name": job["name"]} for job in jobs],
+        }
+
+    def delete_orphan_batches(self) -> int:
+        """Drop batches none of whose jobs exist any more"""
+        conn = self._connect()
+        with _Transaction(conn):
+            cursor = conn.execute(
+                """DELETE FROM batches WHERE NOT EXISTS (
+                       SELECT 1 FROM batch_jobs JOIN reports ON reports.job_id = batch_jobs.job_id
+                       WHERE batch_jobs.batch_id = batches.batch_id)"""
+            )
+            conn.execute("DELETE FROM batch_jobs WHERE batch_id NOT IN (SELECT batch_id FROM batches)")
+        return cursor.rowcount
+
+    # --- Artifact lifecycle ---
+
+    def touch(self, job_id: str):
+        """Record a download: pins the job against eviction and extends its expiry"""
+        now = time.time()
+        self._connect().execute(
+            """UPDATE reports SET last_accessed_at = ?, expires_at = MAX(COALESCE(expires_at, 0), ?)
+               WHERE job_id = ? AND status = 'completed'""",
+            (now, now + ARTIFACT_TTL_SECONDS, job_id)
+        )
+
+    def expired_jobs(self, now: float, limit: int = 100) -> List[str]:
+        rows = self._connect().execute(
+            """SELECT job_id FROM reports WHERE expires_at IS NOT NULL AND expires_at <= ? AND status != 'processing'
+               ORDER BY expires_at LIMIT ?""",
+            (now, limit)
+        ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def eviction_candidates(self, pinned_since: float) -> List[Dict[str, Any]]:
+        """Completed jobs, least recently used first, skipping those downloaded since pinned_since"""
+        rows = self._connect().execute(
+            """SELECT job_id, output_files FROM reports
+               WHERE status = 'completed' AND COALESCE(last_accessed_at, 0) < ?
+               ORDER BY COALESCE(last_accessed_at, CAST(strftime('%s', completed_at) AS REAL), 0)""",
+            (pinned_since,)
+        ).fetchall()
+        return [{"job_id": row["job_id"], "files": json.loads(row["output_files"] or "[]")} for row in rows]
+
+    def mark_evicted(self, job_id: str, message: str):
+        """Files were removed to free disk space; keep the record until its TTL so /status can explain"""
+        conn = self._connect()
+        with _Transaction(conn):
+            conn.execute(
+                """UPDATE reports SET status = 'expired', message = ?, output_files = '[]', updated_at = CURRENT_TIMESTAMP
+                   WHERE job_id = ? AND status = 'completed'""",
+                (message, job_id)
+            )
+            self.publish(job_id, "failed", {"message": message, "status": "expired"}, conn)
+        self._notify()
+
+    def existing_job_ids(self, job_ids: List[str]) -> set:
+        if not job_ids:
+            return set()
+        rows = self._connect().execute(
+            f"SELECT job_id FROM reports WHERE job_id IN ({', '.join('?' for _ in job_ids)})", job_ids
+        ).fetchall()
+        return {row["job_id"] for row in rows}
+
+    def try_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew a named lease shared by every process using this database"""
+        now = time.time()
+        cursor = self._connect().execute(
+            """INSERT INTO store_locks (name, owner, expires_at) VALUES (?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+               WHERE store_locks.owner = excluded.owner OR store_locks.expires_at < ?""",
+            (name, owner, now + ttl, now)
+        )
+        return cursor.rowcount > 0
+
+    # --- Reads ---
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status in the shape ex.py has always used for job_status entries"""
+        row = self._connect().execute(
+            """SELECT job_id, status, message, progress, output_files, formats_data, summary_data, version, error_message
+               FROM reports WHERE job_id = ?""",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            "status": row["status"],
+            "message": row["message"] or "",
+            "progress": row["progress"] or 0,
+            "files": json.loads(row["output_files"] or "[]"),
+            "formats": json.loads(row["formats_data"]) if row["formats_data"] else None,
+            "structure_summary": json.loads(row["summary_data"]) if row["summary_data"] else None,
+            "version": row["version"] or None,
+        }
+
+        # Read-your-writes for this process: overlay updates that are still buffered
+        with self._pending_lock:
+            pending = dict(self._pending.get(job_id, {}))
+        if job["status"] == "processing":
+            job.update(pending)
+        return job
+
+    def get_structure(self, job_id: str) -> Optional[List[dict]]:
+        row = self._connect().execute("SELECT structure_data FROM reports WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["structure_data"]) if row and row["structure_data"] else None
+
+    def get_content(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT content_data FROM reports WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["content_data"]) if row and row["content_data"] else None
+
+    def get_inputs(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """RFP text and original request data, as needed to regenerate content"""
+        row = self._connect().execute("SELECT request_data, rfp_text FROM reports WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or not row["request_data"]:
+            return None
+        return {"request": json.loads(row["request_data"]), "rfp_text": row["rfp_text"] or ""}
+
+    def count_active(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM reports WHERE status = 'processing'").fetchone()[0]
+
+    def count_jobs(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM reports WHERE job_id IS NOT NULL").fetchone()[0]
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block (connections run in autocommit mode)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _count_words(content: dict) -> int:
+    return sum(len(value.split()) for value in content.values() if isinstance(value, str))
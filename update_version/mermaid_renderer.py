@@ -0,0 +1,930 @@
+"""
+Offline Mermaid Renderer for the RFP Proposal Generator
+Renders the Mermaid subset the proposal generator emits - gantt charts and
+graph/flowchart diagrams (TD/TB/LR, rectangle, rounded, decision, circle and
+database nodes, labelled and dotted edges, subgraphs) - to SVG and PNG without
+a browser or the mermaid.ink service, so the HTML, Word and PDF outputs can
+embed the images. A diagram is laid out once into shapes that both the SVG
+writer and the Pillow painter draw, and rendered files are cached on disk by
+a hash of the normalized source, so identical diagrams render once.
+"""
+
+import hashlib
+import math
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Bump when the layout or styling changes so cached files are not reused
+RENDERER_VERSION = "1"
+DIAGRAM_CACHE_DIR = os.getenv("DIAGRAM_CACHE_DIR", os.path.join("outputs", "diagrams"))
+# Cached diagrams not used for this long are pruned
+DIAGRAM_CACHE_TTL_SECONDS = float(os.getenv("DIAGRAM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+PNG_SCALE = 2
+
+FONT_FAMILY = "Segoe UI, Helvetica, Arial, sans-serif"
+FONT_SIZE = 14
+LINE_HEIGHT = 18
+# Average glyph width as a share of the font size, for sizing boxes without a font engine
+CHAR_WIDTH = 0.6
+WRAP_CHARS = 24
+MARGIN = 20
+
+NODE_PAD_X, NODE_PAD_Y = 16, 10
+NODE_MIN_WIDTH = 60
+NODE_GAP = 30
+RANK_GAP = 60
+BAND_GAP = 40
+CLUSTER_PAD = 16
+CLUSTER_TITLE_HEIGHT = 22
+
+GANTT_ROW_HEIGHT = 28
+GANTT_CHART_WIDTH = 720
+GANTT_AXIS_HEIGHT = 24
+GANTT_MAX_LABEL_CHARS = 32
+
+TEXT_COLOR = "#333333"
+NODE_FILL, NODE_STROKE = "#ECECFF", "#9370DB"
+EDGE_COLOR = "#333333"
+CLUSTER_FILL, CLUSTER_STROKE = "#FFFFDE", "#AAAA33"
+GRID_COLOR = "#DDDDDD"
+SECTION_FILLS = ("#EEF0FF", "#FFFFFF")
+TASK_FILLS = {"default": "#8A90DD", "active": "#BFC7FF", "done": "#D3D3D3", "crit": "#FF8888"}
+
+FONT_CANDIDATES = [
+    os.getenv("DIAGRAM_FONT"),
+    "DejaVuSans.ttf",
+    "LiberationSans-Regular.ttf",
+    "Arial.ttf",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "Amiri-Regular.ttf"),
+]
+BOLD_FONT_CANDIDATES = [os.getenv("DIAGRAM_BOLD_FONT"), "DejaVuSans-Bold.ttf", "LiberationSans-Bold.ttf", "Arial Bold.ttf"]
+
+
+class MermaidSyntaxError(ValueError):
+    """The source is outside the supported Mermaid subset"""
+
+
+# --- Diagram models ---
+
+@dataclass
+class FlowNode:
+    node_id: str
+    label: str
+    shape: str = "rect"
+    cluster: Optional[int] = None
+
+
+@dataclass
+class FlowEdge:
+    source: str
+    target: str
+    label: str = ""
+    arrow: bool = True
+    dashed: bool = False
+    thick: bool = False
+
+
+@dataclass
+class Flowchart:
+    direction: str
+    nodes: Dict[str, FlowNode] = field(default_factory=dict)
+    edges: List[FlowEdge] = field(default_factory=list)
+    clusters: List[str] = field(default_factory=list)
+
+    @property
+    def vertical(self) -> bool:
+        return self.direction in ("TD", "TB", "BT")
+
+
+@dataclass
+class GanttTask:
+    name: str
+    section: str
+    start: float  # Day ordinal, fractional for hour durations
+    end: float
+    tags: Tuple[str, ...] = ()
+    task_id: Optional[str] = None
+
+
+@dataclass
+class GanttChart:
+    title: Optional[str]
+    tasks: List[GanttTask]
+
+
+@dataclass
+class Drawing:
+    """Laid-out diagram: shapes in drawing units (pixels at scale 1), painted in order"""
+    width: float
+    height: float
+    shapes: List[Dict[str, Any]]
+
+
+# --- Parsing ---
+
+def _statements(source: str) -> List[str]:
+    """Non-empty, non-comment lines with surrounding whitespace removed"""
+    statements = []
+    for raw in source.splitlines():
+        line = raw.strip()
+        if line and not line.startswith("%%"):
+            statements.append(line)
+    return statements
+
+
+def normalize_source(source: str) -> str:
+    """The source as it is parsed, so formatting differences do not change the cache key"""
+    return "\n".join(_statements(source))
+
+
+def parse(source: str) -> Union[Flowchart, GanttChart]:
+    statements = _statements(source)
+    if not statements:
+        raise MermaidSyntaxError("Empty diagram")
+    header = statements[0].split()
+    kind = header[0].lower()
+    if kind == "gantt":
+        return _parse_gantt(statements[1:])
+    if kind in ("graph", "flowchart"):
+        direction = header[1].upper() if len(header) > 1 else "TD"
+        if direction not in ("TD", "TB", "BT", "LR", "RL"):
+            raise MermaidSyntaxError(f"Unsupported flowchart direction '{header[1]}'")
+        return _FlowchartParser(direction).parse(statements[1:])
+    raise MermaidSyntaxError(f"Unsupported diagram type '{header[0]}'")
+
+
+# Opening delimiter, closing delimiter, shape; longer openers first
+NODE_SHAPES = [
+    ("[(", ")]", "database"), ("((", "))", "circle"), ("([", "])", "round"), ("[[", "]]", "rect"),
+    ("{{", "}}", "diamond"), ("[", "]", "rect"), ("(", ")", "round"), ("{", "}", "diamond"), (">", "]", "rect"),
+]
+NODE_ID = re.compile(r"\s*(\w+)")
+# -->|label|, ---, -.->, ==>, and the inline-label forms -- label --> and == label ==>
+EDGE = re.compile(
+    r"\s*(?:(?P<op>-->|---|-\.->|-\.-|==>|===)(?:\s*\|(?P<pipe>[^|]*)\|)?"
+    r"|--\s*(?P<inline>[^-|>][^>]*?)\s*-->"
+    r"|==\s*(?P<thick>[^=|>][^>]*?)\s*==>)\s*"
+)
+IGNORED_STATEMENTS = ("classdef ", "class ", "style ", "linkstyle ", "click ", "direction ")
+
+
+def _clean_label(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        text = text[1:-1]
+    return re.sub(r"<br\s*/?>", "\n", text, flags=re.IGNORECASE).strip()
+
+
+class _FlowchartParser:
+    def __init__(self, direction: str):
+        self.chart = Flowchart(direction=direction)
+        self.cluster_stack: List[int] = []
+
+    def parse(self, statements: List[str]) -> Flowchart:
+        for statement in statements:
+            for part in statement.split(";"):
+                part = part.strip()
+                if part:
+                    self._statement(part)
+        if self.cluster_stack:
+            raise MermaidSyntaxError("subgraph without a matching end")
+        return self.chart
+
+    def _statement(self, text: str):
+        lower = text.lower()
+        if lower.startswith(IGNORED_STATEMENTS):
+            return
+        if lower == "end":
+            if not self.cluster_stack:
+                raise MermaidSyntaxError("end without a subgraph")
+            self.cluster_stack.pop()
+            return
+        if lower.startswith("subgraph"):
+            title = text[len("subgraph"):].strip()
+            bracketed = re.match(r"\w+\s*\[(.*)\]$", title)
+            self.chart.clusters.append(_clean_label(bracketed.group(1) if bracketed else title))
+            self.cluster_stack.append(len(self.chart.clusters) - 1)
+            return
+
+        source, position = self._node(text, 0)
+        while position < len(text):
+            match = EDGE.match(text, position)
+            if not match:
+                raise MermaidSyntaxError(f"Cannot parse '{text}'")
+            op = match.group("op")
+            label = match.group("pipe") or match.group("inline") or match.group("thick") or ""
+            target, position = self._node(text, match.end())
+            self.chart.edges.append(FlowEdge(
+                source=source, target=target, label=_clean_label(label),
+                arrow=op is None or op.endswith(">"),
+                dashed=op is not None and "." in op,
+                thick=match.group("thick") is not None or (op or "").startswith("=="),
+            ))
+            source = target
+
+    def _node(self, text: str, position: int) -> Tuple[str, int]:
+        match = NODE_ID.match(text, position)
+        if not match:
+            raise MermaidSyntaxError(f"Expected a node in '{text}'")
+        node_id, position = match.group(1), match.end()
+        label, shape = None, None
+        for opener, closer, candidate in NODE_SHAPES:
+            if text.startswith(opener, position):
+                close = text.find(closer, position + len(opener))
+                if close < 0:
+                    raise MermaidSyntaxError(f"Unclosed node label in '{text}'")
+                label, shape = _clean_label(text[position + len(opener):close]), candidate
+                position = close + len(closer)
+                break
+
+        node = self.chart.nodes.get(node_id)
+        if node is None:
+            cluster = self.cluster_stack[-1] if self.cluster_stack else None
+            node = self.chart.nodes[node_id] = FlowNode(node_id, node_id, cluster=cluster)
+        if label is not None:
+            node.label, node.shape = label, shape
+        return node_id, position
+
+
+TASK_TAGS = ("active", "done", "crit", "milestone")
+DURATION = re.compile(r"^(\d+(?:\.\d+)?)\s*([dwh])$", re.IGNORECASE)
+
+
+def _parse_date(text: str) -> Optional[float]:
+    try:
+        return float(date.fromisoformat(text).toordinal())
+    except ValueError:
+        return None
+
+
+def _parse_gantt(statements: List[str]) -> GanttChart:
+    title, section, tasks = None, "", []
+    by_id: Dict[str, GanttTask] = {}
+    for statement in statements:
+        lower = statement.lower()
+        if lower.startswith("title "):
+            title = statement[len("title "):].strip()
+        elif lower.startswith("dateformat"):
+            if statement.split(None, 1)[-1].strip() != "YYYY-MM-DD":
+                raise MermaidSyntaxError("Only dateFormat YYYY-MM-DD is supported")
+        elif lower.startswith(("axisformat", "excludes", "includes", "todaymarker", "tickinterval", "weekday")):
+            continue
+        elif lower.startswith("section "):
+            section = statement[len("section "):].strip()
+        elif ":" in statement:
+            name, meta = statement.split(":", 1)
+            task = _parse_task(name.strip(), meta, section, tasks[-1] if tasks else None, by_id)
+            tasks.append(task)
+            if task.task_id:
+                by_id[task.task_id] = task
+        else:
+            raise MermaidSyntaxError(f"Cannot parse gantt line '{statement}'")
+    if not tasks:
+        raise MermaidSyntaxError("Gantt chart has no tasks")
+    return GanttChart(title=title, tasks=tasks)
+
+
+def _parse_task(name: str, meta: str, section: str, previous: Optional[GanttTask], by_id: Dict[str, GanttTask]) -> GanttTask:
+    parts = [part.strip() for part in meta.split(",") if part.strip()]
+    tags = []
+    while parts and parts[0].lower() in TASK_TAGS:
+        tags.append(parts.pop(0).lower())
+    if not parts:
+        raise MermaidSyntaxError(f"Task '{name}' has no duration")
+
+    task_id, start_spec = None, None
+    if len(parts) >= 3:
+        task_id, start_spec, end_spec = parts[0], parts[1], parts[2]
+    elif len(parts) == 2:
+        first = parts[0]
+        if first.lower().startswith("after ") or _parse_date(first) is not None:
+            start_spec, end_spec = first, parts[1]
+        else:
+            task_id, end_spec = first, parts[1]
+    else:
+        end_spec = parts[0]
+
+    if start_spec is None:
+        if previous is None:
+            raise MermaidSyntaxError(f"Task '{name}' needs a start date")
+        start = previous.end
+    elif start_spec.lower().startswith("after "):
+        references = start_spec.split()[1:]
+        missing = [reference for reference in references if reference not in by_id]
+        if missing or not references:
+            raise MermaidSyntaxError(f"Task '{name}' starts after unknown task '{' '.join(missing)}'")
+        start = max(by_id[reference].end for reference in references)
+    else:
+        start = _parse_date(start_spec)
+        if start is None:
+            raise MermaidSyntaxError(f"Invalid start date '{start_spec}' for task '{name}'")
+
+    end = _parse_date(end_spec)
+    if end is None:
+        duration = DURATION.match(end_spec)
+        if not duration:
+            raise MermaidSyntaxError(f"Invalid duration '{end_spec}' for task '{name}'")
+        amount, unit = float(duration.group(1)), duration.group(2).lower()
+        end = start + amount * {"d": 1, "w": 7, "h": 1 / 24}[unit]
+    if "milestone" in tags:
+        end = start
+    return GanttTask(name=name, section=section, start=start, end=max(end, start), tags=tuple(tags), task_id=task_id)
+
+
+# --- Layout ---
+
+def _wrap(label: str, width: int = WRAP_CHARS) -> List[str]:
+    lines = []
+    for paragraph in label.split("\n"):
+        current = ""
+        for word in paragraph.split():
+            if current and len(current) + 1 + len(word) > width:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}".strip()
+        lines.append(current)
+    return lines or [""]
+
+
+def _text_width(lines: List[str], size: float = FONT_SIZE) -> float:
+    return max(len(line) for line in lines) * size * CHAR_WIDTH
+
+
+def _text(x: float, y: float, lines: List[str], size: float = FONT_SIZE, anchor: str = "middle",
+          bold: bool = False, fill: str = TEXT_COLOR) -> Dict[str, Any]:
+    """Text block whose vertical center is y"""
+    return {"kind": "text", "x": x, "y": y, "lines": lines, "size": size, "anchor": anchor, "bold": bold, "fill": fill}
+
+
+def layout(source: str) -> Drawing:
+    diagram = parse(source)
+    if isinstance(diagram, GanttChart):
+        return _layout_gantt(diagram)
+    return _layout_flowchart(diagram)
+
+
+def _node_size(node: FlowNode) -> Tuple[float, float, List[str]]:
+    lines = _wrap(node.label)
+    width = max(_text_width(lines) + 2 * NODE_PAD_X, NODE_MIN_WIDTH)
+    height = len(lines) * LINE_HEIGHT + 2 * NODE_PAD_Y
+    if node.shape == "diamond":
+        width, height = width * 1.5, height * 1.7
+    elif node.shape == "circle":
+        width = height = max(width, height)
+    elif node.shape == "database":
+        height += 16
+    return width, height, lines
+
+
+def _ranks(chart: Flowchart) -> Tuple[Dict[str, int], set]:
+    """Longest-path layering over the graph with cycles broken; returns ranks and the indexes of back edges"""
+    outgoing: Dict[str, List[Tuple[int, str]]] = {node_id: [] for node_id in chart.nodes}
+    for index, edge in enumerate(chart.edges):
+        outgoing[edge.source].append((index, edge.target))
+
+    # Edges that close a cycle in a depth-first walk are left out of the layering
+    back_edges, state = set(), {}
+    for root in chart.nodes:
+        if root in state:
+            continue
+        state[root] = "open"
+        stack = [(root, iter(outgoing[root]))]
+        while stack:
+            node_id, children = stack[-1]
+            for index, child in children:
+                if state.get(child) == "open":
+                    back_edges.add(index)
+                elif child not in state:
+                    state[child] = "open"
+                    stack.append((child, iter(outgoing[child])))
+                    break
+            else:
+                state[node_id] = "closed"
+                stack.pop()
+
+    indegree = {node_id: 0 for node_id in chart.nodes}
+    forward = [edge for index, edge in enumerate(chart.edges) if index not in back_edges and edge.source != edge.target]
+    for edge in forward:
+        indegree[edge.target] += 1
+    rank = {node_id: 0 for node_id in chart.nodes}
+    ready = [node_id for node_id in chart.nodes if indegree[node_id] == 0]
+    successors: Dict[str, List[str]] = {node_id: [] for node_id in chart.nodes}
+    for edge in forward:
+        successors[edge.source].append(edge.target)
+    while ready:
+        node_id = ready.pop()
+        for child in successors[node_id]:
+            rank[child] = max(rank[child], rank[node_id] + 1)
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    return rank, back_edges
+
+
+def _order_layers(chart: Flowchart, rank: Dict[str, int], band_of: Dict[str, int]) -> List[List[str]]:
+    """Nodes per layer, grouped by band and ordered by the barycenter of their neighbours to reduce crossings"""
+    layers: List[List[str]] = [[] for _ in range(max(rank.values()) + 1)]
+    for node_id in chart.nodes:
+        layers[rank[node_id]].append(node_id)
+    neighbours: Dict[str, List[str]] = {node_id: [] for node_id in chart.nodes}
+    for edge in chart.edges:
+        if edge.source != edge.target:
+            neighbours[edge.source].append(edge.target)
+            neighbours[edge.target].append(edge.source)
+
+    def sweep(layer_indexes, towards):
+        position = {node_id: index for layer in layers for index, node_id in enumerate(layer)}
+        for layer_index in layer_indexes:
+            def barycenter(node_id):
+                linked = [position[other] for other in neighbours[node_id] if towards(rank[other], layer_index)]
+                return sum(linked) / len(linked) if linked else position[node_id]
+            layers[layer_index].sort(key=lambda node_id: (band_of[node_id], barycenter(node_id)))
+            position.update({node_id: index for index, node_id in enumerate(layers[layer_index])})
+
+    for layer in layers:
+        layer.sort(key=lambda node_id: band_of[node_id])
+    for _ in range(4):
+        sweep(range(1, len(layers)), lambda other_rank, current: other_rank < current)
+        sweep(range(len(layers) - 2, -1, -1), lambda other_rank, current: other_rank > current)
+    return layers
+
+
+def _layout_flowchart(chart: Flowchart) -> Drawing:
+    if not chart.nodes:
+        raise MermaidSyntaxError("Flowchart has no nodes")
+    sizes = {node_id: _node_size(node) for node_id, node in chart.nodes.items()}
+    rank, back_edges = _ranks(chart)
+
+    # Every subgraph gets its own band across the layers, so cluster boxes never overlap
+    band_keys: List[Optional[int]] = []
+    for node in chart.nodes.values():
+        if node.cluster not in band_keys:
+            band_keys.append(node.cluster)
+    band_of = {node_id: band_keys.index(node.cluster) for node_id, node in chart.nodes.items()}
+    layers = _order_layers(chart, rank, band_of)
+
+    vertical = chart.vertical
+    along = (lambda node_id: sizes[node_id][1]) if vertical else (lambda node_id: sizes[node_id][0])
+    across = (lambda node_id: sizes[node_id][0]) if vertical else (lambda node_id: sizes[node_id][1])
+
+    has_clusters = any(key is not None for key in band_keys)
+    layer_start, position = [], MARGIN + (CLUSTER_PAD + CLUSTER_TITLE_HEIGHT if has_clusters and vertical else 0)
+    layer_depth = [max(along(node_id) for node_id in layer) if layer else 0 for layer in layers]
+    rank_gap = RANK_GAP + (LINE_HEIGHT if any(edge.label for edge in chart.edges) else 0)
+    for depth in layer_depth:
+        layer_start.append(position)
+        position += depth + rank_gap
+    rank_extent = position - rank_gap + MARGIN + (CLUSTER_PAD if has_clusters else 0)
+
+    band_width, band_start = {}, {}
+    for band, key in enumerate(band_keys):
+        widths = [
+            sum(across(node_id) for node_id in layer if band_of[node_id] == band)
+            + NODE_GAP * (sum(1 for node_id in layer if band_of[node_id] == band) - 1)
+            for layer in layers if any(band_of[node_id] == band for node_id in layer)
+        ]
+        width = max(widths)
+        if key is not None:
+            width = max(width, _text_width([chart.clusters[key]]) + 2 * CLUSTER_PAD)
+        band_width[band] = width
+    position = MARGIN
+    for band, key in enumerate(band_keys):
+        if key is not None:
+            position += CLUSTER_PAD + (CLUSTER_TITLE_HEIGHT if not vertical else 0)
+        band_start[band] = position
+        position += band_width[band] + BAND_GAP + (CLUSTER_PAD if key is not None else 0)
+    cross_extent = position - BAND_GAP + MARGIN
+
+    centers: Dict[str, Tuple[float, float]] = {}
+    for layer_index, layer in enumerate(layers):
+        for band in range(len(band_keys)):
+            members = [node_id for node_id in layer if band_of[node_id] == band]
+            if not members:
+                continue
+            total = sum(across(node_id) for node_id in members) + NODE_GAP * (len(members) - 1)
+            cursor = band_start[band] + (band_width[band] - total) / 2
+            for node_id in members:
+                rank_center = layer_start[layer_index] + layer_depth[layer_index] / 2
+                cross_center = cursor + across(node_id) / 2
+                centers[node_id] = (cross_center, rank_center) if vertical else (rank_center, cross_center)
+                cursor += across(node_id) + NODE_GAP
+
+    width, height = (cross_extent, rank_extent) if vertical else (rank_extent, cross_extent)
+    shapes: List[Dict[str, Any]] = []
+
+    for band, key in enumerate(band_keys):
+        if key is None:
+            continue
+        members = [node_id for node_id in chart.nodes if band_of[node_id] == band]
+        left = min(centers[n][0] - sizes[n][0] / 2 for n in members) - CLUSTER_PAD
+        right = max(centers[n][0] + sizes[n][0] / 2 for n in members) + CLUSTER_PAD
+        top = min(centers[n][1] - sizes[n][1] / 2 for n in members) - CLUSTER_PAD - CLUSTER_TITLE_HEIGHT
+        bottom = max(centers[n][1] + sizes[n][1] / 2 for n in members) + CLUSTER_PAD
+        if vertical:
+            left, right = min(left, band_start[band] - CLUSTER_PAD), max(right, band_start[band] + band_width[band] + CLUSTER_PAD)
+        shapes.append({"kind": "rect", "x": left, "y": top, "w": right - left, "h": bottom - top,
+                       "fill": CLUSTER_FILL, "stroke": CLUSTER_STROKE, "radius": 4})
+        shapes.append(_text((left + right) / 2, top + CLUSTER_TITLE_HEIGHT / 2 + 4, [chart.clusters[key]], bold=True))
+
+    def cross_center(node_id):
+        return centers[node_id][0] if vertical else centers[node_id][1]
+
+    def rank_center(node_id):
+        return centers[node_id][1] if vertical else centers[node_id][0]
+
+    def to_xy(cross, along_rank):
+        return (cross, along_rank) if vertical else (along_rank, cross)
+
+    labels, back_lanes, far_side = [], 0, 0.0
+    for index, edge in enumerate(chart.edges):
+        if edge.source == edge.target:
+            # Small loop off the node's right side
+            x, y = centers[edge.source][0] + sizes[edge.source][0] / 2, centers[edge.source][1]
+            points = [(x, y - 8), (x + 24, y - 16), (x + 24, y + 16), (x, y + 8)]
+        elif index in back_edges:
+            # Edges against the flow loop round the outside of every node in the ranks they span
+            low, high = sorted((rank[edge.source], rank[edge.target]))
+            side = max(cross_center(n) + across(n) / 2 for n in chart.nodes if low <= rank[n] <= high)
+            side += NODE_GAP + 16 * back_lanes
+            back_lanes += 1
+            first = (cross_center(edge.source) + across(edge.source) / 2, rank_center(edge.source))
+            last = (cross_center(edge.target) + across(edge.target) / 2, rank_center(edge.target))
+            # Cubic curve whose farthest point reaches side
+            control = (8 * side - first[0] - last[0]) / 6
+            points = [
+                to_xy((1 - t) ** 3 * first[0] + 3 * (1 - t) * t * control + t ** 3 * last[0],
+                      (1 - t) ** 3 * first[1] + 3 * (1 - t) ** 2 * t * first[1] + 3 * (1 - t) * t ** 2 * last[1] + t ** 3 * last[1])
+                for t in (step / 16 for step in range(17))
+            ]
+            label_room = (_text_width(_wrap(edge.label), FONT_SIZE - 2) / 2 + 4) if edge.label else 0
+            far_side = max(far_side, side + label_room + MARGIN)
+        else:
+            # Leave the source's side facing the next rank and enter the target's facing side; curved unless
+            # the edge runs mostly sideways, where a straight line reads better
+            first = (cross_center(edge.source), rank_center(edge.source) + along(edge.source) / 2)
+            last = (cross_center(edge.target), rank_center(edge.target) - along(edge.target) / 2)
+            bend = (last[1] - first[1]) / 2
+            points = [
+                to_xy((1 - t) ** 3 * first[0] + 3 * (1 - t) ** 2 * t * first[0] + 3 * (1 - t) * t ** 2 * last[0] + t ** 3 * last[0],
+                      (1 - t) ** 3 * first[1] + 3 * (1 - t) ** 2 * t * (first[1] + bend)
+                      + 3 * (1 - t) * t ** 2 * (last[1] - bend) + t ** 3 * last[1])
+                for t in (step / 16 for step in range(17))
+            ] if 0 < abs(last[0] - first[0]) <= 2 * (last[1] - first[1]) else [to_xy(*first), to_xy(*last)]
+        shapes.append({"kind": "line", "points": points, "stroke": EDGE_COLOR, "width": 3 if edge.thick else 1.5,
+                       "dash": edge.dashed, "arrow": edge.arrow})
+        if edge.label:
+            mid_point = points[len(points) // 2] if len(points) > 2 else (
+                (points[0][0] + points[1][0]) / 2, (points[0][1] + points[1][1]) / 2)
+            labels.append((mid_point, _wrap(edge.label)))
+
+    for node_id, node in chart.nodes.items():
+        (cx, cy), (node_width, node_height, lines) = centers[node_id], sizes[node_id]
+        x, y = cx - node_width / 2, cy - node_height / 2
+        if node.shape == "diamond":
+            shapes.append({"kind": "polygon", "points": [(cx, y), (x + node_width, cy), (cx, y + node_height), (x, cy)],
+                           "fill": NODE_FILL, "stroke": NODE_STROKE})
+        elif node.shape == "circle":
+            shapes.append({"kind": "ellipse", "cx": cx, "cy": cy, "rx": node_width / 2, "ry": node_height / 2,
+                           "fill": NODE_FILL, "stroke": NODE_STROKE})
+        elif node.shape == "database":
+            shapes.append({"kind": "cylinder", "x": x, "y": y, "w": node_width, "h": node_height,
+                           "fill": NODE_FILL, "stroke": NODE_STROKE})
+        else:
+            shapes.append({"kind": "rect", "x": x, "y": y, "w": node_width, "h": node_height,
+                           "fill": NODE_FILL, "stroke": NODE_STROKE, "radius": 10 if node.shape == "round" else 2})
+        shapes.append(_text(cx, cy + (4 if node.shape == "database" else 0), lines))
+
+    if vertical:
+        width = max(width, far_side)
+    else:
+        height = max(height, far_side)
+
+    # Edge labels last, on a white backing so lines do not run through them
+    for (x, y), lines in labels:
+        label_width, label_height = _text_width(lines, FONT_SIZE - 2) + 8, len(lines) * LINE_HEIGHT + 2
+        shapes.append({"kind": "rect", "x": x - label_width / 2, "y": y - label_height / 2, "w": label_width,
+                       "h": label_height, "fill": "#FFFFFF", "stroke": None, "radius": 2})
+        shapes.append(_text(x, y, lines, size=FONT_SIZE - 2))
+
+    return Drawing(width=math.ceil(width), height=math.ceil(height), shapes=shapes)
+
+
+def _month_start(day: date, months: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _gantt_ticks(first: float, last: float) -> List[Tuple[float, str]]:
+    """Axis ticks for the span: weekly for short plans, monthly up to two years, quarterly beyond"""
+    span = last - first
+    start = date.fromordinal(int(first))
+    if span <= 60:
+        day = start - timedelta(days=start.weekday())
+        step, ticks = timedelta(days=7), []
+        while day.toordinal() <= last:
+            if day.toordinal() >= first:
+                ticks.append((float(day.toordinal()), day.strftime("%d %b")))
+            day += step
+        return ticks
+    months = 1 if span <= 730 else 3
+    day, ticks = _month_start(start), []
+    if months == 3:
+        day = _month_start(day, -((day.month - 1) % 3))
+    while day.toordinal() <= last:
+        if day.toordinal() >= first:
+            ticks.append((float(day.toordinal()), day.strftime("%b %Y")))
+        day = _month_start(day, months)
+    return ticks
+
+
+def _truncate(text: str, limit: int = GANTT_MAX_LABEL_CHARS) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _layout_gantt(chart: GanttChart) -> Drawing:
+    first = min(task.start for task in chart.tasks)
+    last = max(task.end for task in chart.tasks)
+    scale = GANTT_CHART_WIDTH / max(last - first, 1)
+
+    section_width = max((_text_width([_truncate(task.section)]) for task in chart.tasks if task.section), default=0)
+    section_width = section_width + 20 if section_width else 0
+    task_width = max(_text_width([_truncate(task.name)]) for task in chart.tasks) + 20
+    chart_left = MARGIN + section_width + task_width
+    top = MARGIN + (LINE_HEIGHT + 16 if chart.title else 0)
+    rows_top = top + GANTT_AXIS_HEIGHT
+    width = chart_left + GANTT_CHART_WIDTH + MARGIN
+    height = rows_top + len(chart.tasks) * GANTT_ROW_HEIGHT + MARGIN
+
+    shapes: List[Dict[str, Any]] = []
+    if chart.title:
+        shapes.append(_text(width / 2, MARGIN + LINE_HEIGHT / 2, [chart.title], size=FONT_SIZE + 2, bold=True))
+
+    # Section bands behind the rows, alternating fills
+    row, band = 0, 0
+    while row < len(chart.tasks):
+        section = chart.tasks[row].section
+        end = row
+        while end < len(chart.tasks) and chart.tasks[end].section == section:
+            end += 1
+        shapes.append({"kind": "rect", "x": MARGIN, "y": rows_top + row * GANTT_ROW_HEIGHT,
+                       "w": width - 2 * MARGIN, "h": (end - row) * GANTT_ROW_HEIGHT,
+                       "fill": SECTION_FILLS[band % 2], "stroke": None, "radius": 0})
+        if section:
+            shapes.append(_text(MARGIN + 8, rows_top + row * GANTT_ROW_HEIGHT + GANTT_ROW_HEIGHT / 2,
+                                [_truncate(section)], anchor="start", bold=True))
+        row, band = end, band + 1
+
+    for day, label in _gantt_ticks(first, last):
+        x = chart_left + (day - first) * scale
+        shapes.append({"kind": "line", "points": [(x, rows_top), (x, height - MARGIN)], "stroke": GRID_COLOR,
+                       "width": 1, "dash": False, "arrow": False})
+        shapes.append(_text(x, top + GANTT_AXIS_HEIGHT / 2, [label], size=FONT_SIZE - 3))
+
+    for index, task in enumerate(chart.tasks):
+        y = rows_top + index * GANTT_ROW_HEIGHT
+        center = y + GANTT_ROW_HEIGHT / 2
+        shapes.append(_text(MARGIN + section_width + 8, center, [_truncate(task.name)], anchor="start"))
+        x = chart_left + (task.start - first) * scale
+        tag = next((tag for tag in ("crit", "done", "active") if tag in task.tags), "default")
+        if "milestone" in task.tags:
+            half = GANTT_ROW_HEIGHT / 3
+            shapes.append({"kind": "polygon", "points": [(x, center - half), (x + half, center), (x, center + half), (x - half, center)],
+                           "fill": TASK_FILLS[tag], "stroke": NODE_STROKE})
+        else:
+            shapes.append({"kind": "rect", "x": x, "y": y + 5, "w": max((task.end - task.start) * scale, 3),
+                           "h": GANTT_ROW_HEIGHT - 10, "fill": TASK_FILLS[tag], "stroke": NODE_STROKE, "radius": 3})
+
+    return Drawing(width=math.ceil(width), height=math.ceil(height), shapes=shapes)
+
+
+# --- SVG ---
+
+def _points(points) -> str:
+    return " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+
+
+def _paint(fill: Optional[str], stroke: Optional[str]) -> str:
+    return f'fill="{fill or "none"}" stroke="{stroke or "none"}"'
+
+
+def drawing_to_svg(drawing: Drawing, marker_id: str = "arrowhead") -> str:
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{drawing.width}" height="{drawing.height}" '
+        f'viewBox="0 0 {drawing.width} {drawing.height}" font-family="{FONT_FAMILY}" role="img">',
+        f'<defs><marker id="{marker_id}" viewBox="0 0 10 10" refX="9" refY="5" markerWidth="7" markerHeight="7" '
+        f'orient="auto-start-reverse"><path d="M0,0 L10,5 L0,10 z" fill="{EDGE_COLOR}"/></marker></defs>',
+        '<rect width="100%" height="100%" fill="#FFFFFF"/>',
+    ]
+    for shape in drawing.shapes:
+        kind = shape["kind"]
+        if kind == "rect":
+            parts.append(f'<rect x="{shape["x"]:.1f}" y="{shape["y"]:.1f}" width="{shape["w"]:.1f}" height="{shape["h"]:.1f}" '
+                         f'rx="{shape["radius"]}" {_paint(shape["fill"], shape["stroke"])}/>')
+        elif kind == "polygon":
+            parts.append(f'<polygon points="{_points(shape["points"])}" {_paint(shape["fill"], shape["stroke"])}/>')
+        elif kind == "ellipse":
+            parts.append(f'<ellipse cx="{shape["cx"]:.1f}" cy="{shape["cy"]:.1f}" rx="{shape["rx"]:.1f}" ry="{shape["ry"]:.1f}" '
+                         f'{_paint(shape["fill"], shape["stroke"])}/>')
+        elif kind == "cylinder":
+            x, y, w, h = shape["x"], shape["y"], shape["w"], shape["h"]
+            ry = min(8.0, h / 6)
+            parts.append(f'<path d="M{x:.1f},{y + ry:.1f} L{x:.1f},{y + h - ry:.1f} A{w / 2:.1f},{ry:.1f} 0 0,0 {x + w:.1f},{y + h - ry:.1f} '
+                         f'L{x + w:.1f},{y + ry:.1f}" {_paint(shape["fill"], shape["stroke"])}/>')
+            parts.append(f'<ellipse cx="{x + w / 2:.1f}" cy="{y + ry:.1f}" rx="{w / 2:.1f}" ry="{ry:.1f}" '
+                         f'{_paint(shape["fill"], shape["stroke"])}/>')
+        elif kind == "line":
+            dash = ' stroke-dasharray="5 4"' if shape["dash"] else ""
+            marker = f' marker-end="url(#{marker_id})"' if shape["arrow"] else ""
+            parts.append(f'<polyline points="{_points(shape["points"])}" fill="none" stroke="{shape["stroke"]}" '
+                         f'stroke-width="{shape["width"]}"{dash}{marker}/>')
+        elif kind == "text":
+            lines = shape["lines"]
+            first = shape["y"] - (len(lines) - 1) * LINE_HEIGHT / 2
+            spans = "".join(
+                f'<tspan x="{shape["x"]:.1f}" y="{first + i * LINE_HEIGHT:.1f}">{escape(line)}</tspan>'
+                for i, line in enumerate(lines)
+            )
+            weight = ' font-weight="bold"' if shape["bold"] else ""
+            parts.append(f'<text text-anchor="{shape["anchor"]}" dominant-baseline="central" font-size="{shape["size"]}" '
+                         f'fill="{shape["fill"]}"{weight}>{spans}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_svg(source: str) -> str:
+    # Marker ids are per diagram so several inline SVGs can share one HTML page
+    return drawing_to_svg(layout(source), f"arrow-{_digest(source)[:10]}")
+
+
+# --- PNG ---
+
+_fonts: Dict[Tuple[int, bool], Any] = {}
+
+
+def _font(size: float, bold: bool):
+    key = (round(size), bold)
+    if key not in _fonts:
+        font = None
+        for candidate in (BOLD_FONT_CANDIDATES if bold else []) + FONT_CANDIDATES:
+            if not candidate:
+                continue
+            try:
+                font = ImageFont.truetype(candidate, key[0])
+                break
+            except OSError:
+                continue
+        if font is None:
+            try:
+                font = ImageFont.load_default(size=key[0])
+            except TypeError:  # Pillow < 10.1 has a single bitmap size
+                font = ImageFont.load_default()
+        _fonts[key] = font
+    return _fonts[key]
+
+
+def _dashed(draw: ImageDraw.ImageDraw, points, fill: str, width: int, dash: float, gap: float):
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        length = math.hypot(x2 - x1, y2 - y1)
+        position = 0.0
+        while position < length:
+            end = min(position + dash, length)
+            draw.line([(x1 + (x2 - x1) * position / length, y1 + (y2 - y1) * position / length),
+                       (x1 + (x2 - x1) * end / length, y1 + (y2 - y1) * end / length)], fill=fill, width=width)
+            position = end + gap
+
+
+def drawing_to_png(drawing: Drawing, scale: float = PNG_SCALE) -> bytes:
+    image = Image.new("RGB", (math.ceil(drawing.width * scale), math.ceil(drawing.height * scale)), "#FFFFFF")
+    draw = ImageDraw.Draw(image)
+    s = scale
+
+    def scaled(points):
+        return [(x * s, y * s) for x, y in points]
+
+    for shape in drawing.shapes:
+        kind = shape["kind"]
+        if kind == "rect":
+            box = [shape["x"] * s, shape["y"] * s, (shape["x"] + shape["w"]) * s, (shape["y"] + shape["h"]) * s]
+            draw.rounded_rectangle(box, radius=shape["radius"] * s, fill=shape["fill"], outline=shape["stroke"],
+                                   width=max(1, round(s)))
+        elif kind == "polygon":
+            draw.polygon(scaled(shape["points"]), fill=shape["fill"], outline=shape["stroke"], width=max(1, round(s)))
+        elif kind == "ellipse":
+            draw.ellipse([(shape["cx"] - shape["rx"]) * s, (shape["cy"] - shape["ry"]) * s,
+                          (shape["cx"] + shape["rx"]) * s, (shape["cy"] + shape["ry"]) * s],
+                         fill=shape["fill"], outline=shape["stroke"], width=max(1, round(s)))
+        elif kind == "cylinder":
+            x, y, w, h = (value * s for value in (shape["x"], shape["y"], shape["w"], shape["h"]))
+            ry = min(8.0 * s, h / 6)
+            line_width = max(1, round(s))
+            draw.ellipse([x, y + h - 2 * ry, x + w, y + h], fill=shape["fill"], outline=shape["stroke"], width=line_width)
+            draw.rectangle([x, y + ry, x + w, y + h - ry], fill=shape["fill"])
+            draw.line([(x, y + ry), (x, y + h - ry)], fill=shape["stroke"], width=line_width)
+            draw.line([(x + w, y + ry), (x + w, y + h - ry)], fill=shape["stroke"], width=line_width)
+            draw.ellipse([x, y, x + w, y + 2 * ry], fill=shape["fill"], outline=shape["stroke"], width=line_width)
+        elif kind == "line":
+            points = scaled(shape["points"])
+            width = max(1, round(shape["width"] * s))
+            if shape["dash"]:
+                _dashed(draw, points, shape["stroke"], width, 5 * s, 4 * s)
+            else:
+                draw.line(points, fill=shape["stroke"], width=width, joint="curve")
+            if shape["arrow"] and len(points) >= 2:
+                (x1, y1), (x2, y2) = points[-2], points[-1]
+                length = math.hypot(x2 - x1, y2 - y1) or 1
+                ux, uy = (x2 - x1) / length, (y2 - y1) / length
+                size = 9 * s
+                base = (x2 - ux * size, y2 - uy * size)
+                draw.polygon([(x2, y2), (base[0] - uy * size / 2, base[1] + ux * size / 2),
+                              (base[0] + uy * size / 2, base[1] - ux * size / 2)], fill=shape["stroke"])
+        elif kind == "text":
+            font = _font(shape["size"] * s, shape["bold"])
+            lines = shape["lines"]
+            first = shape["y"] - (len(lines) - 1) * LINE_HEIGHT / 2
+            anchor = "mm" if shape["anchor"] == "middle" else "lm"
+            for i, line in enumerate(lines):
+                draw.text((shape["x"] * s, (first + i * LINE_HEIGHT) * s), line, font=font, fill=shape["fill"], anchor=anchor)
+
+    output = BytesIO()
+    image.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+def render_png(source: str, scale: float = PNG_SCALE) -> bytes:
+    return drawing_to_png(layout(source), scale)
+
+
+# --- Cache ---
+
+def _digest(source: str) -> str:
+    return hashlib.sha256(f"{RENDERER_VERSION}\n{normalize_source(source)}".encode("utf-8")).hexdigest()
+
+
+class DiagramCache:
+    """Rendered diagrams on disk, named by the hash of their normalized source.
+
+    Files are written to a unique temporary file and renamed, so concurrent
+    renders of the same diagram in different processes or threads are harmless. A cache hit touches
+    the file, and prune() removes files that have not been used for a while.
+    """
+
+    def __init__(self, directory: str = DIAGRAM_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, source: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{_digest(source)}{extension}")
+
+    def _cached(self, path: str, render) -> str:
+        if os.path.exists(path):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+        data = render()
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
+        return path
+
+    def svg(self, source: str) -> str:
+        """SVG markup for the diagram; raises MermaidSyntaxError outside the supported subset"""
+        path = self._cached(self._path(source, ".svg"), lambda: render_svg(source).encode("utf-8"))
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+
+    def png(self, source: str, scale: float = PNG_SCALE) -> str:
+        """Path of the diagram as a PNG; raises MermaidSyntaxError outside the supported subset"""
+        extension = ".png" if scale == PNG_SCALE else f".{scale:g}x.png"
+        return self._cached(self._path(source, extension), lambda: render_png(source, scale))
+
+    def prune(self, max_age_seconds: float = DIAGRAM_CACHE_TTL_SECONDS) -> int:
+        cutoff, removed = time.time() - max_age_seconds, 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
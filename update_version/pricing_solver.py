@@ -0,0 +1,172 @@
+"""
+Target-Margin Price Solver for the Mutawazi Financial Proposal System
+Computes per-deliverable prices that reach a target profit margin and/or keep
+the project cash-positive, within price bands around the SERVICES_CATALOG
+prices. The constraints (one box per price, a revenue total, cumulative
+revenue floors in due-date order) have an exact greedy solution, so a set of
+deliverables is priced in one O(n log n) pass instead of by trial and error.
+"""
+
+import os
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from cashflow_engine import cost_columns
+
+# Catalog services may be priced between these multiples of their catalog price
+PRICE_FLOOR_RATIO = float(os.getenv("PRICE_FLOOR_RATIO", "0.8"))
+PRICE_CEILING_RATIO = float(os.getenv("PRICE_CEILING_RATIO", "1.5"))
+
+
+def scale_to_total(reference: np.ndarray, floor: np.ndarray, ceiling: np.ndarray, total: float) -> np.ndarray:
+    """Water-filling: prices clip(scale * reference, floor, ceiling), with scale chosen so they add up to total.
+
+    The sum is piecewise linear and non-decreasing in scale, with breakpoints
+    where a price reaches its floor or ceiling; sorting the breakpoints gives
+    the exact scale. Returns the floors, or the highest reachable prices, when
+    total is out of reach.
+    """
+    # Prices with a zero reference stay at their floor whatever the scale, so
+    # they cap the reachable sum at their floor even if their ceiling is open
+    scalable = reference > 0
+    highest = np.where(scalable, ceiling, floor)
+    if total <= floor.sum():
+        return floor.copy()
+    if total >= highest.sum():
+        return highest
+    ref = reference[scalable]
+    events = np.concatenate([floor[scalable] / ref, ceiling[scalable] / ref])
+    # Crossing a floor breakpoint starts the price growing (slope +ref, constant -floor); a ceiling stops it
+    slope_change = np.concatenate([ref, -ref])
+    constant_change = np.concatenate([-floor[scalable], ceiling[scalable]])
+    finite = np.isfinite(events)
+    events, slope_change, constant_change = events[finite], slope_change[finite], constant_change[finite]
+    order = np.argsort(events, kind="stable")
+    events = events[order]
+    slope = np.cumsum(slope_change[order])
+    constant = floor.sum() + np.cumsum(constant_change[order])
+
+    # total lies on the segment that starts at the last breakpoint whose sum is still below it
+    sums = constant + slope * events
+    segment = int(np.searchsorted(sums, total)) - 1
+    if segment < 0 or slope[segment] <= 0:
+        return highest
+    scale = (total - constant[segment]) / slope[segment]
+    return np.clip(scale * reference, floor, ceiling)
+
+
+def lift_prefixes(prices: np.ndarray, floor: np.ndarray, ceiling: np.ndarray, required: np.ndarray) -> np.ndarray:
+    """Smallest change to prices (already in due-date order) so that every cumulative revenue reaches required.
+
+    Revenue moves to earlier deliverables and out of later ones, so the total
+    only grows when the floors of the remaining deliverables force it to.
+    Cumulative revenue is capped by the ceilings when required is out of reach.
+    """
+    floor, ceiling, required = floor.tolist(), ceiling.tolist(), required.tolist()
+    size = len(required)
+    # Least cumulative revenue at each step that still lets every later step be met
+    need = [0.0] * size
+    following = -float("inf")
+    for k in range(size - 1, -1, -1):
+        need[k] = max(required[k], following)
+        following = need[k] - ceiling[k]
+
+    lifted = [0.0] * size
+    previous = 0.0
+    for k, cumulative in enumerate(np.cumsum(prices).tolist()):
+        lowest = max(need[k], previous + floor[k])
+        lifted[k] = previous = min(max(cumulative, lowest), previous + ceiling[k])
+    return np.diff(np.array(lifted), prepend=0.0)
+
+
+def solve_prices(deliverables: Sequence[Any], catalog: Dict[str, dict], overhead_costs: Dict[str, float],
+                 target_margin: Optional[float] = None, cash_positive: bool = False,
+                 floor_ratio: float = PRICE_FLOOR_RATIO, ceiling_ratio: float = PRICE_CEILING_RATIO,
+                 overhead_allocation: str = "per_deliverable") -> Dict[str, Any]:
+    """Per-deliverable prices meeting target_margin (percent of revenue) and/or cash_positive.
+
+    Each price starts from the deliverable's amount, else its catalog price,
+    else its cost. Catalog services stay within floor_ratio..ceiling_ratio of
+    the catalog price; other deliverables are only kept non-negative. For a
+    target margin all prices scale together until the margin is met exactly;
+    cash_positive then moves revenue earlier until cumulative net flow, in
+    due-date order, never goes negative. overhead_allocation is passed to
+    cost_columns. Raises ValueError for bad input.
+    """
+    if target_margin is None and not cash_positive:
+        raise ValueError("Set a target margin, cash_positive, or both")
+    if target_margin is not None and not 0 <= target_margin < 100:
+        raise ValueError("Target margin must be at least 0 and below 100 percent")
+    if not 0 <= floor_ratio <= 1 <= ceiling_ratio:
+        raise ValueError("Price bands need floor_ratio <= 1 <= ceiling_ratio")
+
+    costs = cost_columns(deliverables, catalog, overhead_costs, overhead_allocation)
+    try:
+        due = np.array(costs["due_date"], dtype="datetime64[D]")
+    except ValueError as e:
+        raise ValueError(f"Invalid date format: {e}")
+    cash_out = costs["cash_out"]
+    catalog_price = costs["catalog_price"]
+    has_service = costs["has_service"]
+
+    reference = np.where(~np.isnan(costs["amount"]), costs["amount"], np.where(has_service, catalog_price, cash_out))
+    floor = np.where(has_service, catalog_price * floor_ratio, 0.0)
+    ceiling = np.where(has_service, catalog_price * ceiling_ratio, np.inf)
+    start = np.clip(reference, floor, ceiling)
+
+    total_costs = float(cash_out.sum())
+    prices = start
+    if target_margin is not None:
+        prices = scale_to_total(start, floor, ceiling, total_costs / (1 - target_margin / 100))
+
+    order = np.argsort(due, kind="stable")
+    if cash_positive and order.size:
+        prices = prices.copy()
+        prices[order] = lift_prefixes(prices[order], floor[order], ceiling[order], np.cumsum(cash_out[order]))
+    prices = np.round(prices, 2)
+
+    net_flow = prices - cash_out
+    cumulative = np.empty_like(net_flow)
+    cumulative[order] = np.cumsum(net_flow[order])
+    total_revenue = float(prices.sum())
+    total_profit = total_revenue - total_costs
+    profit_margin = total_profit / total_revenue * 100 if total_revenue > 0 else 0.0
+
+    problems = []
+    # Prices are rounded to cents, so allow a cent per deliverable
+    tolerance = 0.01 * max(prices.size, 1)
+    if target_margin is not None and total_profit < total_revenue * target_margin / 100 - tolerance:
+        problems.append(f"target margin of {target_margin}% is out of reach within the price bands")
+    if cash_positive and cumulative.size and cumulative.min() < -tolerance:
+        problems.append("cumulative net flow cannot be kept non-negative within the price bands")
+
+    # Round and convert whole columns, then zip them into records
+    columns = {
+        "deliverable_name": costs["deliverable_name"],
+        "due_date": costs["due_date"],
+        "service_id": costs["service_id"],
+        "reference_price": np.round(reference, 2).tolist(),
+        "price_floor": np.round(floor, 2).tolist(),
+        "price_ceiling": [None if high == np.inf else high for high in np.round(ceiling, 2).tolist()],
+        "price": prices.tolist(),
+        "cash_out": np.round(cash_out, 2).tolist(),
+        "net_flow": np.round(net_flow, 2).tolist(),
+        "cumulative_net_flow": np.round(cumulative, 2).tolist(),
+        "at_floor": (prices <= np.round(floor, 2)).tolist(),
+        "at_ceiling": (prices >= np.round(ceiling, 2)).tolist(),
+    }
+    return {
+        "deliverables": [dict(zip(columns, row)) for row in zip(*columns.values())],
+        "summary": {
+            "total_revenue": round(total_revenue, 2),
+            "total_costs": round(total_costs, 2),
+            "total_profit": round(total_profit, 2),
+            "profit_margin": round(profit_margin, 2),
+            "target_margin": target_margin,
+            "cash_positive": cash_positive,
+            "min_cumulative_net_flow": round(float(cumulative.min()), 2) if cumulative.size else 0.0,
+            "feasible": not problems,
+            "message": "; ".join(problems) if problems else "All constraints met",
+        },
+    }
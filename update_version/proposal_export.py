@@ -0,0 +1,209 @@
+"""
+Streaming Excel Export for the Mutawazi Financial Proposal System
+Writes a stored financial proposal as an .xlsx workbook with openpyxl's
+write-only mode: rows go straight to the worksheet's temporary file instead of
+a cell tree, every cell uses one of a few shared named styles, and the saved
+zip is handed to the response in chunks as it is written. Totals and payment
+term amounts are live formulas, so edits to the sheet recalculate.
+"""
+
+import io
+import queue
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+# Chunks buffered between the thread writing the workbook and the response
+EXPORT_QUEUE_CHUNKS = 16
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+_THIN = Side(style="thin", color="BFBFBF")
+_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+_HEADER_FILL = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
+_TOTAL_FILL = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
+
+
+def _named_styles():
+    return [
+        NamedStyle(name="fp_title", font=Font(bold=True, size=14, color="1F4E78")),
+        NamedStyle(name="fp_label", font=Font(bold=True)),
+        NamedStyle(name="fp_header", font=Font(bold=True, color="FFFFFF"), fill=_HEADER_FILL, border=_BORDER,
+                   alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)),
+        NamedStyle(name="fp_text", border=_BORDER, alignment=Alignment(vertical="top", wrap_text=True)),
+        NamedStyle(name="fp_integer", border=_BORDER, number_format="#,##0"),
+        NamedStyle(name="fp_amount", border=_BORDER, number_format="#,##0.00"),
+        NamedStyle(name="fp_percent", border=_BORDER, number_format="0.00"),
+        NamedStyle(name="fp_total_label", font=Font(bold=True), fill=_TOTAL_FILL, border=_BORDER),
+        NamedStyle(name="fp_total_amount", font=Font(bold=True), fill=_TOTAL_FILL, border=_BORDER,
+                   number_format="#,##0.00"),
+    ]
+
+
+class _Cells:
+    """WriteOnlyCell factory for one worksheet; each named style is resolved once and its style array shared"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._styles = {}
+        for style in _named_styles():
+            prototype = WriteOnlyCell(ws)
+            prototype.style = style.name
+            self._styles[style.name] = prototype._style
+
+    def __call__(self, value, style: Optional[str] = None, formula: bool = False) -> WriteOnlyCell:
+        """Strings are stored as text unless formula is set, so user input starting with "=" never runs"""
+        cell = WriteOnlyCell(self.ws, value=value)
+        if isinstance(value, str) and not formula:
+            cell.data_type = "s"
+        if style:
+            cell._style = self._styles[style]
+        return cell
+
+
+def build_proposal_workbook(quotation_code: str, proposal: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> Workbook:
+    """Write-only workbook with an items sheet and a payment terms sheet"""
+    metadata = metadata or {}
+    currency = proposal.get("currency", "SAR")
+    items = proposal.get("items", [])
+
+    wb = Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+
+    header = [
+        ("Offer Number", proposal.get("offer_number", quotation_code)),
+        ("Date", proposal.get("date")),
+        ("Project", metadata.get("project_name_en")),
+        ("Client", metadata.get("client_name_en")),
+        ("RFP Code", metadata.get("rfp_code")),
+        ("Currency", currency),
+    ]
+    # Item rows start after the title, the header block, the total line, a blank row and the table header
+    first_item_row = len(header) + 5
+    last_item_row = first_item_row + len(items) - 1
+    total_row = last_item_row + 1
+    total_formula = f"=SUM(E{first_item_row}:E{last_item_row})" if items else 0
+
+    # A write-only sheet writes its view and columns with the first row, so set them before appending
+    ws = wb.create_sheet("Proposal")
+    cell = _Cells(ws)
+    for column, width in zip("ABCDE", (8, 60, 12, 18, 20)):
+        ws.column_dimensions[column].width = width
+    ws.freeze_panes = f"A{first_item_row}"
+
+    ws.append([cell("Mutawazi Financial Proposal", "fp_title")])
+    for label, value in header:
+        ws.append([cell(label, "fp_label"), cell(value)])
+    ws.append([cell("Total Project Value", "fp_label"), cell(f"=E{total_row}", "fp_total_amount", formula=True)])
+    ws.append([])
+    ws.append([cell(title, "fp_header") for title in ("#", "Description", "Quantity", f"Unit Price ({currency})", f"Total ({currency})")])
+
+    for number, item in enumerate(items, 1):
+        ws.append([
+            cell(number, "fp_integer"),
+            cell(item.get("description"), "fp_text"),
+            cell(item.get("quantity", 1), "fp_integer"),
+            cell(item.get("unit_price", 0), "fp_amount"),
+            cell(item.get("total_price", 0), "fp_amount"),
+        ])
+    ws.append([
+        cell(None, "fp_total_label"), cell("Total", "fp_total_label"),
+        cell(None, "fp_total_label"), cell(None, "fp_total_label"),
+        cell(total_formula, "fp_total_amount", formula=True),
+    ])
+
+    terms = proposal.get("payment_terms", [])
+    ws = wb.create_sheet("Payment Terms")
+    cell = _Cells(ws)
+    for column, width in zip("ABC", (50, 14, 20)):
+        ws.column_dimensions[column].width = width
+    ws.append([cell(title, "fp_header") for title in ("Payment", "Percentage (%)", f"Amount ({currency})")])
+    for row, term in enumerate(terms, 2):
+        ws.append([
+            cell(term.get("description"), "fp_text"),
+            cell(term.get("percentage"), "fp_percent"),
+            cell(f"=B{row}/100*Proposal!$E${total_row}", "fp_amount", formula=True),
+        ])
+    last_term_row = len(terms) + 1
+    ws.append([
+        cell("Total", "fp_total_label"),
+        cell(f"=SUM(B2:B{last_term_row})" if terms else 0, "fp_total_label", formula=True),
+        cell(f"=SUM(C2:C{last_term_row})" if terms else 0, "fp_total_amount", formula=True),
+    ])
+    return wb
+
+
+class _QueueStream(io.RawIOBase):
+    """Write-only, unseekable sink that hands what the zip writer produces to the response through a bounded queue"""
+
+    def __init__(self, chunks: "queue.Queue", cancelled: threading.Event):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._pending = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self._cancelled.is_set() and not self._pending:
+            # Already aborted: swallow what the zip writer flushes while being torn down
+            return len(data)
+        # The zip writer makes many small writes; pass them on in EXPORT_CHUNK_SIZE pieces
+        self._pending += data
+        if len(self._pending) >= EXPORT_CHUNK_SIZE:
+            self.send_pending()
+        return len(data)
+
+    def send_pending(self):
+        if self._pending:
+            data = bytes(self._pending)
+            self._pending.clear()
+            _put(self._chunks, data, self._cancelled)
+
+
+def _put(chunks: "queue.Queue", item, cancelled: threading.Event):
+    """The bound makes the writer wait for the client; a disconnected client unblocks it by cancelling"""
+    while True:
+        if cancelled.is_set():
+            raise OSError("Export cancelled")
+        try:
+            chunks.put(item, timeout=1)
+            return
+        except queue.Full:
+            continue
+
+
+_DONE = object()
+
+
+def iter_proposal_xlsx(quotation_code: str, proposal: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """Stream the workbook's bytes while a worker thread builds and saves it"""
+    chunks: "queue.Queue" = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    cancelled = threading.Event()
+
+    def write():
+        try:
+            sink = _QueueStream(chunks, cancelled)
+            build_proposal_workbook(quotation_code, proposal, metadata).save(sink)
+            sink.send_pending()
+            _put(chunks, _DONE, cancelled)
+        except Exception as e:
+            if not cancelled.is_set():
+                _put(chunks, e, cancelled)
+
+    worker = threading.Thread(target=write, name=f"xlsx-export-{quotation_code}", daemon=True)
+    worker.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                print(f"Error exporting proposal {quotation_code} to Excel: {chunk}")
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
@@ -0,0 +1,330 @@
+"""
+Persistent Proposal Store for the Mutawazi Financial Proposal System
+Keeps project metadata, financial proposals and readiness sessions of
+financial_proposal.py in SQLite, keyed by quotation code, so they survive
+restarts and the API's memory does not grow with proposal history. Listing
+uses keyset (cursor) pagination over indexed columns. Portfolio analytics
+(totals by client, month and service) are materialized aggregates, adjusted
+in the same transaction as every proposal write.
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+PROPOSAL_STORE_PATH = os.getenv(
+    "PROPOSAL_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "financial_proposals.db")
+)
+MAX_PAGE_SIZE = 200
+# Aggregate key for proposals whose metadata names no client, and for items without a catalog service
+UNASSIGNED_CLIENT = "Unassigned"
+CUSTOM_SERVICE = "custom"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS financial_proposals (
+    quotation_code VARCHAR PRIMARY KEY,
+    created_at VARCHAR NOT NULL,
+    client_name VARCHAR,
+    rfp_code VARCHAR,
+    project_name VARCHAR,
+    total_amount REAL,
+    metadata TEXT,
+    proposal TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_financial_proposals_created ON financial_proposals (created_at, quotation_code);
+CREATE INDEX IF NOT EXISTS ix_financial_proposals_client
+    ON financial_proposals (client_name COLLATE NOCASE, created_at, quotation_code);
+CREATE INDEX IF NOT EXISTS ix_financial_proposals_rfp ON financial_proposals (rfp_code, created_at, quotation_code);
+CREATE TABLE IF NOT EXISTS proposal_analytics (
+    dimension VARCHAR NOT NULL,
+    key VARCHAR NOT NULL,
+    proposal_count INTEGER NOT NULL,
+    line_count INTEGER NOT NULL,
+    value REAL NOT NULL,
+    costed_value REAL NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (dimension, key)
+);
+CREATE TABLE IF NOT EXISTS readiness_sessions (
+    session_id VARCHAR PRIMARY KEY,
+    data TEXT NOT NULL,
+    created_at VARCHAR NOT NULL
+);
+"""
+
+
+class ProposalStore:
+    def __init__(self, db_path: str = PROPOSAL_STORE_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connect()
+        has_analytics = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'proposal_analytics'"
+        ).fetchone()
+        conn.executescript(SCHEMA)
+        if not has_analytics:
+            # Proposals stored before analytics existed
+            self.rebuild_analytics()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, in WAL mode so readers never block the writer"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # --- Writes ---
+
+    def save_metadata(self, quotation_code: str, metadata: dict, created_at: str):
+        with _Transaction(self._connect()) as conn:
+            previous = self._analytics_row(conn, quotation_code)
+            conn.execute(
+                """INSERT INTO financial_proposals (quotation_code, created_at, client_name, rfp_code, project_name, metadata)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(quotation_code) DO UPDATE SET
+                       client_name = excluded.client_name, rfp_code = excluded.rfp_code,
+                       project_name = excluded.project_name, metadata = excluded.metadata""",
+                (quotation_code, created_at, metadata.get("client_name_en"), metadata.get("rfp_code"),
+                 metadata.get("project_name_en"), json.dumps(metadata, ensure_ascii=False))
+            )
+            # A proposal changes client with its metadata
+            if previous is not None and previous["proposal"] is not None:
+                self._apply(conn, previous, -1)
+                self._apply(conn, self._analytics_row(conn, quotation_code), 1)
+
+    def save_proposal(self, quotation_code: str, proposal: dict, created_at: str):
+        with _Transaction(self._connect()) as conn:
+            previous = self._analytics_row(conn, quotation_code)
+            conn.execute(
+                """INSERT INTO financial_proposals (quotation_code, created_at, total_amount, proposal)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(quotation_code) DO UPDATE SET
+                       total_amount = excluded.total_amount, proposal = excluded.proposal""",
+                (quotation_code, created_at, proposal.get("total_amount"), json.dumps(proposal, ensure_ascii=False))
+            )
+            if previous is not None:
+                self._apply(conn, previous, -1)
+            self._apply(conn, self._analytics_row(conn, quotation_code), 1)
+
+    def delete(self, quotation_code: str) -> bool:
+        with _Transaction(self._connect()) as conn:
+            previous = self._analytics_row(conn, quotation_code)
+            if previous is None:
+                return False
+            conn.execute("DELETE FROM financial_proposals WHERE quotation_code = ?", (quotation_code,))
+            self._apply(conn, previous, -1)
+            return True
+
+    def save_session(self, session_id: str, data: dict, created_at: str):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO readiness_sessions (session_id, data, created_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(data, ensure_ascii=False), created_at)
+        )
+
+    # --- Reads ---
+
+    def get(self, quotation_code: str) -> Optional[Dict[str, Any]]:
+        """Stored entry in the shape proposals_storage used: metadata and/or proposal, plus created_at"""
+        row = self._connect().execute(
+            "SELECT metadata, proposal, created_at FROM financial_proposals WHERE quotation_code = ?", (quotation_code,)
+        ).fetchone()
+        if row is None:
+            return None
+        entry = {}
+        if row["metadata"]:
+            entry["metadata"] = json.loads(row["metadata"])
+        if row["proposal"]:
+            entry["proposal"] = json.loads(row["proposal"])
+        entry["created_at"] = row["created_at"]
+        return entry
+
+    def list_proposals(self, limit: int = 50, cursor: Optional[str] = None, client: Optional[str] = None,
+                       rfp_code: Optional[str] = None, created_from: Optional[str] = None,
+                       created_to: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str], int]:
+        """Newest first. Returns (page, next_cursor, total matching the filters)"""
+        where, params = self._filters(client, rfp_code, created_from, created_to)
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM financial_proposals {self._where(where)}", params).fetchone()[0]
+
+        page_where, page_params = list(where), list(params)
+        if cursor:
+            created_at, quotation_code = _decode_cursor(cursor)
+            page_where.append("(created_at, quotation_code) < (?, ?)")
+            page_params += [created_at, quotation_code]
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        rows = conn.execute(
+            f"""SELECT quotation_code, created_at, client_name, rfp_code, project_name, total_amount,
+                       metadata IS NOT NULL AS has_metadata, proposal IS NOT NULL AS has_proposal
+                FROM financial_proposals {self._where(page_where)}
+                ORDER BY created_at DESC, quotation_code DESC LIMIT ?""",
+            page_params + [limit + 1]
+        ).fetchall()
+
+        items = [
+            {**dict(row), "has_metadata": bool(row["has_metadata"]), "has_proposal": bool(row["has_proposal"])}
+            for row in rows[:limit]
+        ]
+        next_cursor = _encode_cursor(items[-1]["created_at"], items[-1]["quotation_code"]) if len(rows) > limit else None
+        return items, next_cursor, total
+
+    def analytics(self, top: int = 10) -> Dict[str, Any]:
+        """Portfolio totals, the top clients and services by value, and every month, read from the aggregates"""
+        conn = self._connect()
+        columns = "key, proposal_count, line_count, value, costed_value, cost"
+        totals = conn.execute(
+            f"SELECT {columns} FROM proposal_analytics WHERE dimension = 'total'"
+        ).fetchone()
+        clients = conn.execute(
+            f"SELECT {columns} FROM proposal_analytics WHERE dimension = 'client' ORDER BY value DESC LIMIT ?", (top,)
+        ).fetchall()
+        services = conn.execute(
+            f"SELECT {columns} FROM proposal_analytics WHERE dimension = 'service' ORDER BY value DESC LIMIT ?", (top,)
+        ).fetchall()
+        months = conn.execute(
+            f"SELECT {columns} FROM proposal_analytics WHERE dimension = 'month' ORDER BY key"
+        ).fetchall()
+
+        pipeline_value = totals["value"] if totals else 0.0
+        proposal_count = totals["proposal_count"] if totals else 0
+        return {
+            "pipeline_value": round(pipeline_value, 2),
+            "proposal_count": proposal_count,
+            "average_proposal_value": round(pipeline_value / proposal_count, 2) if proposal_count else 0.0,
+            "average_margin": _margin(totals),
+            "costed_value": round(totals["costed_value"], 2) if totals else 0.0,
+            "by_client": [_aggregate(row, "client") for row in clients],
+            "by_month": [_aggregate(row, "month") for row in months],
+            "service_mix": [
+                {**_aggregate(row, "service_id"), "share": round(row["value"] / pipeline_value * 100, 2) if pipeline_value else 0.0}
+                for row in services
+            ],
+        }
+
+    def rebuild_analytics(self):
+        """Recompute every aggregate from the stored proposals"""
+        with _Transaction(self._connect()) as conn:
+            conn.execute("DELETE FROM proposal_analytics")
+            for row in conn.execute(
+                "SELECT client_name, created_at, proposal FROM financial_proposals WHERE proposal IS NOT NULL"
+            ).fetchall():
+                self._apply(conn, row, 1)
+
+    @staticmethod
+    def _analytics_row(conn: sqlite3.Connection, quotation_code: str) -> Optional[sqlite3.Row]:
+        return conn.execute(
+            "SELECT client_name, created_at, proposal FROM financial_proposals WHERE quotation_code = ?", (quotation_code,)
+        ).fetchone()
+
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, row: sqlite3.Row, sign: int):
+        """Add (sign=1) or remove (sign=-1) one stored proposal's contribution to the aggregates"""
+        if row["proposal"] is None:
+            return
+        proposal = json.loads(row["proposal"])
+        items = proposal.get("items", [])
+        costed = [item for item in items if item.get("cost") is not None]
+        totals = (1, len(items), proposal.get("total_amount") or 0.0,
+                  sum(item.get("total_price", 0) for item in costed), sum(item["cost"] for item in costed))
+
+        contributions = [
+            ("total", "all", *totals),
+            ("client", row["client_name"] or UNASSIGNED_CLIENT, *totals),
+            ("month", row["created_at"][:7], *totals),
+        ]
+        by_service: Dict[str, List[float]] = {}
+        for item in items:
+            service = by_service.setdefault(item.get("service_id") or CUSTOM_SERVICE, [0, 0.0, 0.0, 0.0])
+            service[0] += 1
+            service[1] += item.get("total_price", 0)
+            if item.get("cost") is not None:
+                service[2] += item.get("total_price", 0)
+                service[3] += item["cost"]
+        contributions += [("service", key, 1, *values) for key, values in by_service.items()]
+
+        conn.executemany(
+            """INSERT INTO proposal_analytics (dimension, key, proposal_count, line_count, value, costed_value, cost)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(dimension, key) DO UPDATE SET
+                   proposal_count = proposal_count + excluded.proposal_count,
+                   line_count = line_count + excluded.line_count,
+                   value = value + excluded.value,
+                   costed_value = costed_value + excluded.costed_value,
+                   cost = cost + excluded.cost""",
+            [(dimension, key, *(sign * value for value in values)) for dimension, key, *values in contributions]
+        )
+        if sign < 0:
+            conn.execute("DELETE FROM proposal_analytics WHERE proposal_count <= 0")
+
+    @staticmethod
+    def _filters(client, rfp_code, created_from, created_to) -> Tuple[List[str], List[Any]]:
+        where, params = [], []
+        if client:
+            where.append("client_name = ? COLLATE NOCASE")
+            params.append(client)
+        if rfp_code:
+            where.append("rfp_code = ?")
+            params.append(rfp_code)
+        if created_from:
+            where.append("created_at >= ?")
+            params.append(created_from)
+        if created_to:
+            # Dates without a time cover the whole day
+            where.append("created_at <= ?")
+            params.append(created_to + "T99" if len(created_to) == 10 else created_to)
+        return where, params
+
+    @staticmethod
+    def _where(conditions: List[str]) -> str:
+        return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block (connections run in autocommit mode)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _margin(row: Optional[sqlite3.Row]) -> Optional[float]:
+    """Revenue-weighted margin over the items that carry a cost, in percent"""
+    if row is None or row["costed_value"] <= 0:
+        return None
+    return round((row["costed_value"] - row["cost"]) / row["costed_value"] * 100, 2)
+
+
+def _aggregate(row: sqlite3.Row, key_name: str) -> Dict[str, Any]:
+    return {
+        key_name: row["key"],
+        "proposal_count": row["proposal_count"],
+        "line_count": row["line_count"],
+        "value": round(row["value"], 2),
+        "average_margin": _margin(row),
+    }
+
+
+def _encode_cursor(created_at: str, quotation_code: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, quotation_code]).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, quotation_code = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_at), str(quotation_code)
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
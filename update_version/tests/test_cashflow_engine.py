@@ -0,0 +1,34 @@
+"""Cash-flow views agree on overhead under every allocation"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cashflow_engine import OVERHEAD_ALLOCATIONS, deliverable_cashflow, monthly_timeline, simulate_scenarios
+
+CATALOG = {
+    "1.1": {"name": "Strategy", "unit": "Service", "duration": 6, "price": 90000.0},
+    "2.1": {"name": "Assessment", "unit": "Service", "duration": 3, "price": 40000.0},
+}
+OVERHEAD_COSTS = {"rent": 1000.0, "salaries": 4000.0}
+DELIVERABLES = [
+    SimpleNamespace(name="Strategy", due_date="2026-06-15", service_id="1.1", amount=None, salaries=20000, tools=1000, others=500),
+    SimpleNamespace(name="Assessment", due_date="2026-05-10", service_id="2.1", amount=None, salaries=8000, tools=0, others=0),
+    SimpleNamespace(name="Workshop", due_date="2026-09-30", service_id=None, amount=15000, salaries=0, tools=0, others=0),
+]
+
+
+@pytest.mark.parametrize("overhead_allocation", OVERHEAD_ALLOCATIONS)
+def test_timeline_and_scenarios_charge_the_deliverable_overhead(overhead_allocation):
+    summary = deliverable_cashflow(DELIVERABLES, CATALOG, OVERHEAD_COSTS, overhead_allocation)["summary"]
+    timeline = monthly_timeline(DELIVERABLES, [], "2026-02-01", "2026-12-31", CATALOG, OVERHEAD_COSTS,
+                                overhead_allocation=overhead_allocation)
+    scenarios = simulate_scenarios(DELIVERABLES, CATALOG, OVERHEAD_COSTS, {}, 100, seed=1,
+                                   overhead_allocation=overhead_allocation)
+
+    assert timeline["summary"]["total_cash_out"] == pytest.approx(summary["total_costs"], abs=0.05)
+    assert scenarios["margin"]["mean"] == pytest.approx(summary["profit_margin"], abs=0.01)
@@ -0,0 +1,34 @@
+"""Regression cases for the target-margin price solver"""
+
+import math
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pricing_solver import solve_prices
+
+CATALOG = {"1.1": {"name": "AI Governance Framework Development", "duration": 12, "price": 50000.00}}
+OVERHEAD_COSTS = {"rent": 1000.0, "utilities": 500.0}
+
+
+def deliverable(name, due_date, service_id=None, salaries=0.0, tools=0.0, others=0.0):
+    return SimpleNamespace(name=name, due_date=due_date, service_id=service_id, amount=None,
+                           salaries=salaries, tools=tools, others=others)
+
+
+def test_zero_cost_custom_deliverable_does_not_make_the_margin_reachable():
+    # No service, no amount and zero cost: reference 0 and an open ceiling, which
+    # used to make the reachable total infinite and the solved prices NaN
+    deliverables = [
+        deliverable("Catalog", "2026-12-31", service_id="1.1", salaries=60000, tools=5000, others=1000),
+        deliverable("Free", "2026-06-30"),
+    ]
+    result = solve_prices(deliverables, CATALOG, OVERHEAD_COSTS, target_margin=50,
+                          overhead_allocation="shared_by_cost")
+
+    prices = [row["price"] for row in result["deliverables"]]
+    assert all(math.isfinite(price) for price in prices)
+    assert prices == [75000.0, 0.0]
+    assert result["summary"]["feasible"] is False
@@ -0,0 +1,40 @@
+"""Excel export of stored financial proposals"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from openpyxl import load_workbook
+
+from proposal_export import build_proposal_workbook
+
+PROPOSAL = {
+    "offer_number": "Q-1",
+    "date": "2026-01-01",
+    "items": [{"description": "=HYPERLINK(\"http://example.com\")", "quantity": 1, "unit_price": 100, "total_price": 100}],
+    "payment_terms": [{"description": "=1+1", "percentage": 100}],
+}
+
+
+def export(proposal, metadata=None):
+    buffer = io.BytesIO()
+    build_proposal_workbook("Q-1", proposal, metadata).save(buffer)
+    buffer.seek(0)
+    return load_workbook(buffer)
+
+
+def test_user_text_is_stored_as_text_and_totals_as_formulas():
+    wb = export(PROPOSAL, {"client_name_en": "+cmd"})
+    sheet, terms = wb["Proposal"], wb["Payment Terms"]
+
+    assert sheet["B5"].data_type == "s" and sheet["B5"].value == "+cmd"
+    assert sheet["B11"].data_type == "s" and sheet["B11"].value.startswith("=HYPERLINK")
+    assert terms["A2"].data_type == "s" and terms["A2"].value == "=1+1"
+    assert sheet["E12"].data_type == "f" and sheet["E12"].value == "=SUM(E11:E11)"
+    assert terms["C2"].data_type == "f"
+
+
+def test_item_table_header_stays_frozen():
+    assert export(PROPOSAL)["Proposal"].freeze_panes == "A11"
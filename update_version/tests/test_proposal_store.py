@@ -0,0 +1,40 @@
+"""Proposals created for saved project metadata are filed under their client"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("PROPOSAL_STORE_PATH", os.path.join(tempfile.mkdtemp(), "financial_proposals.db"))
+
+from financial_proposal import (
+    FinalProposalRequest, ProjectMetadata, create_financial_proposal, create_project_metadata,
+    get_portfolio_analytics, list_all_proposals
+)
+
+
+def test_proposal_created_for_metadata_shows_up_under_its_client():
+    async def scenario():
+        metadata = await create_project_metadata(ProjectMetadata(
+            project_name_en="Data Platform", project_name_ar="منصة البيانات",
+            client_name_en="Ministry of Energy", client_name_ar="وزارة الطاقة",
+            project_type="fixed", boq_type="deliverable-based", num_deliverables=1,
+            start_date="2026-01-01", end_date="2026-06-30", rfp_code="RFP-ENERGY-7"
+        ))
+        code = metadata["quotation_code"]
+        created = await create_financial_proposal(FinalProposalRequest(
+            proposal_items=[{"description": "Assessment", "unit_price": 50000, "total_price": 50000}],
+            payment_terms=[{"description": "On signature", "percentage": 100}],
+            quotation_code=code
+        ))
+        listed = await list_all_proposals(limit=50, cursor=None, client=None, rfp_code="RFP-ENERGY-7",
+                                          created_from=None, created_to=None)
+        return code, created, listed, await get_portfolio_analytics(top=100)
+
+    code, created, listed, analytics = asyncio.run(scenario())
+    assert created["quotation_code"] == code
+    assert listed["proposals"] == [code]
+    by_client = {row["client"]: row for row in analytics["by_client"]}
+    assert by_client["Ministry of Energy"]["proposal_count"] == 1
+    assert by_client["Ministry of Energy"]["value"] == 50000
@@ -0,0 +1,40 @@
+"""
+Generation Worker for the RFP Proposal Generator
+Leases jobs that the API enqueued in proposal_generator.db and runs the
+structure, content and rendering pipeline for them. Run as many copies as
+needed, on any host that shares the database and the uploads/outputs folders.
+
+Usage:
+    python worker.py [--concurrency N] [--worker-id NAME]
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+
+from ex import run_job_worker
+
+
+async def main(concurrency: int, worker_id: str):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    # Jobs in flight finish before the worker exits; unfinished leases expire and are retried elsewhere
+    await asyncio.gather(*(run_job_worker(f"{worker_id}-{index}", stop_event) for index in range(concurrency)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued proposal generation jobs")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "2")),
+                        help="jobs processed at the same time by this process")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="name recorded on leased jobs")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.worker_id))